@@ -0,0 +1,57 @@
+import functools
+from core import db, querylog
+from core.lazy import lazy_import
+from core.response import error_response, json_response, preflight_response
+
+extras = lazy_import('psycopg2.extras')
+
+def query_stats_response(event: dict) -> dict:
+    """GET ?query_stats=1&admin_code=... — счётчики запросов к БД этого контейнера (только для админа)"""
+    query_params = event.get('queryStringParameters') or {}
+    if query_params.get('admin_code') != 'HELP2025':
+        return error_response(event, 403, 'Неверный код')
+    return json_response(event, 200, {
+        'query_stats': querylog.snapshot(),
+        'db_pool': db.get_pool().stats
+    }, headers={'Cache-Control': 'no-store'})
+
+def db_handler(methods: str = 'GET, POST, OPTIONS', dict_rows: bool = True):
+    """Обёртка обработчика функции: preflight, соединение из пула, курсор, схема и ответ 500.
+    
+    Обёрнутая функция вызывается как func(event, context, conn, cursor, schema).
+    Каждый вызов пишет в лог строку с числом и временем запросов к БД (core.querylog).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def handler(event: dict, context) -> dict:
+            if event.get('httpMethod') == 'OPTIONS':
+                return preflight_response(methods)
+            if event.get('httpMethod') == 'GET' and (event.get('queryStringParameters') or {}).get('query_stats'):
+                return query_stats_response(event)
+            
+            # До этой точки ни psycopg2, ни пул не трогаются: preflight отвечает сразу
+            trace = querylog.start_request(event)
+            response = None
+            conn = cursor = None
+            conn_broken = False
+            try:
+                conn = db.get_pool().getconn()
+                if dict_rows:
+                    cursor = conn.cursor(cursor_factory=extras.RealDictCursor)
+                else:
+                    cursor = conn.cursor()
+                response = func(event, context, conn, cursor, db.get_schema())
+                return response
+            except Exception as e:
+                conn_broken = db.is_connection_error(e)
+                trace['error'] = f'{type(e).__name__}: {e}'
+                response = error_response(event, 500, str(e))
+                return response
+            finally:
+                if cursor is not None:
+                    cursor.close()
+                if conn is not None:
+                    db.get_pool().putconn(conn, broken=conn_broken)
+                querylog.finish_request(trace, response)
+        return handler
+    return decorator
@@ -0,0 +1,114 @@
+import hashlib
+import math
+import zlib
+
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+
+def precision_for_error(error_rate: float) -> int:
+    """Подобрать точность скетча под допустимую относительную ошибку (≈ 1.04 / sqrt(2^p))"""
+    p = math.ceil(2 * math.log2(1.04 / error_rate))
+    return min(max(p, MIN_PRECISION), MAX_PRECISION)
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+class HyperLogLog:
+    """Приближённый счётчик уникальных значений; скетчи объединяются без потери точности"""
+
+    def __init__(self, precision: int, registers: bytearray = None):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f'Точность HLL должна быть от {MIN_PRECISION} до {MAX_PRECISION}')
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.size)
+
+    def add(self, value: str):
+        x = _hash64(value)
+        tail_bits = 64 - self.precision
+        index = x >> tail_bits
+        rank = tail_bits - (x & ((1 << tail_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def fold(self, precision: int) -> 'HyperLogLog':
+        """Понизить точность скетча, чтобы объединить его со скетчем меньшей точности"""
+        if precision == self.precision:
+            return self
+        if precision > self.precision:
+            raise ValueError('Повысить точность HLL нельзя')
+        shift = self.precision - precision
+        folded = bytearray(1 << precision)
+        for index, rank in enumerate(self.registers):
+            if not rank:
+                continue
+            # Отброшенные биты индекса становятся старшими битами хвоста
+            dropped = index & ((1 << shift) - 1)
+            new_rank = shift - dropped.bit_length() + 1 if dropped else rank + shift
+            new_index = index >> shift
+            if new_rank > folded[new_index]:
+                folded[new_index] = new_rank
+        return HyperLogLog(precision, folded)
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Объединить скетч с другим (на месте, при необходимости с понижением точности)"""
+        if other.precision < self.precision:
+            folded = self.fold(other.precision)
+            self.precision, self.size, self.registers = folded.precision, folded.size, folded.registers
+        other = other.fold(self.precision)
+        registers = self.registers
+        for index, rank in enumerate(other.registers):
+            if rank > registers[index]:
+                registers[index] = rank
+        return self
+
+    def estimate(self) -> int:
+        m = self.size
+        if m == 16:
+            alpha = 0.673
+        elif m == 32:
+            alpha = 0.697
+        elif m == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / m)
+
+        raw = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # Для малых мощностей точнее линейный подсчёт по пустым регистрам
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))
+        return round(raw)
+
+    def to_bytes(self) -> bytes:
+        return zlib.compress(bytes([self.precision]) + bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        raw = zlib.decompress(data)
+        return cls(raw[0], bytearray(raw[1:]))
+
+if __name__ == '__main__':
+    # Сравнение с точным подсчётом через set: python hll.py
+    import random
+    import time
+
+    for error_rate in (0.05, 0.02, 0.01):
+        p = precision_for_error(error_rate)
+        for n in (1_000, 100_000, 1_000_000):
+            ips = [f'{random.randint(0, 255)}.{random.randint(0, 255)}.{random.randint(0, 255)}.{i % 256}' for i in range(n)]
+
+            started = time.perf_counter()
+            exact = len(set(ips))
+            exact_ms = (time.perf_counter() - started) * 1000
+
+            started = time.perf_counter()
+            sketch = HyperLogLog(p)
+            for ip in ips:
+                sketch.add(ip)
+            approx = sketch.estimate()
+            hll_ms = (time.perf_counter() - started) * 1000
+
+            print(f'p={p} n={n}: exact={exact} ({exact_ms:.1f} ms), '
+                  f'hll={approx} ({hll_ms:.1f} ms), error={abs(approx - exact) / exact:.2%}, '
+                  f'sketch={len(sketch.to_bytes())} B')
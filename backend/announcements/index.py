@@ -1,276 +1,736 @@
+import base64
 import json
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import time
+from datetime import date, datetime
+from hll import HyperLogLog, precision_for_error
+from stats_cache import create_stats_cache
+from core.handler import db_handler
+from core.db import get_pool
+from core.caching import etag_matches, list_cache_headers, list_etag, not_modified
+from core.lazy import lazy_import
+from core.response import accepted_encodings, build_response, compress, dumps, error_response, json_response
 
-def handler(event: dict, context) -> dict:
+psycopg2 = lazy_import('psycopg2')
+extras = lazy_import('psycopg2.extras')
+
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+
+def encode_feed_cursor(priority: int, created_at: datetime, announcement_id: int) -> str:
+    """Упаковать позицию последней строки ленты в непрозрачный курсор"""
+    raw = json.dumps([priority, created_at.isoformat(), announcement_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_feed_cursor(cursor: str):
+    """Распаковать курсор ленты в (priority, created_at, id)"""
+    if not cursor:
+        return None
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    priority, created_at, announcement_id = json.loads(raw)
+    return int(priority), datetime.fromisoformat(created_at), int(announcement_id)
+
+SEARCH_MAX_QUERY_LENGTH = 200
+
+def encode_search_cursor(rank: float, announcement_id: int) -> str:
+    """Курсор поисковой выдачи: релевантность и id последней строки"""
+    raw = json.dumps([rank, announcement_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def decode_search_cursor(cursor: str):
+    if not cursor:
+        return None
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    rank, announcement_id = json.loads(raw)
+    return float(rank), int(announcement_id)
+
+def serialize_announcement(ann: dict) -> dict:
+    status_map = {
+        'paid': 'Опубликовано',
+        'pending': 'Ожидает оплаты',
+        'active': 'Активно',
+        'closed': 'Закрыто'
+    }
+    return {
+        'id': ann['id'],
+        'title': ann['title'],
+        'description': ann['description'],
+        'category': ann['category'],
+        'author': ann['author_name'],
+        'date': ann['created_at'].isoformat() if ann['created_at'] else None,
+        # Истёкшее продвижение показывается как обычное объявление
+        'type': 'regular' if ann.get('promotion_expired') else ann['type'],
+        'status': status_map.get(ann.get('payment_status', 'active'), ann.get('status', 'Активно')),
+        'views': ann.get('views', 0)
+    }
+
+def fetch_feed_page(cursor, schema: str, limit: int, cursor_key=None,
+                    filter_type: str = None, author: str = None, search: str = '',
+                    category: str = None) -> tuple:
+    """Выбрать страницу ленты или поиска; вернуть (объявления, курсор следующей страницы)"""
+    filters = ''
+    params = []
+    
+    if category:
+        filters += " AND category = %s"
+        params.append(category)
+    
+    if filter_type:
+        filters += " AND (CASE WHEN promotion_expired THEN 'regular' ELSE type END) = %s"
+        params.append(filter_type)
+    
+    if author:
+        filters += " AND author_name = %s"
+        params.append(author)
+    
+    if search:
+        # Полнотекстовый поиск по GIN-индексу, выдача по релевантности
+        query = f"""
+            SELECT * FROM (
+                SELECT id, title, description, category, author_name, created_at,
+                       type, promotion_expired, payment_status, status, views,
+                       ts_rank_cd(search_vector, q)::float8 AS rank
+                FROM {schema}.announcements, websearch_to_tsquery('russian', %s) q
+                WHERE payment_status = 'paid' AND search_vector @@ q{filters}
+            ) found
+        """
+        params.insert(0, search)
+        
+        if cursor_key:
+            query += " WHERE rank < %s OR (rank = %s AND id < %s)"
+            params.extend([cursor_key[0], cursor_key[0], cursor_key[1]])
+        
+        query += " ORDER BY rank DESC, id DESC LIMIT %s"
+    else:
+        query = f"""
+            SELECT id, title, description, category, author_name, created_at,
+                   type, promotion_expired, payment_status, status, views, priority
+            FROM {schema}.announcements
+            WHERE payment_status = 'paid'{filters}
+        """
+        
+        # Keyset: продолжаем строго после последней строки предыдущей страницы
+        if cursor_key:
+            query += " AND (priority > %s OR (priority = %s AND (created_at, id) < (%s, %s)))"
+            params.extend([cursor_key[0], cursor_key[0], cursor_key[1], cursor_key[2]])
+        
+        query += " ORDER BY priority, created_at DESC, id DESC LIMIT %s"
+    params.append(limit + 1)
+    
+    cursor.execute(query, params)
+    announcements = cursor.fetchall()
+    
+    next_cursor = None
+    if len(announcements) > limit:
+        announcements = announcements[:limit]
+        last = announcements[-1]
+        if search:
+            next_cursor = encode_search_cursor(last['rank'], last['id'])
+        else:
+            next_cursor = encode_feed_cursor(last['priority'], last['created_at'], last['id'])
+    
+    return [serialize_announcement(ann) for ann in announcements], next_cursor
+
+FEED_SNAPSHOT_PAGES = int(os.environ.get('FEED_SNAPSHOT_PAGES', '3'))
+
+def refresh_feed_snapshots(conn, schema: str, wait: bool = False) -> dict:
+    """Перегенерировать снимки первых страниц ленты (JSON и gzip) под текущую версию списка.
+    
+    Без wait, если снимки уже пересобирает другой контейнер, сразу возвращает пустой dict.
+    """
+    snapshots = {}
+    with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
+        lock = 'pg_advisory_xact_lock' if wait else 'pg_try_advisory_xact_lock'
+        cur.execute(f"SELECT {lock}(hashtext('feed_snapshots'))::text AS locked")
+        if cur.fetchone()['locked'] == 'false':
+            conn.rollback()
+            return snapshots
+        
+        # Версию читаем до строк: если запись вклинится, снимок окажется устаревшим, а не ложно свежим
+        cur.execute(f"SELECT version FROM {schema}.list_versions WHERE name = 'announcements'")
+        row = cur.fetchone()
+        version = row['version'] if row else 0
+        
+        page_key = ''
+        for _ in range(FEED_SNAPSHOT_PAGES):
+            result, next_cursor = fetch_feed_page(cur, schema, FEED_PAGE_SIZE, decode_feed_cursor(page_key))
+            # Тот же сериализатор, что у живого ответа: снимок и выборка отдают одинаковые байты
+            body = dumps({'announcements': result, 'next_cursor': next_cursor})
+            snapshots[page_key] = {'body': body, 'body_gzip': compress(body.encode(), 'gzip')}
+            if not next_cursor:
+                break
+            page_key = next_cursor
+        
+        cur.execute(f"DELETE FROM {schema}.feed_snapshots")
+        extras.execute_values(cur, f"""
+            INSERT INTO {schema}.feed_snapshots (page_key, version, body, body_gzip)
+            VALUES %s
+        """, [
+            (key, version, snapshot['body'], psycopg2.Binary(snapshot['body_gzip']))
+            for key, snapshot in snapshots.items()
+        ])
+    conn.commit()
+    return snapshots
+
+def get_feed_snapshot(conn, schema: str, page_key: str):
+    """Снимок страницы ленты, если он соответствует текущей версии; при промахе — перегенерация"""
+    with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
+        cur.execute(f"""
+            SELECT v.version AS current_version, f.version AS snapshot_version, s.body, s.body_gzip
+            FROM {schema}.list_versions v
+            LEFT JOIN {schema}.feed_snapshots f ON f.page_key = ''
+            LEFT JOIN {schema}.feed_snapshots s ON s.page_key = %s AND s.version = v.version
+            WHERE v.name = 'announcements'
+        """, (page_key,))
+        row = cur.fetchone()
+    if not row:
+        return None
+    if row['body'] is not None:
+        return {'body': row['body'], 'body_gzip': bytes(row['body_gzip'])}
+    if row['snapshot_version'] == row['current_version']:
+        # Снимки свежие, но такой страницы в них нет (дальше FEED_SNAPSHOT_PAGES)
+        return None
+    # Снимки устарели после записи из другой функции (оплата, сверка): пересоберёт один контейнер
+    try:
+        return refresh_feed_snapshots(conn, schema).get(page_key)
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f'Ошибка обновления снимка ленты: {e}')
+        return None
+
+def snapshot_response(event: dict, snapshot: dict, etag: str) -> dict:
+    """Ответ из снимка: gzip отдаём готовый, иначе тело сжимает общий построитель ответа"""
+    # Готовый gzip и тем, кто принимает br (то есть всем браузерам): сжатие brotli
+    # на каждый запрос свело бы на нет выгоду снимка
+    if 'gzip' not in accepted_encodings(event):
+        return build_response(event, 200, snapshot['body'], list_cache_headers(etag))
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*',
+            'Content-Encoding': 'gzip',
+            'Vary': 'Accept-Encoding',
+            **list_cache_headers(etag)
+        },
+        'body': base64.b64encode(snapshot['body_gzip']).decode(),
+        'isBase64Encoded': True
+    }
+
+def refresh_feed_snapshots_quietly(conn, schema: str):
+    """Перегенерировать снимки после записи, не ломая основной запрос"""
+    try:
+        refresh_feed_snapshots(conn, schema, wait=True)
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f'Ошибка обновления снимка ленты: {e}')
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_CLOSED_AFTER_DAYS = int(os.environ.get('ARCHIVE_CLOSED_AFTER_DAYS', '14'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+ARCHIVE_TIME_BUDGET = float(os.environ.get('ARCHIVE_TIME_BUDGET', '20'))
+ARCHIVE_COLUMNS = ('id, title, description, category, author_name, author_contact, type, payment_status, '
+                   'payment_amount, payment_id, created_at, expires_at, paid_at, status, views')
+
+def demote_expired_promotions(cursor, schema: str) -> int:
+    """Опустить к обычным VIP и поднятые объявления с истёкшим expires_at"""
+    # Триггер версии ленты срабатывает на оператор даже без строк: пустой UPDATE сбросил бы ETag
+    cursor.execute(f"""
+        SELECT EXISTS (
+            SELECT 1 FROM {schema}.announcements
+            WHERE type IN ('vip', 'boosted') AND NOT promotion_expired
+              AND expires_at <= CURRENT_TIMESTAMP
+        ) AS due
+    """)
+    if not cursor.fetchone()['due']:
+        return 0
+    cursor.execute(f"""
+        UPDATE {schema}.announcements
+        SET promotion_expired = TRUE
+        WHERE type IN ('vip', 'boosted') AND NOT promotion_expired
+          AND expires_at <= CURRENT_TIMESTAMP
+    """)
+    return cursor.rowcount
+
+def archive_announcements(conn, cursor, schema: str) -> dict:
+    """Понизить истёкшие продвижения и перенести закрытые, неоплаченные и старые объявления в архив.
+
+    Переносит пачками по ARCHIVE_BATCH_SIZE с коммитом после каждой, пока укладывается в ARCHIVE_TIME_BUDGET.
+    """
+    started = time.monotonic()
+    result = {'demoted': demote_expired_promotions(cursor, schema), 'archived': 0, 'batches': 0}
+    conn.commit()
+    
+    while time.monotonic() - started < ARCHIVE_TIME_BUDGET:
+        # SKIP LOCKED: строки, которые сейчас правит обработчик (оплата, закрытие), подождут следующего запуска
+        cursor.execute(f"""
+            SELECT id FROM {schema}.announcements
+            WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+              AND (status = 'closed' OR payment_status = 'failed'
+                   OR created_at < CURRENT_TIMESTAMP - make_interval(days => %s))
+            ORDER BY created_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (min(ARCHIVE_CLOSED_AFTER_DAYS, ARCHIVE_AFTER_DAYS), ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE))
+        ids = [row['id'] for row in cursor.fetchall()]
+        moved = 0
+        if ids:
+            # DELETE только непустой пачки: иначе триггер версии ленты сработал бы впустую
+            cursor.execute(f"""
+                WITH moved AS (
+                    DELETE FROM {schema}.announcements
+                    WHERE id = ANY(%s)
+                    RETURNING {ARCHIVE_COLUMNS}
+                )
+                INSERT INTO {schema}.announcements_archive ({ARCHIVE_COLUMNS})
+                SELECT {ARCHIVE_COLUMNS} FROM moved
+            """, (ids,))
+            moved = cursor.rowcount
+        conn.commit()
+        
+        result['archived'] += moved
+        result['batches'] += 1
+        if moved < ARCHIVE_BATCH_SIZE:
+            break
+    
+    if result['demoted'] or result['archived']:
+        refresh_feed_snapshots_quietly(conn, schema)
+    return result
+
+stats_cache = create_stats_cache()
+
+VIEW_FOLD_BATCH_SIZE = int(os.environ.get('VIEW_FOLD_BATCH_SIZE', '5000'))
+VIEW_FOLD_TIME_BUDGET = float(os.environ.get('VIEW_FOLD_TIME_BUDGET', '10'))
+
+def record_view(cursor, schema: str, announcement_id: int):
+    """Записать просмотр в журнал: вставка не блокирует строку объявления и не меняет версию ленты"""
+    cursor.execute(
+        f"INSERT INTO {schema}.announcement_view_deltas (announcement_id) VALUES (%s)",
+        (announcement_id,)
+    )
+
+def fold_view_deltas(conn, schema: str) -> int:
+    """Свернуть журнал просмотров в announcements.views (и в архив) пачками по VIEW_FOLD_BATCH_SIZE.
+    
+    Пачка удаляется из журнала и прибавляется к счётчикам в одной транзакции, поэтому
+    каждый просмотр учитывается ровно один раз.
+    """
+    started = time.monotonic()
+    folded = 0
+    with conn.cursor() as cur:
+        while time.monotonic() - started < VIEW_FOLD_TIME_BUDGET:
+            # Сворачивает один вызов за раз: UPDATE объявлений из разных контейнеров не дедлочатся
+            cur.execute("SELECT pg_try_advisory_xact_lock(hashtext('announcement_view_deltas'))")
+            if not cur.fetchone()[0]:
+                conn.rollback()
+                break
+            cur.execute(f"""
+                WITH batch AS (
+                    DELETE FROM {schema}.announcement_view_deltas
+                    WHERE id IN (
+                        SELECT id FROM {schema}.announcement_view_deltas ORDER BY id LIMIT %s
+                    )
+                    RETURNING announcement_id, delta
+                ), totals AS (
+                    SELECT announcement_id, SUM(delta) AS delta FROM batch GROUP BY announcement_id
+                ), live AS (
+                    UPDATE {schema}.announcements AS a
+                    SET views = COALESCE(a.views, 0) + t.delta
+                    FROM totals t
+                    WHERE a.id = t.announcement_id
+                ), archived AS (
+                    UPDATE {schema}.announcements_archive AS a
+                    SET views = COALESCE(a.views, 0) + t.delta
+                    FROM totals t
+                    WHERE a.id = t.announcement_id
+                )
+                SELECT COUNT(*) FROM batch
+            """, (VIEW_FOLD_BATCH_SIZE,))
+            batch = cur.fetchone()[0]
+            conn.commit()
+            
+            folded += batch
+            if batch < VIEW_FOLD_BATCH_SIZE:
+                break
+    if folded:
+        stats_cache.invalidate('total_announcement_views')
+    return folded
+
+HLL_PRECISION = precision_for_error(float(os.environ.get('HLL_ERROR_RATE', '0.02')))
+VISIT_FOLD_BATCH_SIZE = int(os.environ.get('VISIT_FOLD_BATCH_SIZE', '5000'))
+VISIT_FOLD_TIME_BUDGET = float(os.environ.get('VISIT_FOLD_TIME_BUDGET', '10'))
+
+def record_visit(cursor, schema: str, visitor_ip: str, user_agent: str):
+    """Записать посещение в журнал; visited_at ставит БД"""
+    cursor.execute(
+        f"INSERT INTO {schema}.site_visit_events (visitor_ip, user_agent) VALUES (%s, %s)",
+        (visitor_ip, user_agent)
+    )
+
+def scan_day_sketches(conn, schema: str, days: list = None) -> dict:
+    """HLL-скетчи посетителей по дням из сырой истории site_visits (все дни или только days)"""
+    day_filter, params = '', None
+    if days is not None:
+        day_filter, params = ' WHERE visited_at::date = ANY(%s)', (list(days),)
+    day_sketches = {}
+    with conn.cursor(name='site_visits_scan') as scan:
+        scan.itersize = 10000
+        scan.execute(
+            f"SELECT visited_at::date, COALESCE(visitor_ip, 'unknown') FROM {schema}.site_visits{day_filter}",
+            params
+        )
+        for day, visitor_ip in scan:
+            day_sketches.setdefault(day, HyperLogLog(HLL_PRECISION)).add(visitor_ip)
+    return day_sketches
+
+def fold_site_visits(conn, schema: str) -> int:
+    """Перенести журнал посещений в site_visits и обновить site_visits_daily пачками по VISIT_FOLD_BATCH_SIZE.
+    
+    Пачка удаляется из журнала, переносится в историю и учитывается в дневных визитах
+    и HLL-скетчах в одной транзакции. День считается в БД (visited_at::date).
+    """
+    started = time.monotonic()
+    folded = 0
+    with conn.cursor() as cur:
+        while time.monotonic() - started < VISIT_FOLD_TIME_BUDGET:
+            # SKIP LOCKED: параллельные вызовы разбирают разные пачки
+            cur.execute(f"""
+                WITH batch AS (
+                    DELETE FROM {schema}.site_visit_events
+                    WHERE id IN (
+                        SELECT id FROM {schema}.site_visit_events
+                        ORDER BY id
+                        LIMIT %s
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING visitor_ip, user_agent, visited_at
+                ), moved AS (
+                    INSERT INTO {schema}.site_visits (visitor_ip, user_agent, visited_at)
+                    SELECT visitor_ip, user_agent, visited_at FROM batch
+                )
+                SELECT visited_at::date, COALESCE(visitor_ip, 'unknown') FROM batch
+            """, (VISIT_FOLD_BATCH_SIZE,))
+            batch = cur.fetchall()
+            if not batch:
+                conn.commit()
+                break
+            
+            visits_per_day = {}
+            day_sketches = {}
+            for day, visitor_ip in batch:
+                visits_per_day[day] = visits_per_day.get(day, 0) + 1
+                day_sketches.setdefault(day, HyperLogLog(HLL_PRECISION)).add(visitor_ip)
+            
+            # Upsert блокирует строки дней до коммита (по порядку дней) и возвращает текущие скетчи
+            stored = extras.execute_values(cur, f"""
+                INSERT INTO {schema}.site_visits_daily AS d (day, visits)
+                VALUES %s
+                ON CONFLICT (day) DO UPDATE SET visits = d.visits + EXCLUDED.visits
+                RETURNING day, visitors_sketch, visits
+            """, sorted(visits_per_day.items()), fetch=True)
+            
+            # День с визитами до скетчей (история миграции) собирается заново по site_visits,
+            # куда эта пачка уже перенесена: иначе скетч учёл бы только новых посетителей
+            unsketched = [day for day, sketch_data, visits in stored
+                          if sketch_data is None and visits > visits_per_day[day]]
+            if unsketched:
+                day_sketches.update(scan_day_sketches(conn, schema, unsketched))
+            
+            updates = []
+            for day, sketch_data, _ in stored:
+                sketch = day_sketches[day]
+                if sketch_data is not None:
+                    sketch.merge(HyperLogLog.from_bytes(bytes(sketch_data)))
+                updates.append((day, psycopg2.Binary(sketch.to_bytes()), sketch.estimate()))
+            
+            extras.execute_values(cur, f"""
+                UPDATE {schema}.site_visits_daily AS d
+                SET visitors_sketch = v.sketch, unique_visitors = v.estimate
+                FROM (VALUES %s) AS v(day, sketch, estimate)
+                WHERE d.day = v.day
+            """, updates)
+            conn.commit()
+            
+            folded += len(batch)
+            if len(batch) < VISIT_FOLD_BATCH_SIZE:
+                break
+    if folded:
+        stats_cache.invalidate('total_visits', 'today_visits', 'unique_visitors')
+    return folded
+
+def query_stats(cursor, schema: str, date_from: date = None, date_to: date = None) -> dict:
+    """Посчитать все метрики админ-статистики одним запросом"""
+    sketch_filter = ""
+    params = []
+    if date_from:
+        sketch_filter += " AND day >= %s"
+        params.append(date_from)
+    if date_to:
+        sketch_filter += " AND day <= %s"
+        params.append(date_to)
+    
+    cursor.execute(f"""
+        SELECT
+            (SELECT COALESCE(SUM(visits), 0) FROM {schema}.site_visits_daily) as total_visits,
+            (SELECT COALESCE(SUM(visits), 0) FROM {schema}.site_visits_daily WHERE day = CURRENT_DATE) as today_visits,
+            (SELECT COALESCE(SUM(views), 0) FROM {schema}.announcements) +
+            (SELECT COALESCE(SUM(views), 0) FROM {schema}.announcements_archive) as total_views,
+            (SELECT array_agg(visitors_sketch) FROM {schema}.site_visits_daily
+             WHERE visitors_sketch IS NOT NULL{sketch_filter}) as sketches
+    """, params)
+    row = cursor.fetchone()
+    
+    # Уникальные посетители: объединение дневных HLL-скетчей за период
+    merged = HyperLogLog(HLL_PRECISION)
+    for sketch_data in row['sketches'] or []:
+        merged.merge(HyperLogLog.from_bytes(bytes(sketch_data)))
+    
+    return {
+        'total_visits': row['total_visits'],
+        'today_visits': row['today_visits'],
+        'total_announcement_views': row['total_views'],
+        'unique_visitors': merged.estimate()
+    }
+
+def rebuild_visitor_sketches(conn, schema: str, missing_only: bool = False) -> int:
+    """Пересобрать дневные скетчи по сырой истории site_visits: все дни или только дни без скетча"""
+    day_sketches = {}
+    with conn.cursor() as cur:
+        # Строки дней заблокированы до коммита: свёртка журнала не допишет скетч между сканом и записью
+        cur.execute(f"""
+            SELECT day FROM {schema}.site_visits_daily
+            {'WHERE visitors_sketch IS NULL' if missing_only else ''}
+            ORDER BY day
+            FOR UPDATE
+        """)
+        days = [row[0] for row in cur.fetchall()]
+        if days:
+            day_sketches = scan_day_sketches(conn, schema, days if missing_only else None)
+        if day_sketches:
+            extras.execute_values(cur, f"""
+                UPDATE {schema}.site_visits_daily AS d
+                SET visitors_sketch = v.sketch, unique_visitors = v.estimate
+                FROM (VALUES %s) AS v(day, sketch, estimate)
+                WHERE d.day = v.day
+            """, [
+                (day, psycopg2.Binary(sketch.to_bytes()), sketch.estimate())
+                for day, sketch in sorted(day_sketches.items())
+            ])
+    conn.commit()
+    if day_sketches:
+        stats_cache.invalidate('unique_visitors')
+    return len(day_sketches)
+
+@db_handler()
+def handler(event: dict, context, conn, cursor, schema: str) -> dict:
     """
     API для работы с объявлениями.
-    GET - получить список объявлений
+    GET - получить список объявлений (q - полнотекстовый поиск)
     POST - создать или обновить объявление
+    Вызов по таймеру (событие без httpMethod) сворачивает журналы просмотров и посещений,
+    досчитывает HLL-скетчи дней без скетча,
+    понижает истёкшие VIP и архивирует старые объявления.
     """
-    method = event.get('httpMethod', 'GET')
-    
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
+    if 'httpMethod' not in event:
+        result = {
+            'views_folded': fold_view_deltas(conn, schema),
+            'visits_folded': fold_site_visits(conn, schema),
+            'sketches_backfilled': rebuild_visitor_sketches(conn, schema, missing_only=True)
         }
+        result.update(archive_announcements(conn, cursor, schema))
+        if result['views_folded']:
+            # Версия ленты от просмотров не меняется: снимки с новыми счётчиками пересобираются
+            # здесь, без ожидания блокировки, если их уже не пересобирает другой вызов
+            try:
+                refresh_feed_snapshots(conn, schema)
+            except psycopg2.Error as e:
+                conn.rollback()
+                print(f'Ошибка обновления снимка ленты: {e}')
+        print(f'Timer: {result}')
+        return json_response(event, 200, result)
     
-    try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    method = event.get('httpMethod', 'GET')
+    
+    if method == 'GET':
+        query_params = event.get('queryStringParameters') or {}
+        filter_type = query_params.get('type')
+        category = query_params.get('category')
+        author = query_params.get('author')
+        search = (query_params.get('q') or '').strip()[:SEARCH_MAX_QUERY_LENGTH]
+        announcement_id = query_params.get('id')
+        track_view = query_params.get('track_view')
         
-        if method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            filter_type = query_params.get('type')
-            author = query_params.get('author')
-            announcement_id = query_params.get('id')
-            track_view = query_params.get('track_view')
-            
-            # Учёт просмотра конкретного объявления
-            if announcement_id and track_view == '1':
-                cursor.execute(f"""
-                    UPDATE {schema}.announcements 
-                    SET views = COALESCE(views, 0) + 1
-                    WHERE id = %s
-                """, (announcement_id,))
+        # Учёт просмотра конкретного объявления: строка в журнал, счётчик сворачивает таймер
+        if announcement_id and track_view == '1':
+            if announcement_id.isdigit():
+                record_view(cursor, schema, int(announcement_id))
                 conn.commit()
             
-            query = f"SELECT * FROM {schema}.announcements WHERE payment_status = 'paid'"
-            params = []
+            return json_response(event, 200, {'success': True})
+        
+        try:
+            limit = min(max(int(query_params.get('limit', FEED_PAGE_SIZE)), 1), FEED_MAX_PAGE_SIZE)
+            if search:
+                cursor_key = decode_search_cursor(query_params.get('cursor'))
+            else:
+                cursor_key = decode_feed_cursor(query_params.get('cursor'))
+        except (ValueError, TypeError):
+            return error_response(event, 400, 'Неверные параметры страницы')
+        
+        # Условный GET: если список не менялся, клиент получит 304 без выборки строк
+        etag = list_etag(cursor, schema, 'announcements',
+                         filter_type, author, search, limit, query_params.get('cursor'), category)
+        if etag_matches(event, etag):
+            return not_modified(etag)
+        
+        # Первые страницы ленты по умолчанию отдаём готовым снимком
+        if not (filter_type or author or search or category) and limit == FEED_PAGE_SIZE:
+            snapshot = get_feed_snapshot(conn, schema, query_params.get('cursor') or '')
+            if snapshot:
+                return snapshot_response(event, snapshot, etag)
+        
+        result, next_cursor = fetch_feed_page(cursor, schema, limit, cursor_key,
+                                              filter_type, author, search, category)
+        
+        return json_response(event, 200, {
+            'announcements': result,
+            'next_cursor': next_cursor
+        }, headers=list_cache_headers(etag))
+    
+    elif method == 'POST':
+        body = json.loads(event.get('body', '{}'))
+        action = body.get('action')
+        
+        if action == 'track_visit':
+            # Учёт посещения сайта
+            visitor_ip = event.get('requestContext', {}).get('identity', {}).get('sourceIp', 'unknown')
+            user_agent = event.get('headers', {}).get('user-agent', '')
             
-            if filter_type:
-                query += " AND type = %s"
-                params.append(filter_type)
+            record_visit(cursor, schema, visitor_ip, user_agent)
+            conn.commit()
             
-            if author:
-                query += " AND author_name = %s"
-                params.append(author)
+            return json_response(event, 200, {'success': True})
+        
+        elif action == 'get_stats':
+            # Статистика для админ-панели
+            admin_code = body.get('admin_code', '')
             
-            query += " ORDER BY CASE WHEN type = 'vip' THEN 1 WHEN type = 'boosted' THEN 2 ELSE 3 END, created_at DESC"
+            if admin_code != 'HELP2025':
+                return error_response(event, 403, 'Неверный код')
             
-            cursor.execute(query, params)
-            announcements = cursor.fetchall()
+            # Уникальные посетители: по умолчанию за всё время, либо за date_from..date_to
+            try:
+                date_from = date.fromisoformat(body['date_from']) if body.get('date_from') else None
+                date_to = date.fromisoformat(body['date_to']) if body.get('date_to') else None
+            except (ValueError, TypeError):
+                return error_response(event, 400, 'Неверный период')
             
-            result = []
-            for ann in announcements:
-                status_map = {
-                    'paid': 'Опубликовано',
-                    'pending': 'Ожидает оплаты',
-                    'active': 'Активно',
-                    'closed': 'Закрыто'
-                }
-                result.append({
-                    'id': ann['id'],
-                    'title': ann['title'],
-                    'description': ann['description'],
-                    'category': ann['category'],
-                    'author': ann['author_name'],
-                    'date': ann['created_at'].isoformat() if ann['created_at'] else None,
-                    'type': ann['type'],
-                    'status': status_map.get(ann.get('payment_status', 'active'), ann.get('status', 'Активно')),
-                    'views': ann.get('views', 0)
-                })
+            fold_site_visits(conn, schema)
+            fold_view_deltas(conn, schema)
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps(result),
-                'isBase64Encoded': False
+            cache_keys = {
+                'total_visits': 'total_visits',
+                'today_visits': 'today_visits',
+                'total_announcement_views': 'total_announcement_views',
+                'unique_visitors': f'unique_visitors:{date_from}:{date_to}'
             }
+            cached = stats_cache.get_many(list(cache_keys.values()))
+            if cached:
+                stats = {metric: cached[key] for metric, key in cache_keys.items()}
+            else:
+                stats = query_stats(cursor, schema, date_from, date_to)
+                stats_cache.set_many({key: stats[metric] for metric, key in cache_keys.items()})
+            
+            total_visits = stats['total_visits']
+            unique_visitors = stats['unique_visitors']
+            today_visits = stats['today_visits']
+            total_announcement_views = stats['total_announcement_views']
+            
+            return json_response(event, 200, {
+                'total_visits': total_visits,
+                'unique_visitors': unique_visitors,
+                'today_visits': today_visits,
+                'total_announcement_views': total_announcement_views,
+                'db_pool': get_pool().stats,
+                'stats_cache': stats_cache.stats
+            })
         
-        elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action')
+        elif action == 'rebuild_visitor_sketches':
+            # Пересборка HLL-скетчей по истории посещений (только для админа)
+            admin_code = body.get('admin_code', '')
             
-            if action == 'track_visit':
-                # Учёт посещения сайта
-                visitor_ip = event.get('requestContext', {}).get('identity', {}).get('sourceIp', 'unknown')
-                user_agent = event.get('headers', {}).get('user-agent', '')
-                
-                cursor.execute(f"""
-                    INSERT INTO {schema}.site_visits (visitor_ip, user_agent)
-                    VALUES (%s, %s)
-                """, (visitor_ip, user_agent))
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'success': True}),
-                    'isBase64Encoded': False
-                }
+            if admin_code != 'HELP2025':
+                return error_response(event, 403, 'Неверный код')
             
-            elif action == 'get_stats':
-                # Статистика для админ-панели
-                admin_code = body.get('admin_code', '')
-                
-                if admin_code != 'HELP2025':
-                    return {
-                        'statusCode': 403,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'body': json.dumps({'error': 'Неверный код'}),
-                        'isBase64Encoded': False
-                    }
-                
-                # Общее количество посещений
-                cursor.execute(f"SELECT COUNT(*) as total FROM {schema}.site_visits")
-                total_visits = cursor.fetchone()['total']
-                
-                # Уникальные посетители
-                cursor.execute(f"SELECT COUNT(DISTINCT visitor_ip) as unique_visitors FROM {schema}.site_visits")
-                unique_visitors = cursor.fetchone()['unique_visitors']
-                
-                # Посещения за сегодня
-                cursor.execute(f"""
-                    SELECT COUNT(*) as today_visits 
-                    FROM {schema}.site_visits 
-                    WHERE DATE(visited_at) = CURRENT_DATE
-                """)
-                today_visits = cursor.fetchone()['today_visits']
-                
-                # Просмотры объявлений
-                cursor.execute(f"SELECT SUM(COALESCE(views, 0)) as total_views FROM {schema}.announcements")
-                total_announcement_views = cursor.fetchone()['total_views'] or 0
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'total_visits': total_visits,
-                        'unique_visitors': unique_visitors,
-                        'today_visits': today_visits,
-                        'total_announcement_views': total_announcement_views
-                    }),
-                    'isBase64Encoded': False
-                }
+            fold_site_visits(conn, schema)
+            rebuilt_days = rebuild_visitor_sketches(conn, schema)
             
-            elif action == 'close':
-                announcement_id = body.get('id')
-                cursor.execute(f"""
-                    UPDATE {schema}.announcements 
-                    SET status = 'closed' 
-                    WHERE id = %s
-                """, (announcement_id,))
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'success': True}),
-                    'isBase64Encoded': False
-                }
+            return json_response(event, 200, {
+                'success': True,
+                'days': rebuilt_days
+            })
+        
+        elif action == 'archive':
+            # Внеочередной запуск архивации (только для админа)
+            admin_code = body.get('admin_code', '')
             
-            elif action == 'delete_all':
-                # Удаление всех объявлений (только для админа)
-                admin_code = body.get('admin_code', '')
-                
-                if admin_code != 'HELP2025':
-                    return {
-                        'statusCode': 403,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'body': json.dumps({'error': 'Неверный код'}),
-                        'isBase64Encoded': False
-                    }
-                
-                cursor.execute(f"DELETE FROM {schema}.announcements")
-                deleted_count = cursor.rowcount
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'success': True,
-                        'deleted': deleted_count,
-                        'message': f'Удалено {deleted_count} объявлений'
-                    }),
-                    'isBase64Encoded': False
-                }
+            if admin_code != 'HELP2025':
+                return error_response(event, 403, 'Неверный код')
             
-            elif action == 'delete':
-                # Удаление конкретного объявления (только для админа)
-                admin_code = body.get('admin_code', '')
-                announcement_id = body.get('id')
-                
-                if admin_code != 'HELP2025':
-                    return {
-                        'statusCode': 403,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'body': json.dumps({'error': 'Неверный код'}),
-                        'isBase64Encoded': False
-                    }
-                
-                cursor.execute(f"DELETE FROM {schema}.announcements WHERE id = %s", (announcement_id,))
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'success': True,
-                        'message': 'Объявление удалено'
-                    }),
-                    'isBase64Encoded': False
-                }
+            result = archive_announcements(conn, cursor, schema)
+            
+            return json_response(event, 200, {'success': True, **result})
         
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
+        elif action == 'close':
+            announcement_id = body.get('id')
+            cursor.execute(f"""
+                UPDATE {schema}.announcements 
+                SET status = 'closed' 
+                WHERE id = %s
+            """, (announcement_id,))
+            conn.commit()
+            refresh_feed_snapshots_quietly(conn, schema)
+            
+            return json_response(event, 200, {'success': True})
+        
+        elif action == 'delete_all':
+            # Удаление всех объявлений (только для админа)
+            admin_code = body.get('admin_code', '')
+            
+            if admin_code != 'HELP2025':
+                return error_response(event, 403, 'Неверный код')
+            
+            cursor.execute(f"DELETE FROM {schema}.announcements")
+            deleted_count = cursor.rowcount
+            cursor.execute(f"DELETE FROM {schema}.announcements_archive")
+            deleted_count += cursor.rowcount
+            conn.commit()
+            stats_cache.invalidate('total_announcement_views')
+            refresh_feed_snapshots_quietly(conn, schema)
+            
+            return json_response(event, 200, {
+                'success': True,
+                'deleted': deleted_count,
+                'message': f'Удалено {deleted_count} объявлений'
+            })
+        
+        elif action == 'delete':
+            # Удаление конкретного объявления (только для админа)
+            admin_code = body.get('admin_code', '')
+            announcement_id = body.get('id')
+            
+            if admin_code != 'HELP2025':
+                return error_response(event, 403, 'Неверный код')
+            
+            cursor.execute(f"DELETE FROM {schema}.announcements WHERE id = %s", (announcement_id,))
+            cursor.execute(f"DELETE FROM {schema}.announcements_archive WHERE id = %s", (announcement_id,))
+            conn.commit()
+            stats_cache.invalidate('total_announcement_views')
+            refresh_feed_snapshots_quietly(conn, schema)
+            
+            return json_response(event, 200, {
+                'success': True,
+                'message': 'Объявление удалено'
+            })
     
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+    return error_response(event, 405, 'Метод не поддерживается')
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class MemoryCacheBackend:
+    """LRU-кэш в памяти контейнера"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item
+
+    def set(self, key: str, item: tuple):
+        with self._lock:
+            self._items[key] = item
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            for key in [k for k in self._items if k.startswith(prefix)]:
+                del self._items[key]
+
+class FileCacheBackend:
+    """Кэш в локальных файлах: по файлу на ключ, переживает пересоздание модуля"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key.replace('/', '_') + '.json')
+
+    def get(self, key: str):
+        try:
+            with open(self._path(key)) as f:
+                expires_at, value = json.load(f)
+            return expires_at, value
+        except (OSError, ValueError):
+            return None
+
+    def set(self, key: str, item: tuple):
+        # Запись через временный файл, чтобы читатель не увидел половину JSON
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}'
+        with open(tmp_path, 'w') as f:
+            json.dump(list(item), f)
+        os.replace(tmp_path, path)
+
+    def delete_prefix(self, prefix: str):
+        file_prefix = prefix.replace('/', '_')
+        for name in os.listdir(self.directory):
+            if name.startswith(file_prefix) and name.endswith('.json'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+class StatsCache:
+    """Кэш метрик админ-статистики с TTL; ключи вида 'метрика' или 'метрика:параметры'"""
+
+    def __init__(self, backend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get_many(self, keys: list) -> dict:
+        """Вернуть все значения или пустой dict, если хотя бы одно отсутствует или устарело"""
+        found = {}
+        now = time.time()
+        for key in keys:
+            item = self.backend.get(key)
+            if item is None or item[0] < now:
+                self.stats['misses'] += 1
+                return {}
+            found[key] = item[1]
+        self.stats['hits'] += 1
+        return found
+
+    def set_many(self, values: dict):
+        expires_at = time.time() + self.ttl
+        for key, value in values.items():
+            self.backend.set(key, (expires_at, value))
+
+    def invalidate(self, *metrics: str):
+        """Сбросить метрики вместе со всеми их параметризованными вариантами"""
+        for metric in metrics:
+            self.backend.delete_prefix(metric)
+        self.stats['invalidations'] += 1
+
+def create_stats_cache() -> StatsCache:
+    """Собрать кэш по настройкам окружения: STATS_CACHE_BACKEND=memory|file"""
+    ttl = float(os.environ.get('STATS_CACHE_TTL', '30'))
+    if os.environ.get('STATS_CACHE_BACKEND', 'memory') == 'file':
+        backend = FileCacheBackend(os.environ.get('STATS_CACHE_DIR', '/tmp/stats_cache'))
+    else:
+        backend = MemoryCacheBackend(int(os.environ.get('STATS_CACHE_MAX_ENTRIES', '128')))
+    return StatsCache(backend, ttl)
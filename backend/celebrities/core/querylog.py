@@ -0,0 +1,250 @@
+import json
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from core.lazy import lazy_import
+
+hashlib = lazy_import('hashlib')
+psycopg2 = lazy_import('psycopg2')
+
+# Порог медленного запроса и как часто снимать EXPLAIN для одного и того же отпечатка
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', '200'))
+SLOW_QUERY_EXPLAIN_INTERVAL = float(os.environ.get('SLOW_QUERY_EXPLAIN_INTERVAL', '300'))
+REQUEST_LOG = os.environ.get('REQUEST_LOG', '1') != '0'
+# Сколько разных отпечатков держать в счётчиках контейнера; остальные копятся в «прочих»
+QUERY_STATS_MAX_FINGERPRINTS = int(os.environ.get('QUERY_STATS_MAX_FINGERPRINTS', '300'))
+
+EXPLAINABLE = ('select', 'with', 'insert', 'update', 'delete')
+
+_LITERALS = [
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%\(\w+\)s|%s'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+]
+
+@lru_cache(maxsize=512)
+def fingerprint(query) -> tuple:
+    """Нормализованный текст запроса без литералов и параметров и короткий id по нему"""
+    if isinstance(query, bytes):
+        query = query.decode(errors='replace')
+    text = str(query)
+    for pattern, replacement in _LITERALS:
+        text = pattern.sub(replacement, text)
+    text = text.strip()
+    return hashlib.sha1(text.encode()).hexdigest()[:12], text
+
+_local = threading.local()
+_lock = threading.Lock()
+_explained_at = {}
+stats = {'requests': 0, 'errors': 0, 'queries': 0, 'db_ms': 0.0, 'slow_queries': 0, 'fingerprints': {}}
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+def record(query, params, duration_ms: float, rows: int, cursor):
+    """Учесть выполненный запрос в трассе текущего вызова и в счётчиках контейнера"""
+    query_id, text = fingerprint(query)
+    slow = duration_ms >= SLOW_QUERY_MS
+    explain = False
+
+    trace = current_trace()
+    if trace is not None:
+        trace['queries'] += 1
+        trace['db_ms'] += duration_ms
+        trace['rows'] += rows
+        per_query = trace['by_fingerprint'].setdefault(query_id, [0, 0.0])
+        per_query[0] += 1
+        per_query[1] += duration_ms
+        if slow:
+            trace['slow_queries'] += 1
+
+    with _lock:
+        stats['queries'] += 1
+        stats['db_ms'] += duration_ms
+        fingerprints = stats['fingerprints']
+        key = query_id if query_id in fingerprints or len(fingerprints) < QUERY_STATS_MAX_FINGERPRINTS else 'other'
+        entry = fingerprints.setdefault(key, {
+            'query': text[:300] if key != 'other' else '',
+            'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'rows': 0, 'slow': 0
+        })
+        entry['calls'] += 1
+        entry['total_ms'] += duration_ms
+        entry['max_ms'] = max(entry['max_ms'], duration_ms)
+        entry['rows'] += rows
+        if slow:
+            entry['slow'] += 1
+            stats['slow_queries'] += 1
+            now = time.monotonic()
+            last_explained = _explained_at.get(query_id)
+            explain = cursor is not None and (last_explained is None or
+                                              now - last_explained >= SLOW_QUERY_EXPLAIN_INTERVAL)
+            if explain:
+                _explained_at[query_id] = now
+
+    if slow:
+        log_slow_query(query_id, text, query, params, duration_ms, rows, cursor, explain)
+
+def explain_plan(query, params, cursor):
+    """План медленного запроса (EXPLAIN без ANALYZE: запрос повторно не выполняется)"""
+    if isinstance(query, bytes):
+        query = query.decode(errors='replace')
+    if not query.lstrip().lower().startswith(EXPLAINABLE):
+        return None
+    conn = cursor.connection
+    in_transaction = not conn.autocommit and \
+        conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+    # Обычный курсор соединения, чтобы EXPLAIN не попал в учёт
+    cur = psycopg2.extensions.cursor(conn)
+    try:
+        # Ошибка EXPLAIN не должна ломать транзакцию обработчика
+        if in_transaction:
+            cur.execute('SAVEPOINT querylog_explain')
+        try:
+            cur.execute('EXPLAIN ' + query, params)
+            plan = '\n'.join(row[0] for row in cur.fetchall())
+        except psycopg2.Error as e:
+            plan = f'EXPLAIN не удался: {e}'
+            if in_transaction:
+                cur.execute('ROLLBACK TO SAVEPOINT querylog_explain')
+        if in_transaction:
+            cur.execute('RELEASE SAVEPOINT querylog_explain')
+        return plan
+    except psycopg2.Error:
+        return None
+    finally:
+        cur.close()
+
+def log_slow_query(query_id: str, text: str, query, params, duration_ms: float, rows: int, cursor, explain: bool):
+    print(json.dumps({
+        'type': 'slow_query',
+        'fingerprint': query_id,
+        'query': text[:1000],
+        'duration_ms': round(duration_ms, 2),
+        'rows': rows,
+        'plan': explain_plan(query, params, cursor) if explain else None
+    }, ensure_ascii=False))
+
+class InstrumentedCursor:
+    """Курсор psycopg2, который замеряет каждый execute; остальное проксируется как есть"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=None):
+        started = time.perf_counter()
+        try:
+            result = self._cursor.execute(query, params)
+        except Exception:
+            # Упавший запрос тоже учитывается, но без EXPLAIN: транзакция уже прервана
+            record(query, params, (time.perf_counter() - started) * 1000, 0, None)
+            raise
+        record(query, params, (time.perf_counter() - started) * 1000, max(self._cursor.rowcount, 0), self._cursor)
+        return result
+
+    def __getattr__(self, attr):
+        return getattr(self._cursor, attr)
+
+    def __setattr__(self, attr, value):
+        # Настройки курсора (itersize, arraysize) должны попадать в сам курсор, а не в обёртку
+        if attr.startswith('_'):
+            object.__setattr__(self, attr, value)
+        else:
+            setattr(self._cursor, attr, value)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+_connection_class = None
+
+def connection_factory():
+    """Класс соединения, у которого все курсоры (и в хелперах функций) замеряются"""
+    global _connection_class
+    if _connection_class is None:
+        class InstrumentedConnection(psycopg2.extensions.connection):
+            def cursor(self, *args, **kwargs):
+                return InstrumentedCursor(super().cursor(*args, **kwargs))
+        _connection_class = InstrumentedConnection
+    return _connection_class
+
+def request_label(event: dict) -> str:
+    """Что за вызов: метод и action из тела или имена параметров запроса (без значений)"""
+    method = event.get('httpMethod')
+    if method is None:
+        return 'timer'
+    if method == 'POST':
+        try:
+            action = json.loads(event.get('body') or '{}').get('action')
+        except (ValueError, AttributeError):
+            action = None
+        return f'POST {action}' if action else 'POST'
+    params = sorted((event.get('queryStringParameters') or {}).keys())
+    return f"{method} {','.join(params)}" if params else method
+
+def start_request(event: dict) -> dict:
+    trace = {
+        'label': request_label(event),
+        'started': time.perf_counter(),
+        'queries': 0, 'db_ms': 0.0, 'rows': 0, 'slow_queries': 0,
+        'by_fingerprint': {}, 'error': None
+    }
+    _local.trace = trace
+    return trace
+
+def finish_request(trace: dict, response: dict):
+    """Закрыть трассу вызова: счётчики контейнера и одна структурированная строка в лог"""
+    _local.trace = None
+    duration_ms = (time.perf_counter() - trace['started']) * 1000
+    with _lock:
+        stats['requests'] += 1
+        if trace['error']:
+            stats['errors'] += 1
+    if not REQUEST_LOG:
+        return
+
+    top = sorted(trace['by_fingerprint'].items(), key=lambda item: -item[1][1])[:3]
+    print(json.dumps({
+        'type': 'request',
+        'request': trace['label'],
+        'status': (response or {}).get('statusCode'),
+        'duration_ms': round(duration_ms, 2),
+        'db_queries': trace['queries'],
+        'db_ms': round(trace['db_ms'], 2),
+        'db_rows': trace['rows'],
+        'slow_queries': trace['slow_queries'],
+        'top_queries': [{'fingerprint': k, 'calls': v[0], 'ms': round(v[1], 2)} for k, v in top],
+        'error': trace['error']
+    }, ensure_ascii=False))
+
+def snapshot(limit: int = 20) -> dict:
+    """Счётчики контейнера для админки: итоги и самые дорогие отпечатки по суммарному времени"""
+    with _lock:
+        fingerprints = sorted(stats['fingerprints'].items(), key=lambda item: -item[1]['total_ms'])[:limit]
+        return {
+            'requests': stats['requests'],
+            'errors': stats['errors'],
+            'queries': stats['queries'],
+            'queries_per_request': round(stats['queries'] / stats['requests'], 2) if stats['requests'] else 0,
+            'db_ms': round(stats['db_ms'], 2),
+            'slow_queries': stats['slow_queries'],
+            'slow_query_ms': SLOW_QUERY_MS,
+            'top': [
+                {
+                    'fingerprint': key,
+                    **entry,
+                    'total_ms': round(entry['total_ms'], 2),
+                    'max_ms': round(entry['max_ms'], 2),
+                    'avg_ms': round(entry['total_ms'] / entry['calls'], 2)
+                }
+                for key, entry in fingerprints
+            ]
+        }
@@ -1,211 +1,169 @@
 import json
-import os
-import psycopg2
-import requests
-from psycopg2.extras import RealDictCursor
+from core.handler import db_handler
+from core.outbox import enqueue_notification
+from core.caching import etag_matches, list_cache_headers, list_etag, not_modified
+from core.response import error_response, json_response
 
-def send_telegram_notification(message: str):
-    """Отправить уведомление в Telegram"""
-    try:
-        bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
-        chat_id = os.environ.get('TELEGRAM_ADMIN_CHAT_ID')
-        
-        if bot_token and chat_id:
-            url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
-            requests.post(url, json={
-                'chat_id': chat_id,
-                'text': message,
-                'parse_mode': 'HTML'
-            }, timeout=5)
-    except Exception as e:
-        print(f'Ошибка отправки в Telegram: {e}')
+SUGGEST_MIN_LENGTH = 2
+SUGGEST_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
+
+_trgm_schema = None
+
+def trgm_schema(cursor) -> str:
+    """Схема расширения pg_trgm: его функции и оператор вызываются по полному имени, не через search_path"""
+    global _trgm_schema
+    if _trgm_schema is None:
+        cursor.execute("SELECT extnamespace::regnamespace::text AS name FROM pg_extension WHERE extname = 'pg_trgm'")
+        _trgm_schema = cursor.fetchone()['name']
+    return _trgm_schema
 
-def handler(event: dict, context) -> dict:
+def suggest_celebrities(cursor, schema: str, query: str, limit: int) -> list:
+    """Подсказки имён: вхождение или похожее написание (pg_trgm), сначала совпадения по началу"""
+    needle = query.lower()
+    escaped = needle.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    trgm = trgm_schema(cursor)
+    cursor.execute(f"""
+        SELECT MIN(celebrity_name) AS name,
+               COUNT(*) AS requests,
+               BOOL_OR(lower(celebrity_name) LIKE %s) AS prefix_match,
+               MAX({trgm}.similarity(lower(celebrity_name), %s)) AS score
+        FROM {schema}.celebrity_requests
+        WHERE status <> 'rejected'
+          AND (lower(celebrity_name) LIKE %s OR lower(celebrity_name) OPERATOR({trgm}.%%) %s)
+        GROUP BY lower(celebrity_name)
+        ORDER BY prefix_match DESC, score DESC, requests DESC
+        LIMIT %s
+    """, (escaped + '%', needle, '%' + escaped + '%', needle, limit))
+    return [{'name': row['name'], 'requests': row['requests']} for row in cursor.fetchall()]
+
+@db_handler()
+def handler(event: dict, context, conn, cursor, schema: str) -> dict:
     """
     API для обращений к знаменитостям.
     Люди оставляют просьбы о помощи, направленные известным личностям.
+    GET ?suggest= - подсказки имён знаменитостей с числом обращений
     """
     method = event.get('httpMethod', 'GET')
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+    if method == 'GET':
+        query_params = event.get('queryStringParameters') or {}
+        admin_code = query_params.get('admin_code')
+        suggest = (query_params.get('suggest') or '').strip()
+        
+        # Автодополнение имени знаменитости в форме обращения
+        if 'suggest' in query_params:
+            try:
+                limit = min(max(int(query_params.get('limit', SUGGEST_LIMIT)), 1), SUGGEST_MAX_LIMIT)
+            except ValueError:
+                limit = SUGGEST_LIMIT
+            
+            etag = list_etag(cursor, schema, 'celebrity_requests', suggest.lower(), limit)
+            if etag_matches(event, etag):
+                return not_modified(etag)
+            
+            suggestions = []
+            if len(suggest) >= SUGGEST_MIN_LENGTH:
+                suggestions = suggest_celebrities(cursor, schema, suggest[:100], limit)
+            
+            return json_response(event, 200, {'suggestions': suggestions}, headers=list_cache_headers(etag))
+        
+        if admin_code == 'HELP2025':
+            cache_headers = {'Cache-Control': 'no-store'}
+            cursor.execute(f"""
+                SELECT * FROM {schema}.celebrity_requests 
+                ORDER BY created_at DESC
+            """)
+        else:
+            etag = list_etag(cursor, schema, 'celebrity_requests')
+            if etag_matches(event, etag):
+                return not_modified(etag)
+            cache_headers = list_cache_headers(etag)
+            cursor.execute(f"""
+                SELECT id, requester_name, celebrity_name, request_text, status, created_at 
+                FROM {schema}.celebrity_requests 
+                WHERE status <> 'rejected'
+                ORDER BY created_at DESC
+                LIMIT 50
+            """)
+        
+        requests_list = cursor.fetchall()
+        
+        result = []
+        for r in requests_list:
+            result.append({
+                'id': r['id'],
+                'requester_name': r['requester_name'],
+                'requester_contact': r.get('requester_contact', ''),
+                'celebrity_name': r['celebrity_name'],
+                'request_text': r['request_text'],
+                'status': r['status'],
+                'admin_notes': r.get('admin_notes', ''),
+                'created_at': r['created_at'].isoformat() if r['created_at'] else None
+            })
+        
+        return json_response(event, 200, result, headers=cache_headers)
     
-    try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    elif method == 'POST':
+        body = json.loads(event.get('body', '{}'))
+        action = body.get('action')
         
-        if method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            admin_code = query_params.get('admin_code')
+        if action == 'create_request':
+            requester_name = body.get('requester_name', '')
+            requester_contact = body.get('requester_contact', '')
+            celebrity_name = body.get('celebrity_name', '')
+            request_text = body.get('request_text', '')
             
-            if admin_code == 'HELP2025':
-                cursor.execute(f"""
-                    SELECT * FROM {schema}.celebrity_requests 
-                    ORDER BY created_at DESC
-                """)
-            else:
-                cursor.execute(f"""
-                    SELECT id, requester_name, celebrity_name, request_text, status, created_at 
-                    FROM {schema}.celebrity_requests 
-                    WHERE status != 'rejected'
-                    ORDER BY created_at DESC
-                    LIMIT 50
-                """)
+            if not requester_name or not celebrity_name or not request_text:
+                return error_response(event, 400, 'Заполните все поля')
             
-            requests_list = cursor.fetchall()
+            cursor.execute(f"""
+                INSERT INTO {schema}.celebrity_requests 
+                (requester_name, requester_contact, celebrity_name, request_text)
+                VALUES (%s, %s, %s, %s)
+                RETURNING id
+            """, (requester_name, requester_contact, celebrity_name, request_text))
             
-            result = []
-            for r in requests_list:
-                result.append({
-                    'id': r['id'],
-                    'requester_name': r['requester_name'],
-                    'requester_contact': r.get('requester_contact', ''),
-                    'celebrity_name': r['celebrity_name'],
-                    'request_text': r['request_text'],
-                    'status': r['status'],
-                    'admin_notes': r.get('admin_notes', ''),
-                    'created_at': r['created_at'].isoformat() if r['created_at'] else None
-                })
+            request_id = cursor.fetchone()['id']
             
-            return {
-                'statusCode': 200,
-                'headers': {
-                    'Content-Type': 'application/json',
-                    'Access-Control-Allow-Origin': '*'
-                },
-                'body': json.dumps(result),
-                'isBase64Encoded': False
-            }
-        
-        elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action')
+            amount = 60
+            ozon_card = '2204321081688079'
             
-            if action == 'create_request':
-                requester_name = body.get('requester_name', '')
-                requester_contact = body.get('requester_contact', '')
-                celebrity_name = body.get('celebrity_name', '')
-                request_text = body.get('request_text', '')
-                
-                if not requester_name or not celebrity_name or not request_text:
-                    return {
-                        'statusCode': 400,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'body': json.dumps({'error': 'Заполните все поля'}),
-                        'isBase64Encoded': False
-                    }
-                
-                cursor.execute(f"""
-                    INSERT INTO {schema}.celebrity_requests 
-                    (requester_name, requester_contact, celebrity_name, request_text)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id
-                """, (requester_name, requester_contact, celebrity_name, request_text))
-                
-                request_id = cursor.fetchone()['id']
-                conn.commit()
-                
-                amount = 60
-                ozon_card = '2204321081688079'
-                
-                send_telegram_notification(
-                    f"⭐ <b>Новое обращение к знаменитости!</b>\n\n"
-                    f"👤 <b>От:</b> {requester_name}\n"
-                    f"🎭 <b>К кому:</b> {celebrity_name}\n"
-                    f"📝 <b>Текст:</b> {request_text[:200]}...\n"
-                    f"📞 <b>Контакт:</b> {requester_contact}\n"
-                    f"💵 <b>Сумма:</b> {amount}₽\n\n"
-                    f"ID обращения: {request_id}"
-                )
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'success': True,
-                        'request_id': request_id,
-                        'amount': amount,
-                        'ozon_card': ozon_card,
-                        'message': f'Обращение создано! Переведите {amount}₽ на карту Ozon {ozon_card} или отсканируйте QR-код в форме'
-                    }),
-                    'isBase64Encoded': False
-                }
+            enqueue_notification(cursor, schema,
+                f"⭐ <b>Новое обращение к знаменитости!</b>\n\n"
+                f"👤 <b>От:</b> {requester_name}\n"
+                f"🎭 <b>К кому:</b> {celebrity_name}\n"
+                f"📝 <b>Текст:</b> {request_text[:200]}...\n"
+                f"📞 <b>Контакт:</b> {requester_contact}\n"
+                f"💵 <b>Сумма:</b> {amount}₽\n\n"
+                f"ID обращения: {request_id}"
+            )
+            conn.commit()
             
-            elif action == 'update_status':
-                admin_code = body.get('admin_code', '')
-                request_id = body.get('request_id')
-                status = body.get('status', 'pending')
-                admin_notes = body.get('admin_notes', '')
-                
-                if admin_code != 'HELP2025':
-                    return {
-                        'statusCode': 403,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'body': json.dumps({'error': 'Неверный код'}),
-                        'isBase64Encoded': False
-                    }
-                
-                cursor.execute(f"""
-                    UPDATE {schema}.celebrity_requests 
-                    SET status = %s, admin_notes = %s
-                    WHERE id = %s
-                """, (status, admin_notes, request_id))
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'success': True}),
-                    'isBase64Encoded': False
-                }
+            return json_response(event, 200, {
+                'success': True,
+                'request_id': request_id,
+                'amount': amount,
+                'ozon_card': ozon_card,
+                'message': f'Обращение создано! Переведите {amount}₽ на карту Ozon {ozon_card} или отсканируйте QR-код в форме'
+            })
         
-        cursor.close()
-        conn.close()
-        
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
+        elif action == 'update_status':
+            admin_code = body.get('admin_code', '')
+            request_id = body.get('request_id')
+            status = body.get('status', 'pending')
+            admin_notes = body.get('admin_notes', '')
+            
+            if admin_code != 'HELP2025':
+                return error_response(event, 403, 'Неверный код')
+            
+            cursor.execute(f"""
+                UPDATE {schema}.celebrity_requests 
+                SET status = %s, admin_notes = %s
+                WHERE id = %s
+            """, (status, admin_notes, request_id))
+            conn.commit()
+            
+            return json_response(event, 200, {'success': True})
     
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
\ No newline at end of file
+    return error_response(event, 405, 'Метод не поддерживается')
@@ -0,0 +1,7 @@
+"""Общее ядро облачных функций: пул БД, ответы, условный GET, outbox, обёртка обработчика,
+учёт запросов к БД.
+
+Каждая функция деплоится отдельной папкой и не видит соседние, поэтому пакет
+копируется в backend/<функция>/core скриптом scripts/sync_core.py; править
+нужно только backend/core.
+"""
@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from core import querylog
+from core.lazy import lazy_import
+
+# psycopg2 грузится при первом подключении, а не при импорте функции (preflight, холодный старт)
+psycopg2 = lazy_import('psycopg2')
+psycopg2_pool = lazy_import('psycopg2.pool')
+
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', '4'))
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get('DB_POOL_IDLE_TIMEOUT', '300'))
+DB_POOL_WAIT_TIMEOUT = float(os.environ.get('DB_POOL_WAIT_TIMEOUT', '5'))
+DB_POOL_HEALTHCHECK_AFTER = float(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', '30'))
+
+class ConnectionPool:
+    """Пул соединений с БД, переживающий повторное использование тёплого контейнера"""
+
+    def __init__(self, dsn: str, max_size: int, idle_timeout: float, wait_timeout: float):
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.wait_timeout = wait_timeout
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self.stats = {'hits': 0, 'misses': 0, 'reconnects': 0, 'evicted': 0, 'wait_time_ms': 0.0}
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        alive = []
+        for conn, released_at in self._idle:
+            if now - released_at > self.idle_timeout or conn.closed:
+                self._size -= 1
+                self.stats['evicted'] += 1
+                self._close_quietly(conn)
+            else:
+                alive.append((conn, released_at))
+        self._idle = alive
+
+    def _is_healthy(self, conn) -> bool:
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        """Взять соединение из пула или открыть новое, если есть свободный слот"""
+        started = time.monotonic()
+        conn, idle_for = None, 0.0
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    idle_for = time.monotonic() - released_at
+                    self.stats['hits'] += 1
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    self.stats['misses'] += 1
+                    break
+                remaining = self.wait_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise psycopg2_pool.PoolError('Пул соединений исчерпан')
+                self._cond.wait(remaining)
+            self.stats['wait_time_ms'] += (time.monotonic() - started) * 1000
+        
+        if conn is not None and idle_for > DB_POOL_HEALTHCHECK_AFTER and not self._is_healthy(conn):
+            self._close_quietly(conn)
+            self.stats['reconnects'] += 1
+            conn = None
+        
+        if conn is None:
+            try:
+                conn = psycopg2.connect(self.dsn, connection_factory=querylog.connection_factory())
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def putconn(self, conn, broken: bool = False):
+        """Вернуть соединение в пул; сломанное закрывается и освобождает слот"""
+        if not broken and not conn.closed:
+            try:
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                broken = True
+        with self._cond:
+            if broken or conn.closed:
+                self._size -= 1
+                self._close_quietly(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ConnectionPool:
+    """Лениво создать пул при первом запросе в контейнере"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    os.environ['DATABASE_URL'],
+                    DB_POOL_MAX_SIZE,
+                    DB_POOL_IDLE_TIMEOUT,
+                    DB_POOL_WAIT_TIMEOUT
+                )
+    return _pool
+
+def get_schema() -> str:
+    return os.environ.get('MAIN_DB_SCHEMA', 'public')
+
+def is_connection_error(e: Exception) -> bool:
+    """Ошибка самого соединения: такое соединение в пул не возвращается"""
+    return isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
@@ -0,0 +1,34 @@
+import json
+from core.lazy import lazy_import
+
+hashlib = lazy_import('hashlib')
+
+def list_etag(cursor, schema: str, name: str, *variant) -> str:
+    """Слабый ETag списка: версия таблицы (растёт триггером при любой записи) и параметры запроса"""
+    cursor.execute(f"SELECT version FROM {schema}.list_versions WHERE name = %s", (name,))
+    row = cursor.fetchone()
+    version = row['version'] if row else 0
+    digest = hashlib.sha1(json.dumps(variant).encode()).hexdigest()[:12]
+    return f'W/"{name}-{version}-{digest}"'
+
+def etag_matches(event: dict, etag: str) -> bool:
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    tags = [t.strip() for t in (headers.get('if-none-match') or '').split(',')]
+    tags = {t[2:] if t.startswith('W/') else t for t in tags if t}
+    return '*' in tags or etag[2:] in tags
+
+def list_cache_headers(etag: str) -> dict:
+    # no-cache: браузер хранит ответ, но каждый раз сверяет ETag (дешёвый 304), поэтому
+    # перезагрузка списка сразу после своей записи видит изменение
+    return {
+        'ETag': etag,
+        'Cache-Control': 'no-cache'
+    }
+
+def not_modified(etag: str) -> dict:
+    return {
+        'statusCode': 304,
+        'headers': {'Access-Control-Allow-Origin': '*', **list_cache_headers(etag)},
+        'body': '',
+        'isBase64Encoded': False
+    }
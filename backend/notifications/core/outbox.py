@@ -0,0 +1,6 @@
+def enqueue_notification(cursor, schema: str, message: str):
+    """Поставить уведомление в Telegram в outbox в текущей транзакции"""
+    cursor.execute(f"""
+        INSERT INTO {schema}.notification_outbox (message)
+        VALUES (%s)
+    """, (message,))
@@ -0,0 +1,161 @@
+import json
+import os
+import random
+import time
+from core.handler import db_handler
+from core.lazy import lazy_import
+from core.response import error_response, json_response
+
+requests = lazy_import('requests')
+
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '20'))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', '8'))
+OUTBOX_LEASE_SECONDS = int(os.environ.get('OUTBOX_LEASE_SECONDS', '60'))
+OUTBOX_TIME_BUDGET = float(os.environ.get('OUTBOX_TIME_BUDGET', '20'))
+TELEGRAM_API_URL = os.environ.get('TELEGRAM_API_URL', 'https://api.telegram.org')
+TELEGRAM_MIN_INTERVAL = float(os.environ.get('TELEGRAM_MIN_INTERVAL', '1.0'))
+
+_session = None
+
+def get_session() -> 'requests.Session':
+    """HTTP-сессия с keep-alive к Telegram, общая для тёплых вызовов"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
+
+def retry_delay(attempts: int) -> float:
+    """Экспоненциальная задержка с джиттером: 2, 4, 8... секунд, не больше 15 минут"""
+    base = min(2 ** attempts, 900)
+    return base / 2 + random.uniform(0, base / 2)
+
+def send_telegram(message: str) -> tuple:
+    """Отправить сообщение; вернуть (успех, пауза rate limit в секундах или None, ошибка, можно ли повторить)"""
+    bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
+    chat_id = os.environ.get('TELEGRAM_ADMIN_CHAT_ID')
+    if not bot_token or not chat_id:
+        return False, None, 'Telegram не настроен', True
+    
+    try:
+        response = get_session().post(f'{TELEGRAM_API_URL}/bot{bot_token}/sendMessage', json={
+            'chat_id': chat_id,
+            'text': message,
+            'parse_mode': 'HTML'
+        }, timeout=(3, 5))
+    except requests.RequestException as e:
+        return False, None, str(e), True
+    
+    if response.status_code == 429:
+        try:
+            retry_after = response.json().get('parameters', {}).get('retry_after', 30)
+        except ValueError:
+            retry_after = 30
+        return False, float(retry_after), 'Too Many Requests', True
+    if response.status_code >= 400:
+        # 4xx кроме 429 (неверный запрос, бот заблокирован в чате) повтором не лечится
+        return False, None, f'HTTP {response.status_code}: {response.text[:200]}', response.status_code >= 500
+    return True, None, None, False
+
+def claim_batch(conn, cursor, schema: str, limit: int) -> list:
+    """Захватить пачку готовых к отправке уведомлений на время аренды"""
+    cursor.execute(f"""
+        UPDATE {schema}.notification_outbox
+        SET next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+        WHERE id IN (
+            SELECT id FROM {schema}.notification_outbox
+            WHERE sent_at IS NULL AND failed_at IS NULL AND next_attempt_at <= CURRENT_TIMESTAMP
+            ORDER BY id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, message, attempts
+    """, (OUTBOX_LEASE_SECONDS, limit))
+    batch = sorted(cursor.fetchall(), key=lambda row: row['id'])
+    conn.commit()
+    return batch
+
+def drain_outbox(conn, cursor, schema: str) -> dict:
+    """Разослать накопившиеся уведомления с учётом ретраев и лимитов Telegram"""
+    started = time.monotonic()
+    result = {'sent': 0, 'retried': 0, 'failed': 0, 'rate_limited': False}
+    last_sent_at = 0.0
+    
+    while time.monotonic() - started < OUTBOX_TIME_BUDGET:
+        batch = claim_batch(conn, cursor, schema, OUTBOX_BATCH_SIZE)
+        if not batch:
+            break
+        
+        for index, row in enumerate(batch):
+            if time.monotonic() - started >= OUTBOX_TIME_BUDGET:
+                # Время вызова на исходе: возвращаем аренду неразосланных записей
+                cursor.execute(f"""
+                    UPDATE {schema}.notification_outbox
+                    SET next_attempt_at = CURRENT_TIMESTAMP
+                    WHERE id = ANY(%s)
+                """, ([r['id'] for r in batch[index:]],))
+                conn.commit()
+                return result
+            
+            # Не чаще одного сообщения в TELEGRAM_MIN_INTERVAL секунд в один чат
+            pause = TELEGRAM_MIN_INTERVAL - (time.monotonic() - last_sent_at)
+            if pause > 0:
+                time.sleep(pause)
+            
+            ok, retry_after, error, retryable = send_telegram(row['message'])
+            last_sent_at = time.monotonic()
+            attempts = row['attempts'] + 1
+            
+            if ok:
+                cursor.execute(f"""
+                    UPDATE {schema}.notification_outbox
+                    SET sent_at = CURRENT_TIMESTAMP, attempts = %s, last_error = NULL
+                    WHERE id = %s
+                """, (attempts, row['id']))
+                result['sent'] += 1
+            elif retry_after is not None:
+                # Rate limit: откладываем эту и оставшиеся записи пачки, попытку не засчитываем
+                cursor.execute(f"""
+                    UPDATE {schema}.notification_outbox
+                    SET next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s), last_error = %s
+                    WHERE id = ANY(%s)
+                """, (retry_after, error, [r['id'] for r in batch[index:]]))
+                conn.commit()
+                result['rate_limited'] = True
+                return result
+            elif not retryable or attempts >= OUTBOX_MAX_ATTEMPTS:
+                cursor.execute(f"""
+                    UPDATE {schema}.notification_outbox
+                    SET failed_at = CURRENT_TIMESTAMP, attempts = %s, last_error = %s
+                    WHERE id = %s
+                """, (attempts, error, row['id']))
+                result['failed'] += 1
+            else:
+                cursor.execute(f"""
+                    UPDATE {schema}.notification_outbox
+                    SET next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s),
+                        attempts = %s, last_error = %s
+                    WHERE id = %s
+                """, (retry_delay(attempts), attempts, error, row['id']))
+                result['retried'] += 1
+            conn.commit()
+    
+    return result
+
+@db_handler(methods='POST, OPTIONS')
+def handler(event: dict, context, conn, cursor, schema: str) -> dict:
+    """
+    Фоновая рассылка уведомлений в Telegram из notification_outbox.
+    Вызывается по таймеру (событие без httpMethod) или вручную: POST с admin_code.
+    """
+    method = event.get('httpMethod')
+    
+    if method is not None:
+        body = json.loads(event.get('body') or '{}')
+        if method != 'POST' or body.get('admin_code') != 'HELP2025':
+            return error_response(event, 403, 'Неверный код')
+    
+    result = drain_outbox(conn, cursor, schema)
+    print(f'Outbox: {result}')
+    
+    return json_response(event, 200, {'success': True, **result})
+
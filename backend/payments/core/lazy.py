@@ -0,0 +1,17 @@
+import importlib
+
+class LazyModule:
+    """Модуль, который импортируется при первом обращении к его атрибуту"""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+def lazy_import(name: str) -> LazyModule:
+    """Отложить импорт тяжёлого модуля до первого использования (холодный старт, preflight)"""
+    return LazyModule(name)
@@ -0,0 +1,98 @@
+import base64
+import gzip
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Мелкие ответы не сжимаем: выигрыш в байтах меньше накладных расходов и base64
+COMPRESS_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+# Сколько секунд браузер может не повторять preflight (Chrome ограничивает 7200, Firefox 86400)
+CORS_MAX_AGE = int(os.environ.get('CORS_MAX_AGE', '86400'))
+GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', '6'))
+BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', '5'))
+
+def dumps(data) -> str:
+    """Сериализовать в JSON; orjson, если установлен, иначе стандартный json"""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(data)
+
+def accepted_encodings(event: dict) -> set:
+    """Кодировки из Accept-Encoding запроса, кроме явно запрещённых через q=0"""
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    encodings = set()
+    for part in (headers.get('accept-encoding') or '').split(','):
+        name, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        if name:
+            encodings.add(name.strip().lower())
+    return encodings
+
+def choose_encoding(event: dict):
+    encodings = accepted_encodings(event)
+    if brotli is not None and 'br' in encodings:
+        return 'br'
+    if 'gzip' in encodings:
+        return 'gzip'
+    return None
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+def build_response(event: dict, status: int, body: str, headers: dict = None,
+                   content_type: str = 'application/json') -> dict:
+    """Ответ функции с CORS; тело сжимается, если клиент поддерживает и оно достаточно большое"""
+    response_headers = {
+        'Content-Type': content_type,
+        'Access-Control-Allow-Origin': '*',
+        **(headers or {})
+    }
+    raw = body.encode()
+    encoding = choose_encoding(event) if len(raw) >= COMPRESS_MIN_BYTES else None
+    if encoding is None:
+        return {
+            'statusCode': status,
+            'headers': response_headers,
+            'body': body,
+            'isBase64Encoded': False
+        }
+    response_headers['Content-Encoding'] = encoding
+    response_headers['Vary'] = 'Accept-Encoding'
+    return {
+        'statusCode': status,
+        'headers': response_headers,
+        'body': base64.b64encode(compress(raw, encoding)).decode(),
+        'isBase64Encoded': True
+    }
+
+def json_response(event: dict, status: int, data, headers: dict = None) -> dict:
+    return build_response(event, status, dumps(data), headers)
+
+def error_response(event: dict, status: int, message: str) -> dict:
+    return json_response(event, status, {'error': message})
+
+def preflight_response(methods: str) -> dict:
+    """Ответ на CORS-preflight (OPTIONS) с кэшированием в браузере на CORS_MAX_AGE секунд"""
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Allow-Methods': methods,
+            'Access-Control-Allow-Headers': 'Content-Type',
+            'Access-Control-Max-Age': str(CORS_MAX_AGE)
+        },
+        'body': '',
+        'isBase64Encoded': False
+    }
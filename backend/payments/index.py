@@ -1,391 +1,627 @@
 import json
 import os
-import psycopg2
-import requests
-import hashlib
+import uuid
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+import tinkoff
+from core.handler import db_handler
+from core.db import get_pool
+from core.outbox import enqueue_notification
+from core.lazy import lazy_import
+from core.response import error_response, json_response
 
-def calculate_token(params: dict, password: str) -> str:
-    """Вычислить токен для подписи запроса к Тинькофф API"""
-    values = {k: str(v) for k, v in params.items() if k != 'Token'}
-    values['Password'] = password
-    sorted_values = sorted(values.items())
-    concatenated = ''.join([str(v) for k, v in sorted_values])
-    return hashlib.sha256(concatenated.encode()).hexdigest()
+extras = lazy_import('psycopg2.extras')
 
-def send_telegram_notification(message: str):
-    """Отправить уведомление в Telegram"""
+PAID_STATUSES = {'CONFIRMED'}
+FAILED_STATUSES = {'REJECTED', 'CANCELED', 'DEADLINE_EXPIRED', 'AUTH_FAIL'}
+
+PRICES = {'regular': 10, 'boosted': 20, 'vip': 100}
+TYPE_NAMES = {'regular': 'Обычное', 'boosted': 'Поднятое', 'vip': 'VIP'}
+
+def create_payment_draft(conn, schema: str, idempotency_key: str, announcement: tuple) -> dict:
+    """Создать объявление и черновик платежа одной транзакцией или вернуть уже созданный по ключу"""
+    with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
+        cur.execute(f"SELECT * FROM {schema}.payments WHERE idempotency_key = %s", (idempotency_key,))
+        existing = cur.fetchone()
+        if existing and existing['state'] == 'failed' and existing['payment_id'] is None:
+            existing = reopen_failed_draft(cur, schema, existing)
+        if existing:
+            conn.commit()
+            return existing
+        
+        cur.execute(f"""
+            INSERT INTO {schema}.announcements 
+            (title, description, category, author_name, author_contact, type, payment_amount, payment_status, expires_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            RETURNING id, payment_amount
+        """, announcement)
+        created = cur.fetchone()
+        
+        order_id = f"ann_{created['id']}_{int(datetime.now().timestamp())}"
+        cur.execute(f"""
+            INSERT INTO {schema}.payments (order_id, idempotency_key, announcement_id, amount, state)
+            VALUES (%s, %s, %s, %s, 'draft')
+            ON CONFLICT (idempotency_key) DO NOTHING
+            RETURNING *
+        """, (order_id, idempotency_key, created['id'], created['payment_amount']))
+        payment = cur.fetchone()
+        
+        if payment is None:
+            # Параллельный дубль успел первым: откатываем своё объявление и берём его платёж
+            conn.rollback()
+            cur.execute(f"SELECT * FROM {schema}.payments WHERE idempotency_key = %s", (idempotency_key,))
+            payment = cur.fetchone()
+        conn.commit()
+        return payment
+
+def reopen_failed_draft(cur, schema: str, payment: dict) -> dict:
+    """Вернуть в draft платёж, на котором не прошёл Init: повтор с тем же ключом пойдёт с новым OrderId.
+    
+    Платёж, уже созданный в банке (есть payment_id), не переоткрывается: по нему ещё может
+    прийти подтверждение.
+    """
+    cur.execute(f"""
+        UPDATE {schema}.announcements SET payment_status = 'pending'
+        WHERE id = %s AND payment_status = 'failed'
+        RETURNING id
+    """, (payment['announcement_id'],))
+    if cur.fetchone():
+        # Тинькофф не принимает повторный Init с тем же OrderId
+        cur.execute(f"""
+            UPDATE {schema}.payments
+            SET order_id = %s, state = 'draft', error = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE order_id = %s AND state = 'failed' AND payment_id IS NULL
+            RETURNING *
+        """, (f"ann_{payment['announcement_id']}_{int(datetime.now().timestamp())}_{uuid.uuid4().hex[:6]}",
+              payment['order_id']))
+        reopened = cur.fetchone()
+        if reopened:
+            return reopened
+    # Объявление уже в архиве или параллельный повтор успел первым: берём текущее состояние
+    cur.execute(f"SELECT * FROM {schema}.payments WHERE idempotency_key = %s", (payment['idempotency_key'],))
+    return cur.fetchone()
+
+@contextmanager
+def payment_lock(conn, order_id: str):
+    """Сессионная advisory-блокировка заказа: переживает коммиты между переходами состояний"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_try_advisory_lock(hashtext(%s))", (order_id,))
+        acquired = cur.fetchone()[0]
+    conn.commit()
     try:
-        bot_token = os.environ.get('TELEGRAM_BOT_TOKEN')
-        chat_id = os.environ.get('TELEGRAM_ADMIN_CHAT_ID')
+        yield acquired
+    finally:
+        if acquired and not conn.closed:
+            # В прерванной ошибкой транзакции unlock не выполнится и блокировка останется
+            # на соединении в пуле; откат сессионную блокировку не снимает
+            conn.rollback()
+            with conn.cursor() as cur:
+                cur.execute("SELECT pg_advisory_unlock(hashtext(%s))", (order_id,))
+            conn.commit()
+
+def advance_payment(conn, schema: str, payment: dict, description: str) -> dict:
+    """Провести платёж по состояниям draft → initiated → qr_issued, по коммиту на переход"""
+    with conn.cursor(cursor_factory=extras.RealDictCursor) as cur:
+        # Свежее состояние: пока ждали блокировку, платёж мог продвинуть другой запрос
+        cur.execute(f"SELECT * FROM {schema}.payments WHERE order_id = %s", (payment['order_id'],))
+        payment = cur.fetchone()
+        
+        if payment['state'] == 'draft':
+            tinkoff_data = tinkoff.init_payment(payment['amount'] * 100, payment['order_id'], description)
+            
+            if not tinkoff_data.get('Success'):
+                # Init не прошёл: черновик и объявление помечаются неудачными, сирот не остаётся
+                cur.execute(f"""
+                    UPDATE {schema}.payments
+                    SET state = 'failed', error = %s, updated_at = CURRENT_TIMESTAMP
+                    WHERE order_id = %s
+                    RETURNING *
+                """, (tinkoff_data.get('Message', 'Unknown error'), payment['order_id']))
+                payment = cur.fetchone()
+                cur.execute(f"""
+                    UPDATE {schema}.announcements SET payment_status = 'failed' WHERE id = %s
+                """, (payment['announcement_id'],))
+                conn.commit()
+                return payment
+            
+            cur.execute(f"""
+                UPDATE {schema}.payments
+                SET state = 'initiated', payment_id = %s, payment_url = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE order_id = %s
+                RETURNING *
+            """, (str(tinkoff_data.get('PaymentId')), tinkoff_data.get('PaymentURL', ''), payment['order_id']))
+            payment = cur.fetchone()
+            cur.execute(f"""
+                UPDATE {schema}.announcements SET payment_id = %s WHERE id = %s
+            """, (payment['payment_id'], payment['announcement_id']))
+            conn.commit()
         
-        if bot_token and chat_id:
-            url = f'https://api.telegram.org/bot{bot_token}/sendMessage'
-            requests.post(url, json={
-                'chat_id': chat_id,
-                'text': message,
-                'parse_mode': 'HTML'
-            }, timeout=5)
-    except Exception as e:
-        print(f'Ошибка отправки в Telegram: {e}')
+        if payment['state'] == 'initiated':
+            # Генерируем QR-код для СБП (DYNAMIC = настоящий СБП QR)
+            qr_data = tinkoff.get_qr(payment['payment_id'])
+            print(f"GetQr response: {qr_data}")
+            qr_code_data = qr_data.get('Data', '')
+            
+            # Если СБП QR не получен — используем PaymentURL
+            if not qr_code_data:
+                print(f"GetQr failed, fallback to PaymentURL. Error: {qr_data.get('Message', '')}")
+                qr_code_data = payment['payment_url']
+            
+            cur.execute(f"""
+                UPDATE {schema}.payments
+                SET state = 'qr_issued', qr_code = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE order_id = %s
+                RETURNING *
+            """, (qr_code_data, payment['order_id']))
+            payment = cur.fetchone()
+            
+            cur.execute(f"""
+                SELECT title, category, type, author_name, author_contact
+                FROM {schema}.announcements WHERE id = %s
+            """, (payment['announcement_id'],))
+            ann = cur.fetchone()
+            enqueue_notification(cur, schema,
+                f"🔔 <b>Новое объявление ожидает оплаты</b>\n\n"
+                f"📝 <b>Заголовок:</b> {ann['title']}\n"
+                f"📂 <b>Категория:</b> {ann['category']}\n"
+                f"🏷 <b>Тип:</b> {TYPE_NAMES.get(ann['type'], ann['type'])}\n"
+                f"💵 <b>Сумма:</b> {payment['amount']}₽\n"
+                f"👤 <b>Автор:</b> {ann['author_name']}\n"
+                f"📞 <b>Контакт:</b> {ann['author_contact']}\n\n"
+                f"💳 Оплата через Тинькофф СБП\n"
+                f"🆔 ID объявления: {payment['announcement_id']}\n"
+                f"🆔 Payment ID: {payment['payment_id']}"
+            )
+            conn.commit()
+    
+    return payment
+
+def notify_payment_confirmed(cursor, schema: str, announcement_id: int, amount: int, payment_id: str, source: str):
+    enqueue_notification(cursor, schema,
+        f"✅ <b>Платёж подтверждён автоматически!</b>\n\n"
+        f"🆔 ID объявления: {announcement_id}\n"
+        f"💵 Сумма: {amount}₽\n"
+        f"💳 Payment ID: {payment_id}\n"
+        f"📡 Источник: {source}"
+    )
+
+def apply_payment_status(cursor, schema: str, payment_id: str, tinkoff_status: str,
+                         amount_kopecks: int = None, source: str = '') -> bool:
+    """Идемпотентно применить статус платежа к ожидающему оплаты объявлению"""
+    if tinkoff_status in PAID_STATUSES:
+        new_status = 'paid'
+    elif tinkoff_status in FAILED_STATUSES:
+        new_status = 'failed'
+    else:
+        return False
+    
+    # Меняем только pending (или просроченный failed, если оплата всё же прошла):
+    # повтор того же уведомления ничего не делает
+    cursor.execute(f"""
+        UPDATE {schema}.announcements
+        SET payment_status = %s,
+            paid_at = CASE WHEN %s = 'paid' THEN CURRENT_TIMESTAMP END
+        WHERE payment_id = %s
+          AND (payment_status = 'pending' OR (%s = 'paid' AND payment_status = 'failed'))
+          AND (%s IS NULL OR payment_amount * 100 = %s)
+        RETURNING id, payment_amount
+    """, (new_status, new_status, payment_id, new_status, amount_kopecks, amount_kopecks))
+    updated = cursor.fetchone()
+    if not updated:
+        return False
+    
+    cursor.execute(f"""
+        UPDATE {schema}.payments
+        SET state = %s, updated_at = CURRENT_TIMESTAMP
+        WHERE payment_id = %s
+    """, (new_status, payment_id))
+    
+    if new_status == 'paid':
+        notify_payment_confirmed(cursor, schema, updated[0], updated[1], payment_id, source)
+    return True
+
+RECONCILE_BATCH_SIZE = int(os.environ.get('RECONCILE_BATCH_SIZE', '50'))
+# Потоков не больше, чем соединений в пуле сессии: лишние соединения закрывались бы после запроса
+RECONCILE_WORKERS = min(int(os.environ.get('RECONCILE_WORKERS', '8')), tinkoff.TINKOFF_POOL_SIZE)
+RECONCILE_TIME_BUDGET = float(os.environ.get('RECONCILE_TIME_BUDGET', '20'))
+PENDING_EXPIRY_HOURS = int(os.environ.get('PENDING_EXPIRY_HOURS', '24'))
+
+def fetch_tinkoff_status(payment_id: str):
+    try:
+        return tinkoff.get_state(payment_id).get('Status', '')
+    except tinkoff.TinkoffError as e:
+        print(f'GetState {payment_id}: {e}')
+        return None
+
+def reconcile_pending_payments(conn, cursor, schema: str) -> dict:
+    """Сверить ожидающие оплаты объявления с Тинькофф и просрочить зависшие"""
+    started = time.monotonic()
+    result = {'checked': 0, 'paid': 0, 'failed': 0, 'expired': 0, 'errors': 0,
+              'since_created_seconds_max': None, 'since_created_seconds_avg': None}
+    # Время от создания объявления до подтверждения сверкой. Момент оплаты на стороне банка
+    # неизвестен: ни GetState, ни уведомление Тинькофф его не передают
+    since_created = []
+    after_id = 0
+    
+    with ThreadPoolExecutor(max_workers=RECONCILE_WORKERS) as pool:
+        while time.monotonic() - started < RECONCILE_TIME_BUDGET:
+            cursor.execute(f"""
+                SELECT id, payment_id
+                FROM {schema}.announcements
+                WHERE payment_status = 'pending' AND payment_id IS NOT NULL AND id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (after_id, RECONCILE_BATCH_SIZE))
+            batch = cursor.fetchall()
+            conn.commit()
+            if not batch:
+                break
+            after_id = batch[-1][0]
+            
+            payment_ids = [payment_id for _, payment_id in batch]
+            statuses = list(pool.map(fetch_tinkoff_status, payment_ids))
+            result['checked'] += len(batch)
+            result['errors'] += statuses.count(None)
+            
+            changes = []
+            for payment_id, status in zip(payment_ids, statuses):
+                if status in PAID_STATUSES:
+                    changes.append((payment_id, 'paid'))
+                elif status in FAILED_STATUSES:
+                    changes.append((payment_id, 'failed'))
+            if not changes:
+                continue
+            
+            # Все изменения пачки одним UPDATE; pending-условие защищает от гонки с webhook
+            updated = extras.execute_values(cursor, f"""
+                UPDATE {schema}.announcements AS a
+                SET payment_status = v.status,
+                    paid_at = CASE WHEN v.status = 'paid' THEN CURRENT_TIMESTAMP END
+                FROM (VALUES %s) AS v(payment_id, status)
+                WHERE a.payment_id = v.payment_id AND a.payment_status = 'pending'
+                RETURNING a.id, a.payment_amount, a.payment_id, v.status,
+                          EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - a.created_at) AS since_created
+            """, changes, fetch=True)
+            applied = [(payment_id, status) for _, _, payment_id, status, _ in updated]
+            if applied:
+                extras.execute_values(cursor, f"""
+                    UPDATE {schema}.payments AS p
+                    SET state = v.status, updated_at = CURRENT_TIMESTAMP
+                    FROM (VALUES %s) AS v(payment_id, status)
+                    WHERE p.payment_id = v.payment_id
+                """, applied)
+            for announcement_id, amount, payment_id, status, seconds in updated:
+                result[status] += 1
+                if status == 'paid':
+                    since_created.append(float(seconds))
+                    notify_payment_confirmed(cursor, schema, announcement_id, amount, payment_id, 'сверка платежей')
+            conn.commit()
+    
+    # Зависшие без оплаты (в том числе без payment_id после сбоя Init) помечаем неоплаченными
+    cursor.execute(f"""
+        UPDATE {schema}.announcements
+        SET payment_status = 'failed'
+        WHERE payment_status = 'pending'
+          AND created_at < CURRENT_TIMESTAMP - make_interval(hours => %s)
+        RETURNING id
+    """, (PENDING_EXPIRY_HOURS,))
+    expired_ids = [row[0] for row in cursor.fetchall()]
+    if expired_ids:
+        cursor.execute(f"""
+            UPDATE {schema}.payments
+            SET state = 'failed', error = 'expired', updated_at = CURRENT_TIMESTAMP
+            WHERE announcement_id = ANY(%s) AND state NOT IN ('paid', 'failed')
+        """, (expired_ids,))
+    result['expired'] = len(expired_ids)
+    conn.commit()
+    
+    if since_created:
+        result['since_created_seconds_max'] = round(max(since_created), 1)
+        result['since_created_seconds_avg'] = round(sum(since_created) / len(since_created), 1)
+    return result
+
+QR_POOL_TARGET = int(os.environ.get('QR_POOL_TARGET', '3'))
+QR_POOL_TTL_HOURS = int(os.environ.get('QR_POOL_TTL_HOURS', '12'))
+QR_POOL_WORKERS = min(int(os.environ.get('QR_POOL_WORKERS', '4')), tinkoff.TINKOFF_POOL_SIZE)
 
-def handler(event: dict, context) -> dict:
+# Фиксированные платежи: обращение к знаменитости, гайд по оплате, быстрые суммы пожертвований
+FIXED_QR_PRODUCTS = [
+    (60, 'Обращение к знаменитости'),
+    (10, 'Размещение объявления'),
+    (100, 'Пожертвование'),
+    (500, 'Пожертвование'),
+    (1000, 'Пожертвование'),
+    (5000, 'Пожертвование')
+]
+
+def issue_sbp_qr(amount: int, description: str) -> tuple:
+    """Создать разовую СБП-сессию (Init + GetQr); вернуть (сессия, текст ошибки Init)"""
+    order_id = f'sbp_{uuid.uuid4().hex}'
+    init_data = tinkoff.init_payment(amount * 100, order_id, description[:140])
+    print(f"Init response: {init_data}")
+    
+    if not init_data.get('Success'):
+        return None, init_data.get('Message', 'Ошибка создания платежа')
+    
+    payment_id = init_data.get('PaymentId')
+    qr_data = tinkoff.get_qr(payment_id)
+    print(f"GetQr response: {qr_data}")
+    
+    return {
+        'order_id': order_id,
+        'payment_id': payment_id,
+        'qr_code': qr_data.get('Data', '') or init_data.get('PaymentURL', '')
+    }, None
+
+def claim_pooled_qr(conn, cursor, schema: str, amount: int, description: str):
+    """Забрать готовую СБП-сессию из пула; None, если пул для этой суммы пуст"""
+    cursor.execute(f"""
+        UPDATE {schema}.sbp_qr_pool
+        SET claimed_at = CURRENT_TIMESTAMP
+        WHERE id = (
+            SELECT id FROM {schema}.sbp_qr_pool
+            WHERE amount = %s AND description = %s
+              AND claimed_at IS NULL AND expires_at > CURRENT_TIMESTAMP
+            ORDER BY id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING payment_id, qr_code
+    """, (amount, description))
+    row = cursor.fetchone()
+    conn.commit()
+    if not row:
+        return None
+    return {'payment_id': row[0], 'qr_code': row[1]}
+
+def refill_qr_pool(conn, cursor, schema: str) -> dict:
+    """Дозаполнить пул СБП-сессий до QR_POOL_TARGET на каждый фиксированный продукт"""
+    cursor.execute(f"""
+        DELETE FROM {schema}.sbp_qr_pool
+        WHERE expires_at <= CURRENT_TIMESTAMP OR claimed_at < CURRENT_TIMESTAMP - INTERVAL '1 day'
+    """)
+    cursor.execute(f"""
+        SELECT amount, description, COUNT(*)
+        FROM {schema}.sbp_qr_pool
+        WHERE claimed_at IS NULL AND expires_at > CURRENT_TIMESTAMP
+        GROUP BY amount, description
+    """)
+    available = {(amount, description): count for amount, description, count in cursor.fetchall()}
+    conn.commit()
+    
+    missing = []
+    for product in FIXED_QR_PRODUCTS:
+        missing.extend([product] * max(QR_POOL_TARGET - available.get(product, 0), 0))
+    if not missing:
+        return {'created': 0, 'errors': 0}
+    
+    def issue(product):
+        try:
+            return product, issue_sbp_qr(*product)[0]
+        except tinkoff.TinkoffError as e:
+            print(f'QR pool refill {product}: {e}')
+            return product, None
+    
+    with ThreadPoolExecutor(max_workers=QR_POOL_WORKERS) as pool:
+        issued = list(pool.map(issue, missing))
+    
+    rows = [
+        (amount, description, session['order_id'], str(session['payment_id']), session['qr_code'])
+        for (amount, description), session in issued if session
+    ]
+    if rows:
+        extras.execute_values(cursor, f"""
+            INSERT INTO {schema}.sbp_qr_pool (amount, description, order_id, payment_id, qr_code, expires_at)
+            VALUES %s
+        """, rows, template=f"(%s, %s, %s, %s, %s, CURRENT_TIMESTAMP + INTERVAL '{QR_POOL_TTL_HOURS} hours')")
+        conn.commit()
+    return {'created': len(rows), 'errors': len(missing) - len(rows)}
+
+@db_handler(dict_rows=False)
+def handler(event: dict, context, conn, cursor, schema: str) -> dict:
     """
     API для приема платежей через Тинькофф СБП.
     Создаёт платёж, генерирует QR-код и проверяет статус оплаты.
+    Вызов по таймеру (событие без httpMethod) запускает сверку ожидающих платежей
+    и пополнение пула готовых СБП-сессий.
     """
     method = event.get('httpMethod', 'GET')
+    is_timer = 'httpMethod' not in event
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
+    if is_timer:
+        result = reconcile_pending_payments(conn, cursor, schema)
+        result['qr_pool'] = refill_qr_pool(conn, cursor, schema)
+        print(f'Reconcile: {result}')
+        return json_response(event, 200, result)
     
-    try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cursor = conn.cursor()
+    if method == 'POST':
+        body = json.loads(event.get('body', '{}'))
+        action = body.get('action')
         
-        if method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action')
+        if action is None and 'PaymentId' in body and 'Token' in body:
+            # Уведомление (webhook) Тинькофф об изменении статуса платежа
+            if not tinkoff.verify_notification(body):
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'text/plain'},
+                    'body': 'Invalid token',
+                    'isBase64Encoded': False
+                }
             
-            if action == 'create_payment':
-                title = body.get('title', '')
-                description = body.get('description', '')
-                category = body.get('category', 'Разное')
-                author_name = body.get('author_name', 'Аноним')
-                author_contact = body.get('author_contact', '')
-                announcement_type = body.get('type', 'regular')
-                
-                prices = {'regular': 10, 'boosted': 20, 'vip': 100}
-                amount = prices.get(announcement_type, 10)
-                amount_kopecks = amount * 100
-                
-                expires_at = None
-                if announcement_type == 'vip':
-                    expires_at = datetime.now() + timedelta(days=7)
-                
-                # Создаём объявление в БД
-                schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+            changed = apply_payment_status(
+                cursor, schema, str(body['PaymentId']), body.get('Status', ''),
+                amount_kopecks=body.get('Amount'), source='уведомление Тинькофф'
+            )
+            conn.commit()
+            print(f"Tinkoff notification: PaymentId={body['PaymentId']} Status={body.get('Status')} changed={changed}")
+            
+            # Тинькофф ждёт ответ OK, иначе будет повторять уведомление
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'text/plain'},
+                'body': 'OK',
+                'isBase64Encoded': False
+            }
+        
+        if action == 'create_payment':
+            title = body.get('title', '')
+            description = body.get('description', '')
+            category = body.get('category', 'Разное')
+            author_name = body.get('author_name', 'Аноним')
+            author_contact = body.get('author_contact', '')
+            announcement_type = body.get('type', 'regular')
+            # Повтор запроса с тем же ключом не создаёт второе объявление и второй заказ
+            idempotency_key = str(body.get('idempotency_key') or uuid.uuid4())
+            
+            amount = PRICES.get(announcement_type, 10)
+            
+            expires_at = None
+            if announcement_type == 'vip':
+                expires_at = datetime.now() + timedelta(days=7)
+            
+            payment = create_payment_draft(conn, schema, idempotency_key, (
+                title, description, category, author_name, author_contact, announcement_type, amount, 'pending', expires_at
+            ))
+            
+            with payment_lock(conn, payment['order_id']) as acquired:
+                if acquired:
+                    payment = advance_payment(conn, schema, payment, f'Объявление: {title[:50]}')
+                else:
+                    # Тот же платёж прямо сейчас проводит параллельный запрос
+                    return json_response(event, 409, {
+                        'error': 'Платёж уже создаётся, повторите запрос',
+                        'state': payment['state']
+                    })
+            
+            if payment['state'] == 'failed':
+                # Init не прошёл: повтор с тем же ключом переоткроет черновик с новым OrderId.
+                # Отклонённый или истёкший в банке платёж повторяется только с новым ключом
+                retryable = payment['payment_id'] is None
+                return json_response(event, 409, {
+                    'error': f"Ошибка Tinkoff API: {payment['error'] or 'Unknown error'}" if retryable
+                             else 'Платёж отклонён или истёк, начните оформление заново',
+                    'state': payment['state'],
+                    'retryable': retryable
+                })
+            
+            return json_response(event, 200, {
+                'success': True,
+                'announcement_id': payment['announcement_id'],
+                'payment_id': payment['payment_id'],
+                'amount': payment['amount'],
+                'qr_code': payment['qr_code'] or '',
+                'payment_url': payment['payment_url'] or '',
+                'payment_status': 'paid' if payment['state'] == 'paid' else 'pending',
+                'message': f"Объявление создано! Отсканируйте QR-код для оплаты {payment['amount']}₽ через СБП."
+            })
+        
+        elif action == 'check_payment':
+            announcement_id = body.get('announcement_id')
+            
+            cursor.execute(f"""
+                SELECT payment_status, payment_amount, payment_id FROM {schema}.announcements WHERE id = %s
+            """, (announcement_id,))
+            
+            result = cursor.fetchone()
+            if not result:
+                return error_response(event, 404, 'Объявление не найдено')
+            
+            payment_status, amount, _ = result
+            
+            # Статус обновляет webhook от Тинькофф: опрос отвечает только из БД
+            return json_response(event, 200, {
+                'payment_status': payment_status,
+                'amount': amount
+            })
+        
+        elif action == 'generate_sbp_qr':
+            # Генерация СБП QR для пожертвований и обращений к знаменитостям
+            amount = body.get('amount', 100)
+            description = body.get('description', 'Оплата')
+            
+            # Частые фиксированные суммы отдаём из заранее подготовленного пула
+            session = None
+            if (int(amount), description) in FIXED_QR_PRODUCTS:
+                session = claim_pooled_qr(conn, cursor, schema, int(amount), description)
+            
+            if session is None:
+                session, error = issue_sbp_qr(int(amount), description)
+                if error:
+                    return error_response(event, 400, error)
+            
+            return json_response(event, 200, {
+                'success': True,
+                'qr_code': session['qr_code'],
+                'payment_id': session['payment_id'],
+                'amount': amount
+            })
+
+        elif action == 'confirm_payment':
+            announcement_id = body.get('announcement_id')
+            admin_code = body.get('admin_code', '')
+            
+            if admin_code == 'HELP2025':
                 cursor.execute(f"""
-                    INSERT INTO {schema}.announcements 
-                    (title, description, category, author_name, author_contact, type, payment_amount, payment_status, expires_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id
-                """, (title, description, category, author_name, author_contact, announcement_type, amount, 'pending', expires_at))
-                
-                announcement_id = cursor.fetchone()[0]
-                conn.commit()
-                
-                # Создаём платёж в Тинькофф
-                terminal_key = os.environ.get('TINKOFF_TERMINAL_KEY', '')
-                password = os.environ.get('TINKOFF_PASSWORD', '')
-                
-                order_id = f'ann_{announcement_id}_{int(datetime.now().timestamp())}'
-                
-                init_params = {
-                    'TerminalKey': terminal_key,
-                    'Amount': amount_kopecks,
-                    'OrderId': order_id,
-                    'Description': f'Объявление: {title[:50]}'
-                }
-                
-                init_params['Token'] = calculate_token(init_params, password)
-                
-                # Запрос в Тинькофф API
-                tinkoff_response = requests.post(
-                    'https://securepay.tinkoff.ru/v2/Init',
-                    json=init_params,
-                    timeout=10
-                )
-                
-                tinkoff_data = tinkoff_response.json()
-                
-                if not tinkoff_data.get('Success'):
-                    raise Exception(f"Ошибка Tinkoff API: {tinkoff_data.get('Message', 'Unknown error')}")
-                
-                payment_id = tinkoff_data.get('PaymentId')
-                
-                # Генерируем QR-код для СБП (DYNAMIC = настоящий СБП QR)
-                qr_params = {
-                    'TerminalKey': terminal_key,
-                    'PaymentId': str(payment_id),
-                    'DataType': 'DYNAMIC'
-                }
-                qr_params['Token'] = calculate_token(qr_params, password)
-                
-                qr_response = requests.post(
-                    'https://securepay.tinkoff.ru/v2/GetQr',
-                    json=qr_params,
-                    timeout=10
-                )
-                
-                qr_data = qr_response.json()
-                print(f"GetQr response: {qr_data}")
-                qr_code_data = qr_data.get('Data', '')
-                
-                # Если СБП QR не получен — используем PaymentURL
-                if not qr_code_data:
-                    print(f"GetQr failed, fallback to PaymentURL. Error: {qr_data.get('Message', '')}")
-                    qr_code_data = tinkoff_data.get('PaymentURL', '')
+                    SELECT title, type, payment_amount FROM {schema}.announcements WHERE id = %s
+                """, (announcement_id,))
+                ann_data = cursor.fetchone()
                 
-                # Сохраняем payment_id в БД
                 cursor.execute(f"""
                     UPDATE {schema}.announcements 
-                    SET payment_id = %s
+                    SET payment_status = 'paid', paid_at = COALESCE(paid_at, CURRENT_TIMESTAMP)
                     WHERE id = %s
-                """, (payment_id, announcement_id))
-                conn.commit()
-                
-                type_names = {'regular': 'Обычное', 'boosted': 'Поднятое', 'vip': 'VIP'}
-                send_telegram_notification(
-                    f"🔔 <b>Новое объявление ожидает оплаты</b>\n\n"
-                    f"📝 <b>Заголовок:</b> {title}\n"
-                    f"📂 <b>Категория:</b> {category}\n"
-                    f"🏷 <b>Тип:</b> {type_names.get(announcement_type, announcement_type)}\n"
-                    f"💵 <b>Сумма:</b> {amount}₽\n"
-                    f"👤 <b>Автор:</b> {author_name}\n"
-                    f"📞 <b>Контакт:</b> {author_contact}\n\n"
-                    f"💳 Оплата через Тинькофф СБП\n"
-                    f"🆔 ID объявления: {announcement_id}\n"
-                    f"🆔 Payment ID: {payment_id}"
-                )
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'success': True,
-                        'announcement_id': announcement_id,
-                        'payment_id': payment_id,
-                        'amount': amount,
-                        'qr_code': qr_code_data,
-                        'payment_url': tinkoff_data.get('PaymentURL', ''),
-                        'payment_status': 'pending',
-                        'message': f'Объявление создано! Отсканируйте QR-код для оплаты {amount}₽ через СБП.'
-                    }),
-                    'isBase64Encoded': False
-                }
-            
-            elif action == 'check_payment':
-                announcement_id = body.get('announcement_id')
-                schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-                
+                """, (announcement_id,))
                 cursor.execute(f"""
-                    SELECT payment_status, payment_amount, payment_id FROM {schema}.announcements WHERE id = %s
+                    UPDATE {schema}.payments
+                    SET state = 'paid', updated_at = CURRENT_TIMESTAMP
+                    WHERE announcement_id = %s
                 """, (announcement_id,))
                 
-                result = cursor.fetchone()
-                if not result:
-                    return {
-                        'statusCode': 404,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'body': json.dumps({'error': 'Объявление не найдено'}),
-                        'isBase64Encoded': False
-                    }
-                
-                payment_status, amount, payment_id = result
-                
-                # Проверяем статус в Тинькофф
-                if payment_id and payment_status == 'pending':
-                    terminal_key = os.environ.get('TINKOFF_TERMINAL_KEY', '')
-                    password = os.environ.get('TINKOFF_PASSWORD', '')
-                    
-                    state_params = {
-                        'TerminalKey': terminal_key,
-                        'PaymentId': payment_id
-                    }
-                    state_params['Token'] = calculate_token(state_params, password)
-                    
-                    state_response = requests.post(
-                        'https://securepay.tinkoff.ru/v2/GetState',
-                        json=state_params,
-                        timeout=10
+                if ann_data:
+                    enqueue_notification(cursor, schema,
+                        f"✅ <b>Платёж подтверждён вручную!</b>\n\n"
+                        f"📝 <b>Объявление:</b> {ann_data[0]}\n"
+                        f"🏷 <b>Тип:</b> {TYPE_NAMES.get(ann_data[1], ann_data[1])}\n"
+                        f"💵 <b>Сумма:</b> {ann_data[2]}₽\n"
+                        f"🆔 ID: {announcement_id}"
                     )
-                    
-                    state_data = state_response.json()
-                    tinkoff_status = state_data.get('Status', '')
-                    
-                    if tinkoff_status == 'CONFIRMED':
-                        cursor.execute(f"""
-                            UPDATE {schema}.announcements 
-                            SET payment_status = 'paid'
-                            WHERE id = %s
-                        """, (announcement_id,))
-                        conn.commit()
-                        payment_status = 'paid'
-                        
-                        send_telegram_notification(
-                            f"✅ <b>Платёж подтверждён автоматически!</b>\n\n"
-                            f"🆔 ID объявления: {announcement_id}\n"
-                            f"💵 Сумма: {amount}₽\n"
-                            f"💳 Payment ID: {payment_id}"
-                        )
+                conn.commit()
                 
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'payment_status': payment_status,
-                        'amount': amount
-                    }),
-                    'isBase64Encoded': False
-                }
+                return json_response(event, 200, {
+                    'success': True,
+                    'message': 'Платёж подтверждён'
+                })
             
-            elif action == 'generate_sbp_qr':
-                # Генерация СБП QR для пожертвований и обращений к знаменитостям
-                amount = body.get('amount', 100)
-                description = body.get('description', 'Оплата')
-                amount_kopecks = int(amount) * 100
-                
-                terminal_key = os.environ.get('TINKOFF_TERMINAL_KEY', '')
-                password = os.environ.get('TINKOFF_PASSWORD', '')
-                
-                import time
-                order_id = f'sbp_{int(time.time())}'
-                
-                init_params = {
-                    'TerminalKey': terminal_key,
-                    'Amount': amount_kopecks,
-                    'OrderId': order_id,
-                    'Description': description[:140]
-                }
-                init_params['Token'] = calculate_token(init_params, password)
-                
-                init_response = requests.post(
-                    'https://securepay.tinkoff.ru/v2/Init',
-                    json=init_params,
-                    timeout=10
-                )
-                init_data = init_response.json()
-                print(f"Init response: {init_data}")
-                
-                if not init_data.get('Success'):
-                    return {
-                        'statusCode': 400,
-                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                        'body': json.dumps({'error': init_data.get('Message', 'Ошибка создания платежа')}),
-                        'isBase64Encoded': False
-                    }
-                
-                payment_id = init_data.get('PaymentId')
-                
-                qr_params = {
-                    'TerminalKey': terminal_key,
-                    'PaymentId': str(payment_id),
-                    'DataType': 'DYNAMIC'
-                }
-                qr_params['Token'] = calculate_token(qr_params, password)
-                
-                qr_response = requests.post(
-                    'https://securepay.tinkoff.ru/v2/GetQr',
-                    json=qr_params,
-                    timeout=10
-                )
-                qr_data = qr_response.json()
-                print(f"GetQr response: {qr_data}")
-                
-                qr_code_data = qr_data.get('Data', '') or init_data.get('PaymentURL', '')
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({
-                        'success': True,
-                        'qr_code': qr_code_data,
-                        'payment_id': payment_id,
-                        'amount': amount
-                    }),
-                    'isBase64Encoded': False
-                }
-
-            elif action == 'confirm_payment':
-                announcement_id = body.get('announcement_id')
-                admin_code = body.get('admin_code', '')
-                schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
-                
-                if admin_code == 'HELP2025':
-                    cursor.execute(f"""
-                        SELECT title, type, payment_amount FROM {schema}.announcements WHERE id = %s
-                    """, (announcement_id,))
-                    ann_data = cursor.fetchone()
-                    
-                    cursor.execute(f"""
-                        UPDATE {schema}.announcements 
-                        SET payment_status = 'paid'
-                        WHERE id = %s
-                    """, (announcement_id,))
-                    conn.commit()
-                    
-                    if ann_data:
-                        type_names = {'regular': 'Обычное', 'boosted': 'Поднятое', 'vip': 'VIP'}
-                        send_telegram_notification(
-                            f"✅ <b>Платёж подтверждён вручную!</b>\n\n"
-                            f"📝 <b>Объявление:</b> {ann_data[0]}\n"
-                            f"🏷 <b>Тип:</b> {type_names.get(ann_data[1], ann_data[1])}\n"
-                            f"💵 <b>Сумма:</b> {ann_data[2]}₽\n"
-                            f"🆔 ID: {announcement_id}"
-                        )
-                    
-                    return {
-                        'statusCode': 200,
-                        'headers': {
-                            'Content-Type': 'application/json',
-                            'Access-Control-Allow-Origin': '*'
-                        },
-                        'body': json.dumps({
-                            'success': True,
-                            'message': 'Платёж подтверждён'
-                        }),
-                        'isBase64Encoded': False
-                    }
-                
-                return {
-                    'statusCode': 403,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({'error': 'Неверный код'}),
-                    'isBase64Encoded': False
-                }
-        
-        cursor.close()
-        conn.close()
+            return error_response(event, 403, 'Неверный код')
+    
+        elif action == 'reconcile_payments':
+            # Ручной запуск сверки ожидающих платежей (только для админа)
+            if body.get('admin_code', '') != 'HELP2025':
+                return error_response(event, 403, 'Неверный код')
+            
+            result = reconcile_pending_payments(conn, cursor, schema)
+            
+            return json_response(event, 200, {'success': True, **result})
         
-        return {
-            'statusCode': 405,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Метод не поддерживается'}),
-            'isBase64Encoded': False
-        }
+        elif action == 'refill_qr_pool':
+            # Ручное пополнение пула СБП-сессий (только для админа)
+            if body.get('admin_code', '') != 'HELP2025':
+                return error_response(event, 403, 'Неверный код')
+            
+            result = refill_qr_pool(conn, cursor, schema)
+            
+            return json_response(event, 200, {'success': True, **result})
         
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
\ No newline at end of file
+        elif action == 'get_metrics':
+            # Задержки запросов к Тинькофф и состояние пула БД (только для админа)
+            if body.get('admin_code', '') != 'HELP2025':
+                return error_response(event, 403, 'Неверный код')
+            
+            return json_response(event, 200, {
+                'tinkoff': tinkoff.metrics(),
+                'db_pool': get_pool().stats
+            })
+    
+    return error_response(event, 405, 'Метод не поддерживается')
@@ -0,0 +1,152 @@
+import bisect
+import hashlib
+import hmac
+import os
+import random
+import threading
+import time
+from core.lazy import lazy_import
+
+# requests (~100 мс импорта) нужен только при обращении к банку, а не на каждом холодном старте
+requests = lazy_import('requests')
+
+TINKOFF_API_URL = os.environ.get('TINKOFF_API_URL', 'https://securepay.tinkoff.ru/v2')
+TINKOFF_CONNECT_TIMEOUT = float(os.environ.get('TINKOFF_CONNECT_TIMEOUT', '3'))
+TINKOFF_READ_TIMEOUT = float(os.environ.get('TINKOFF_READ_TIMEOUT', '10'))
+TINKOFF_MAX_RETRIES = int(os.environ.get('TINKOFF_MAX_RETRIES', '2'))
+TINKOFF_BACKOFF_BASE = float(os.environ.get('TINKOFF_BACKOFF_BASE', '0.2'))
+# Keep-alive соединений в пуле сессии: по одному на параллельный поток сверки и пополнения QR
+TINKOFF_POOL_SIZE = int(os.environ.get('TINKOFF_POOL_SIZE', '8'))
+
+# Методы, которые безопасно повторить, даже если запрос уже дошёл до банка
+IDEMPOTENT_METHODS = {'GetState', 'GetQr'}
+
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+class TinkoffError(Exception):
+    """Ошибка обращения к API Тинькофф"""
+
+class LatencyHistogram:
+    """Гистограмма задержек запросов к одному методу API"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, elapsed_ms: float, error: bool = False):
+        with self._lock:
+            self.buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+            self.count += 1
+            self.errors += int(error)
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            labels = [f'le_{b}' for b in LATENCY_BUCKETS_MS] + ['inf']
+            return {
+                'count': self.count,
+                'errors': self.errors,
+                'avg_ms': round(self.total_ms / self.count, 1) if self.count else 0,
+                'max_ms': round(self.max_ms, 1),
+                'buckets': dict(zip(labels, self.buckets))
+            }
+
+_histograms = {}
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> 'requests.Session':
+    """Общая keep-alive сессия: TLS-соединение переиспользуется между вызовами"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=TINKOFF_POOL_SIZE, max_retries=0)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+def metrics() -> dict:
+    return {method: histogram.snapshot() for method, histogram in _histograms.items()}
+
+def calculate_token(params: dict, password: str) -> str:
+    """Вычислить токен для подписи запроса к Тинькофф API"""
+    values = {k: str(v) for k, v in params.items() if k != 'Token'}
+    values['Password'] = password
+    sorted_values = sorted(values.items())
+    concatenated = ''.join([str(v) for k, v in sorted_values])
+    return hashlib.sha256(concatenated.encode()).hexdigest()
+
+def verify_notification(params: dict) -> bool:
+    """Проверить подпись уведомления (webhook) от Тинькофф"""
+    # В подписи участвуют только параметры верхнего уровня; булевы значения — как 'true'/'false'
+    values = {
+        k: ('true' if v else 'false') if isinstance(v, bool) else str(v)
+        for k, v in params.items()
+        if k != 'Token' and not isinstance(v, (dict, list))
+    }
+    expected = calculate_token(values, os.environ.get('TINKOFF_PASSWORD', ''))
+    return hmac.compare_digest(expected, str(params.get('Token', '')))
+
+def call(method: str, params: dict) -> dict:
+    """Подписать и выполнить запрос к методу API с повторами и джиттером"""
+    payload = {'TerminalKey': os.environ.get('TINKOFF_TERMINAL_KEY', ''), **params}
+    payload['Token'] = calculate_token(payload, os.environ.get('TINKOFF_PASSWORD', ''))
+    histogram = _histograms.setdefault(method, LatencyHistogram())
+    idempotent = method in IDEMPOTENT_METHODS
+
+    for attempt in range(TINKOFF_MAX_RETRIES + 1):
+        started = time.perf_counter()
+        try:
+            response = get_session().post(
+                f'{TINKOFF_API_URL}/{method}',
+                json=payload,
+                timeout=(TINKOFF_CONNECT_TIMEOUT, TINKOFF_READ_TIMEOUT)
+            )
+            retryable = idempotent and response.status_code >= 500
+            histogram.observe((time.perf_counter() - started) * 1000, error=response.status_code >= 400)
+            if not retryable:
+                return response.json()
+            error = TinkoffError(f'{method}: HTTP {response.status_code}')
+        except requests.ConnectTimeout as e:
+            # Соединение не установлено: запрос точно не дошёл, повтор безопасен
+            histogram.observe((time.perf_counter() - started) * 1000, error=True)
+            error = TinkoffError(f'{method}: {e}')
+        except requests.RequestException as e:
+            histogram.observe((time.perf_counter() - started) * 1000, error=True)
+            error = TinkoffError(f'{method}: {e}')
+            if not idempotent:
+                raise error from e
+
+        if attempt < TINKOFF_MAX_RETRIES:
+            time.sleep(random.uniform(0, TINKOFF_BACKOFF_BASE * 2 ** attempt))
+
+    raise error
+
+def init_payment(amount_kopecks: int, order_id: str, description: str) -> dict:
+    params = {
+        'Amount': amount_kopecks,
+        'OrderId': order_id,
+        'Description': description
+    }
+    notification_url = os.environ.get('TINKOFF_NOTIFICATION_URL')
+    if notification_url:
+        params['NotificationURL'] = notification_url
+    return call('Init', params)
+
+def get_qr(payment_id) -> dict:
+    return call('GetQr', {
+        'PaymentId': str(payment_id),
+        'DataType': 'DYNAMIC'
+    })
+
+def get_state(payment_id) -> dict:
+    return call('GetState', {'PaymentId': payment_id})
@@ -1,182 +1,268 @@
 import json
 import os
-import psycopg2
-from psycopg2.extras import RealDictCursor
+import select
+import time
+from core.handler import db_handler
+from core.response import error_response, json_response
 
-def handler(event: dict, context) -> dict:
+LONG_POLL_MAX_WAIT = float(os.environ.get('LONG_POLL_MAX_WAIT', '25'))
+MESSAGES_CHANNEL = 'chat_messages'
+MESSAGES_PAGE_SIZE = 50
+MESSAGES_MAX_PAGE_SIZE = 200
+
+def fetch_new_messages(cursor, schema: str, response_id: int, since_id: int, limit: int) -> list:
+    """Сообщения после since_id в порядке коммита (не больше limit + 1)"""
+    # Сравниваем seq, а не id: id N+1 может закоммититься раньше id N, и клиент,
+    # продвинувший since_id до N+1, никогда не получил бы N
+    cursor.execute(f"""
+        SELECT id, sender_name, message, created_at
+        FROM {schema}.messages
+        WHERE response_id = %s
+          AND seq > COALESCE((SELECT seq FROM {schema}.messages WHERE id = %s AND response_id = %s), 0)
+        ORDER BY seq
+        LIMIT %s
+    """, (response_id, since_id, response_id, limit + 1))
+    return cursor.fetchall()
+
+def fetch_message_history(cursor, schema: str, response_id: int, before_id: int, limit: int) -> list:
+    """Последние limit + 1 сообщений переписки (или предшествующих before_id), от новых к старым"""
+    # Тот же порядок seq, что у long-poll: граница истории и новых сообщений совпадает
+    query = f"""
+        SELECT id, sender_name, message, created_at
+        FROM {schema}.messages
+        WHERE response_id = %s
+    """
+    params = [response_id]
+    if before_id:
+        query += f" AND seq < (SELECT seq FROM {schema}.messages WHERE id = %s)"
+        params.append(before_id)
+    query += " ORDER BY seq DESC LIMIT %s"
+    params.append(limit + 1)
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+def poll_new_messages(conn, cursor, schema: str, response_id: int, since_id: int, limit: int, wait: float) -> list:
+    """Вернуть сообщения новее since_id; если их нет — ждать NOTIFY не дольше wait секунд"""
+    if wait <= 0:
+        return fetch_new_messages(cursor, schema, response_id, since_id, limit)
+    
+    conn.rollback()
+    conn.autocommit = True
+    try:
+        # LISTEN до выборки: сообщение, пришедшее между выборкой и ожиданием, не потеряется
+        cursor.execute(f"LISTEN {MESSAGES_CHANNEL}")
+        messages = fetch_new_messages(cursor, schema, response_id, since_id, limit)
+        deadline = time.monotonic() + wait
+        while not messages:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([conn], [], [], remaining)[0]:
+                break
+            conn.poll()
+            notified = any(n.payload == str(response_id) for n in conn.notifies)
+            conn.notifies.clear()
+            if notified:
+                messages = fetch_new_messages(cursor, schema, response_id, since_id, limit)
+        return messages
+    finally:
+        cursor.execute(f"UNLISTEN {MESSAGES_CHANNEL}")
+        conn.notifies.clear()
+        conn.autocommit = False
+
+COUNT_CHECK_BATCH_SIZE = 1000
+COUNT_CHECK_MAX_BATCH_SIZE = 10000
+
+def repair_message_counts(cursor, schema: str, after_id: int, batch_size: int):
+    """Сверить счётчики сообщений для очередной пачки откликов и исправить расхождения"""
+    # Пачка блокируется до подсчёта: send_message с message_count + 1 дождётся сверки и
+    # прибавит к исправленному значению, а уже закоммиченное сообщение попадёт в подсчёт
+    cursor.execute(f"""
+        SELECT id FROM {schema}.responses
+        WHERE id > %s
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE
+    """, (after_id, batch_size))
+    ids = [row['id'] for row in cursor.fetchall()]
+    if not ids:
+        return 0, [], None
+    
+    cursor.execute(f"""
+        UPDATE {schema}.responses r
+        SET message_count = c.cnt, last_message_at = c.last_at
+        FROM (
+            SELECT r2.id, COUNT(m.id) as cnt, MAX(m.created_at) as last_at
+            FROM {schema}.responses r2
+            LEFT JOIN {schema}.messages m ON m.response_id = r2.id
+            WHERE r2.id = ANY(%s)
+            GROUP BY r2.id
+        ) c
+        WHERE r.id = c.id
+          AND (r.message_count <> c.cnt OR r.last_message_at IS DISTINCT FROM c.last_at)
+        RETURNING r.id
+    """, (ids,))
+    fixed_ids = sorted(row['id'] for row in cursor.fetchall())
+    next_after_id = ids[-1] if len(ids) == batch_size else None
+    return len(ids), fixed_ids, next_after_id
+
+@db_handler()
+def handler(event: dict, context, conn, cursor, schema: str) -> dict:
     """
     API для работы с откликами на объявления.
-    GET - получить отклики по объявлению
-    POST - создать отклик или отправить сообщение
+    GET - получить отклики по объявлению или сообщения переписки
+          (последние limit, before_id - более ранние, since_id - только новые,
+           wait - long-poll до появления новых)
+    POST - создать отклик, отправить сообщение или сверить счётчики сообщений
     """
     method = event.get('httpMethod', 'GET')
     
-    if method == 'OPTIONS':
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type'
-            },
-            'body': '',
-            'isBase64Encoded': False
-        }
-    
-    try:
-        conn = psycopg2.connect(os.environ['DATABASE_URL'])
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
-        schema = os.environ.get('MAIN_DB_SCHEMA', 'public')
+    if method == 'GET':
+        query_params = event.get('queryStringParameters') or {}
+        announcement_id = query_params.get('announcement_id')
+        response_id = query_params.get('response_id')
         
-        if method == 'GET':
-            query_params = event.get('queryStringParameters') or {}
-            announcement_id = query_params.get('announcement_id')
-            response_id = query_params.get('response_id')
+        if response_id:
+            try:
+                response_id = int(response_id)
+                since_id = int(query_params.get('since_id') or 0)
+                before_id = int(query_params.get('before_id') or 0)
+                limit = min(max(int(query_params.get('limit') or MESSAGES_PAGE_SIZE), 1), MESSAGES_MAX_PAGE_SIZE)
+                wait = min(max(float(query_params.get('wait') or 0), 0), LONG_POLL_MAX_WAIT)
+            except ValueError:
+                return error_response(event, 400, 'Неверные параметры запроса')
+            
+            # since_id=0 (пустая переписка) — тоже ожидание новых, а не история
+            if not before_id and ('since_id' in query_params or wait):
+                messages = poll_new_messages(conn, cursor, schema, response_id, since_id, limit, wait)
+                has_more = len(messages) > limit
+                messages = messages[:limit]
+            else:
+                messages = fetch_message_history(cursor, schema, response_id, before_id, limit)
+                has_more = len(messages) > limit
+                messages = messages[:limit][::-1]
             
-            if response_id:
-                cursor.execute(f"""
-                    SELECT m.*, r.announcement_id, r.responder_name, r.message as initial_message
-                    FROM {schema}.messages m
-                    JOIN {schema}.responses r ON m.response_id = r.id
-                    WHERE m.response_id = %s
-                    ORDER BY m.created_at ASC
-                """, (response_id,))
-                messages = cursor.fetchall()
-                
-                result = []
-                for msg in messages:
-                    result.append({
-                        'id': msg['id'],
-                        'sender': msg['sender_name'],
-                        'message': msg['message'],
-                        'created_at': msg['created_at'].isoformat() if msg['created_at'] else None
-                    })
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps(result),
-                    'isBase64Encoded': False
-                }
+            result = []
+            for msg in messages:
+                result.append({
+                    'id': msg['id'],
+                    'sender': msg['sender_name'],
+                    'message': msg['message'],
+                    'created_at': msg['created_at'].isoformat() if msg['created_at'] else None
+                })
             
-            elif announcement_id:
-                cursor.execute(f"""
-                    SELECT r.*, 
-                           (SELECT COUNT(*) FROM {schema}.messages WHERE response_id = r.id) as message_count
-                    FROM {schema}.responses r
-                    WHERE r.announcement_id = %s
-                    ORDER BY r.created_at DESC
-                """, (announcement_id,))
-                responses = cursor.fetchall()
-                
-                result = []
-                for resp in responses:
-                    result.append({
-                        'id': resp['id'],
-                        'responder_name': resp['responder_name'],
-                        'responder_contact': resp['responder_contact'],
-                        'message': resp['message'],
-                        'created_at': resp['created_at'].isoformat() if resp['created_at'] else None,
-                        'status': resp['status'],
-                        'message_count': resp['message_count']
-                    })
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps(result),
-                    'isBase64Encoded': False
-                }
+            return json_response(event, 200, {
+                'messages': result,
+                'has_more': has_more
+            })
         
-        elif method == 'POST':
-            body = json.loads(event.get('body', '{}'))
-            action = body.get('action')
+        elif announcement_id:
+            cursor.execute(f"""
+                SELECT id, responder_name, responder_contact, message, created_at, status,
+                       message_count, last_message_at
+                FROM {schema}.responses
+                WHERE announcement_id = %s
+                ORDER BY created_at DESC
+            """, (announcement_id,))
+            responses = cursor.fetchall()
             
-            if action == 'create_response':
-                announcement_id = body.get('announcement_id')
-                responder_name = body.get('responder_name', 'Аноним')
-                responder_contact = body.get('responder_contact', '')
-                message = body.get('message', '')
-                
-                cursor.execute(f"""
-                    INSERT INTO {schema}.responses 
-                    (announcement_id, responder_name, responder_contact, message)
-                    VALUES (%s, %s, %s, %s)
-                    RETURNING id
-                """, (announcement_id, responder_name, responder_contact, message))
-                
-                response_id = cursor.fetchone()['id']
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'success': True,
-                        'response_id': response_id
-                    }),
-                    'isBase64Encoded': False
-                }
+            result = []
+            for resp in responses:
+                result.append({
+                    'id': resp['id'],
+                    'responder_name': resp['responder_name'],
+                    'responder_contact': resp['responder_contact'],
+                    'message': resp['message'],
+                    'created_at': resp['created_at'].isoformat() if resp['created_at'] else None,
+                    'status': resp['status'],
+                    'message_count': resp['message_count'],
+                    'last_message_at': resp['last_message_at'].isoformat() if resp['last_message_at'] else None
+                })
             
-            elif action == 'send_message':
-                response_id = body.get('response_id')
-                sender_name = body.get('sender_name', 'Аноним')
-                message = body.get('message', '')
-                
-                cursor.execute(f"""
-                    INSERT INTO {schema}.messages 
-                    (response_id, sender_name, message)
-                    VALUES (%s, %s, %s)
-                    RETURNING id
-                """, (response_id, sender_name, message))
-                
-                message_id = cursor.fetchone()['id']
-                conn.commit()
-                
-                return {
-                    'statusCode': 200,
-                    'headers': {
-                        'Content-Type': 'application/json',
-                        'Access-Control-Allow-Origin': '*'
-                    },
-                    'body': json.dumps({
-                        'success': True,
-                        'message_id': message_id
-                    }),
-                    'isBase64Encoded': False
-                }
+            return json_response(event, 200, result)
+    
+    elif method == 'POST':
+        body = json.loads(event.get('body', '{}'))
+        action = body.get('action')
         
-        return {
-            'statusCode': 400,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': 'Неверный запрос'}),
-            'isBase64Encoded': False
-        }
+        if action == 'create_response':
+            announcement_id = body.get('announcement_id')
+            responder_name = body.get('responder_name', 'Аноним')
+            responder_contact = body.get('responder_contact', '')
+            message = body.get('message', '')
+            
+            cursor.execute(f"""
+                INSERT INTO {schema}.responses 
+                (announcement_id, responder_name, responder_contact, message)
+                VALUES (%s, %s, %s, %s)
+                RETURNING id
+            """, (announcement_id, responder_name, responder_contact, message))
+            
+            response_id = cursor.fetchone()['id']
+            conn.commit()
+            
+            return json_response(event, 200, {
+                'success': True,
+                'response_id': response_id
+            })
+        
+        elif action == 'send_message':
+            response_id = body.get('response_id')
+            sender_name = body.get('sender_name', 'Аноним')
+            message = body.get('message', '')
+            
+            # Номер в переписке выдаётся под блокировкой строки отклика: параллельные отправки
+            # коммитятся по очереди, и seq становятся видимы строго по возрастанию
+            cursor.execute(f"""
+                UPDATE {schema}.responses
+                SET message_count = message_count + 1,
+                    last_message_seq = last_message_seq + 1,
+                    last_message_at = GREATEST(last_message_at, CURRENT_TIMESTAMP)
+                WHERE id = %s
+                RETURNING last_message_seq
+            """, (response_id,))
+            updated = cursor.fetchone()
+            if not updated:
+                conn.rollback()
+                return error_response(event, 404, 'Отклик не найден')
+            
+            cursor.execute(f"""
+                INSERT INTO {schema}.messages 
+                (response_id, sender_name, message, seq)
+                VALUES (%s, %s, %s, %s)
+                RETURNING id
+            """, (response_id, sender_name, message, updated['last_message_seq']))
+            message_id = cursor.fetchone()['id']
+            
+            # Уведомление уходит подписчикам в момент коммита
+            cursor.execute("SELECT pg_notify(%s, %s)", (MESSAGES_CHANNEL, str(response_id)))
+            conn.commit()
+            
+            return json_response(event, 200, {
+                'success': True,
+                'message_id': message_id
+            })
     
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps({'error': str(e)}),
-            'isBase64Encoded': False
-        }
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        if 'conn' in locals():
-            conn.close()
+        elif action == 'check_message_counts':
+            # Сверка message_count/last_message_at с messages (только для админа)
+            admin_code = body.get('admin_code', '')
+            
+            if admin_code != 'HELP2025':
+                return error_response(event, 403, 'Неверный код')
+            
+            try:
+                after_id = int(body.get('after_id') or 0)
+                batch_size = min(max(int(body.get('batch_size') or COUNT_CHECK_BATCH_SIZE), 1),
+                                 COUNT_CHECK_MAX_BATCH_SIZE)
+            except (ValueError, TypeError):
+                return error_response(event, 400, 'Неверные параметры запроса')
+            checked, fixed_ids, next_after_id = repair_message_counts(cursor, schema, after_id, batch_size)
+            conn.commit()
+            
+            return json_response(event, 200, {
+                'success': True,
+                'checked': checked,
+                'fixed': fixed_ids,
+                'next_after_id': next_after_id
+            })
+    
+    return error_response(event, 400, 'Неверный запрос')
+
@@ -0,0 +1,8 @@
+-- Приоритет в ленте: VIP, затем поднятые, затем обычные
+ALTER TABLE announcements ADD COLUMN IF NOT EXISTS priority SMALLINT
+    GENERATED ALWAYS AS (CASE WHEN type = 'vip' THEN 1 WHEN type = 'boosted' THEN 2 ELSE 3 END) STORED;
+
+-- Индекс под keyset-пагинацию ленты опубликованных объявлений
+CREATE INDEX IF NOT EXISTS idx_announcements_feed
+    ON announcements(priority, created_at DESC, id DESC)
+    WHERE payment_status = 'paid';
@@ -0,0 +1,15 @@
+-- Дневные агрегаты посещений: визиты и HLL-скетч уникальных посетителей за день.
+-- Пополняются функцией announcements из журнала посещений
+CREATE TABLE IF NOT EXISTS site_visits_daily (
+    day DATE PRIMARY KEY,
+    visits INTEGER NOT NULL DEFAULT 0,
+    unique_visitors INTEGER NOT NULL DEFAULT 0,
+    visitors_sketch BYTEA
+);
+
+-- Перенос накопленной истории; скетчи этих дней досчитывает по site_visits первый вызов по таймеру
+INSERT INTO site_visits_daily (day, visits, unique_visitors)
+SELECT visited_at::date, COUNT(*), COUNT(DISTINCT COALESCE(visitor_ip, 'unknown'))
+FROM site_visits
+GROUP BY visited_at::date
+ON CONFLICT (day) DO NOTHING;
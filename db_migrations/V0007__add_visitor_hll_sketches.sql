@@ -0,0 +1,4 @@
+-- Пустая миграция: колонка visitors_sketch и отказ от точных множеств посетителей
+-- перенесены в V0006 (site_visits_daily создаётся сразу со скетчем). Номер сохранён,
+-- чтобы версии последующих миграций не сдвигались, а пропуск не выглядел потерянным файлом.
+SELECT 1;
@@ -0,0 +1,6 @@
+-- Индекс под постраничную историю переписки: последние N и прокрутка назад по (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_messages_response_created
+    ON messages(response_id, created_at, id);
+
+-- Старый индекс по response_id покрывается новым
+DROP INDEX IF EXISTS idx_messages_response;
@@ -0,0 +1,13 @@
+-- Денормализованные счётчики переписки, обновляются в send_message
+ALTER TABLE responses ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE responses ADD COLUMN IF NOT EXISTS last_message_at TIMESTAMP;
+
+-- Заполнение по существующим сообщениям
+UPDATE responses r
+SET message_count = c.cnt, last_message_at = c.last_at
+FROM (
+    SELECT response_id, COUNT(*) AS cnt, MAX(created_at) AS last_at
+    FROM messages
+    GROUP BY response_id
+) c
+WHERE r.id = c.response_id;
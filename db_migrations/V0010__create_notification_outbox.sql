@@ -0,0 +1,17 @@
+-- Outbox уведомлений в Telegram: пишется в одной транзакции с бизнес-записью,
+-- рассылается функцией notifications
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id SERIAL PRIMARY KEY,
+    message TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP,
+    failed_at TIMESTAMP
+);
+
+-- Очередь к отправке: только неотправленные записи
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_pending
+    ON notification_outbox(next_attempt_at, id)
+    WHERE sent_at IS NULL AND failed_at IS NULL;
@@ -0,0 +1,11 @@
+-- Момент подтверждения оплаты: для метрики задержки между созданием и оплатой
+ALTER TABLE announcements ADD COLUMN IF NOT EXISTS paid_at TIMESTAMP;
+
+-- Индекс для сверки ожидающих оплаты объявлений
+CREATE INDEX IF NOT EXISTS idx_announcements_pending
+    ON announcements(id)
+    WHERE payment_status = 'pending';
+
+-- Поиск объявления по payment_id (webhook и сверка)
+CREATE INDEX IF NOT EXISTS idx_announcements_payment_id
+    ON announcements(payment_id);
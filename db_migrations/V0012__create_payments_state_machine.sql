@@ -0,0 +1,33 @@
+-- Платежи за объявления: состояние draft → initiated → qr_issued → paid/failed
+CREATE TABLE IF NOT EXISTS payments (
+    order_id VARCHAR(100) PRIMARY KEY,
+    idempotency_key VARCHAR(100) NOT NULL UNIQUE,
+    announcement_id INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    state VARCHAR(20) NOT NULL DEFAULT 'draft'
+        CHECK (state IN ('draft', 'initiated', 'qr_issued', 'paid', 'failed')),
+    payment_id VARCHAR(100),
+    payment_url TEXT,
+    qr_code TEXT,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_payments_payment_id ON payments(payment_id);
+CREATE INDEX IF NOT EXISTS idx_payments_announcement ON payments(announcement_id);
+
+-- Перенос существующих платежей (OrderId прошлых заказов не сохранялся)
+INSERT INTO payments (order_id, idempotency_key, announcement_id, amount, state, payment_id)
+SELECT 'legacy_' || id,
+       'legacy_' || id,
+       id,
+       payment_amount,
+       CASE
+           WHEN payment_status = 'paid' THEN 'paid'
+           WHEN payment_status = 'failed' OR payment_id IS NULL THEN 'failed'
+           ELSE 'qr_issued'
+       END,
+       payment_id
+FROM announcements
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,16 @@
+-- Пул заранее созданных СБП-сессий для фиксированных сумм
+CREATE TABLE IF NOT EXISTS sbp_qr_pool (
+    id SERIAL PRIMARY KEY,
+    amount INTEGER NOT NULL,
+    description VARCHAR(140) NOT NULL,
+    order_id VARCHAR(64) NOT NULL UNIQUE,
+    payment_id VARCHAR(64) NOT NULL,
+    qr_code TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    claimed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_sbp_qr_pool_available
+    ON sbp_qr_pool (amount, description, id)
+    WHERE claimed_at IS NULL;
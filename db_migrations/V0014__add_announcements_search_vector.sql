@@ -0,0 +1,11 @@
+-- Полнотекстовый поиск по объявлениям с русской морфологией:
+-- заголовок весомее описания, категория — слабее всего
+ALTER TABLE announcements ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(category, '')), 'C')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_announcements_search
+    ON announcements USING GIN (search_vector);
@@ -0,0 +1,14 @@
+-- Автодополнение имён знаменитостей: подстрока и похожее написание через pg_trgm
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_celebrity_name_trgm
+    ON celebrity_requests USING GIN (lower(celebrity_name) gin_trgm_ops)
+    WHERE status <> 'rejected';
+
+-- Публичный список: последние неотклонённые обращения без сортировки всей таблицы.
+-- Индекс по одному статусу под условие status <> 'rejected' не подходил.
+CREATE INDEX IF NOT EXISTS idx_celebrity_public_recent
+    ON celebrity_requests(created_at DESC)
+    WHERE status <> 'rejected';
+
+DROP INDEX IF EXISTS idx_celebrity_status;
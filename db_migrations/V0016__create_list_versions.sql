@@ -0,0 +1,35 @@
+-- Версии публичных списков для ETag: любая запись в таблицу увеличивает её версию,
+-- кто бы ни писал (обработчики, сверка платежей, сброс просмотров)
+CREATE TABLE IF NOT EXISTS list_versions (
+    name VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO list_versions (name) VALUES ('announcements'), ('donations'), ('celebrity_requests')
+ON CONFLICT (name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_list_version() RETURNS trigger AS $$
+BEGIN
+    EXECUTE format(
+        'UPDATE %I.list_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP WHERE name = %L',
+        TG_TABLE_SCHEMA, TG_TABLE_NAME
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_announcements_list_version ON announcements;
+CREATE TRIGGER trg_announcements_list_version
+    AFTER INSERT OR UPDATE OR DELETE ON announcements
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_list_version();
+
+DROP TRIGGER IF EXISTS trg_donations_list_version ON donations;
+CREATE TRIGGER trg_donations_list_version
+    AFTER INSERT OR UPDATE OR DELETE ON donations
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_list_version();
+
+DROP TRIGGER IF EXISTS trg_celebrity_requests_list_version ON celebrity_requests;
+CREATE TRIGGER trg_celebrity_requests_list_version
+    AFTER INSERT OR UPDATE OR DELETE ON celebrity_requests
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_list_version();
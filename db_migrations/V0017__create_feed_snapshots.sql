@@ -0,0 +1,9 @@
+-- Готовые ответы первых страниц ленты (JSON и gzip), привязанные к версии списка
+-- из list_versions: снимок с устаревшей версией не отдаётся
+CREATE TABLE IF NOT EXISTS feed_snapshots (
+    page_key TEXT PRIMARY KEY,
+    version BIGINT NOT NULL,
+    body TEXT NOT NULL,
+    body_gzip BYTEA NOT NULL,
+    generated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
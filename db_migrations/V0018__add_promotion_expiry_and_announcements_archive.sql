@@ -0,0 +1,53 @@
+-- Истёкшее продвижение (VIP/поднятие после expires_at): объявление опускается к обычным,
+-- тип, за который платили, сохраняется
+ALTER TABLE announcements ADD COLUMN IF NOT EXISTS promotion_expired BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Выражение генерируемой колонки на месте не меняется: priority пересоздаётся вместе с индексом ленты
+DROP INDEX IF EXISTS idx_announcements_feed;
+ALTER TABLE announcements DROP COLUMN IF EXISTS priority;
+ALTER TABLE announcements ADD COLUMN priority SMALLINT
+    GENERATED ALWAYS AS (
+        CASE
+            WHEN promotion_expired THEN 3
+            WHEN type = 'vip' THEN 1
+            WHEN type = 'boosted' THEN 2
+            ELSE 3
+        END
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_announcements_feed
+    ON announcements(priority, created_at DESC, id DESC)
+    WHERE payment_status = 'paid';
+
+-- Поиск продвижений, которые пора понизить
+CREATE INDEX IF NOT EXISTS idx_announcements_promotion_expiry
+    ON announcements(expires_at)
+    WHERE type IN ('vip', 'boosted') AND NOT promotion_expired;
+
+-- Кандидаты на архивацию выбираются по возрасту
+CREATE INDEX IF NOT EXISTS idx_announcements_created
+    ON announcements(created_at);
+
+-- Архив: закрытые, неоплаченные и старые объявления уезжают сюда пачками,
+-- в announcements (лента, поиск, ETag) остаётся только живой набор
+CREATE TABLE IF NOT EXISTS announcements_archive (
+    id INTEGER PRIMARY KEY,
+    title VARCHAR(200) NOT NULL,
+    description TEXT NOT NULL,
+    category VARCHAR(100),
+    author_name VARCHAR(100) NOT NULL,
+    author_contact VARCHAR(200),
+    type VARCHAR(20),
+    payment_status VARCHAR(20),
+    payment_amount INTEGER NOT NULL,
+    payment_id VARCHAR(100),
+    created_at TIMESTAMP,
+    expires_at TIMESTAMP,
+    paid_at TIMESTAMP,
+    status VARCHAR(20),
+    views INTEGER DEFAULT 0,
+    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_announcements_archive_archived_at
+    ON announcements_archive(archived_at);
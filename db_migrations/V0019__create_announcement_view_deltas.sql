@@ -0,0 +1,8 @@
+-- Просмотры пишутся строкой на каждый вызов: ничего не живёт только в памяти контейнера,
+-- строку объявления не блокируют. В announcements.views их сворачивает вызов по таймеру
+CREATE TABLE IF NOT EXISTS announcement_view_deltas (
+    id BIGSERIAL PRIMARY KEY,
+    announcement_id INTEGER NOT NULL,
+    delta INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,8 @@
+-- Посещения пишутся строкой на каждый вызов, время ставит БД. В site_visits и
+-- site_visits_daily (визиты и HLL-скетчи по дням) их переносит вызов по таймеру
+CREATE TABLE IF NOT EXISTS site_visit_events (
+    id BIGSERIAL PRIMARY KEY,
+    visitor_ip VARCHAR(45),
+    user_agent TEXT,
+    visited_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
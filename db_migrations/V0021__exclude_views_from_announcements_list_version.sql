@@ -0,0 +1,11 @@
+-- Просмотры не меняют версию ленты: иначе каждая свёртка журнала просмотров сбрасывала бы
+-- ETag и снимки ленты. Счётчики в ленте обновляет вызов по таймеру, пересобирая снимки
+-- под той же версией; клиент с действующим ETag видит их при следующей записи в ленту.
+-- Новая колонка announcements, видимая в ленте, должна попасть в этот список
+DROP TRIGGER IF EXISTS trg_announcements_list_version ON announcements;
+CREATE TRIGGER trg_announcements_list_version
+    AFTER INSERT OR DELETE OR UPDATE OF
+        title, description, category, author_name, author_contact, type, payment_status,
+        payment_amount, created_at, expires_at, status, payment_id, paid_at, promotion_expired
+    ON announcements
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_list_version();
@@ -0,0 +1,4 @@
+-- Лента по категории фильтруется на сервере: keyset-пагинация внутри одной категории
+CREATE INDEX IF NOT EXISTS idx_announcements_category_feed
+    ON announcements(category, priority, created_at DESC, id DESC)
+    WHERE payment_status = 'paid';
@@ -0,0 +1,32 @@
+-- Порядковый номер сообщения внутри переписки. Выдаётся в send_message под блокировкой
+-- строки отклика, поэтому номера становятся видимы строго по порядку, в отличие от id
+-- (SERIAL выдаётся до коммита, и id N+1 может закоммититься раньше id N).
+-- Long-poll выбирает новые сообщения по seq и не теряет закоммиченные позже.
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS seq BIGINT;
+ALTER TABLE responses ADD COLUMN IF NOT EXISTS last_message_seq BIGINT NOT NULL DEFAULT 0;
+
+-- Заполнение по существующим сообщениям в порядке истории
+UPDATE messages m
+SET seq = n.seq
+FROM (
+    SELECT id, ROW_NUMBER() OVER (PARTITION BY response_id ORDER BY created_at, id) AS seq
+    FROM messages
+) n
+WHERE m.id = n.id;
+
+UPDATE responses r
+SET last_message_seq = c.last_seq
+FROM (
+    SELECT response_id, MAX(seq) AS last_seq
+    FROM messages
+    GROUP BY response_id
+) c
+WHERE r.id = c.response_id;
+
+ALTER TABLE messages ALTER COLUMN seq SET NOT NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_response_seq
+    ON messages(response_id, seq);
+
+-- История переписки тоже идёт по seq: индекс по (created_at, id) больше не нужен
+DROP INDEX IF EXISTS idx_messages_response_created;
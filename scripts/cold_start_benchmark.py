@@ -0,0 +1,118 @@
+"""Бенчмарк холодного старта облачных функций.
+
+Каждый замер — отдельный процесс python, как новый контейнер: время импорта
+index.py, задержка первого вызова handler и повторного (тёплого) вызова.
+Preflight (OPTIONS) меряется всегда и должен отвечать без загрузки psycopg2
+и requests, с Access-Control-Max-Age; запросы к БД — только если задан DATABASE_URL.
+
+    python scripts/cold_start_benchmark.py                 # текущее дерево
+    python scripts/cold_start_benchmark.py --ref HEAD~1    # та же таблица для ревизии из git (до/после)
+    python scripts/cold_start_benchmark.py --runs 10 announcements payments
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+from io import BytesIO
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Типичный первый запрос к каждой функции после холодного старта
+DB_EVENTS = {
+    'announcements': {'httpMethod': 'GET', 'queryStringParameters': {}},
+    'celebrities': {'httpMethod': 'GET', 'queryStringParameters': {}},
+    'donations': {'httpMethod': 'GET', 'queryStringParameters': {}},
+    'responses': {'httpMethod': 'GET', 'queryStringParameters': {'announcement_id': '1'}},
+    'payments': {'httpMethod': 'POST', 'body': json.dumps({'action': 'check_payment', 'announcement_id': 1})},
+}
+
+PREFLIGHT_EVENT = {'httpMethod': 'OPTIONS', 'headers': {'Origin': 'https://example.com'}}
+
+# Выполняется в новом процессе из папки функции; печатает JSON с замерами в мс
+PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import index
+imported = time.perf_counter()
+event = json.loads(sys.argv[1])
+response = index.handler(event, None)
+finished = time.perf_counter()
+index.handler(event, None)
+repeated = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'first_call_ms': (finished - imported) * 1000,
+    'repeat_call_ms': (repeated - finished) * 1000,
+    'status': response.get('statusCode'),
+    'max_age': response.get('headers', {}).get('Access-Control-Max-Age'),
+    'requests_loaded': 'requests' in sys.modules,
+    'psycopg2_loaded': 'psycopg2' in sys.modules,
+}))
+'''
+
+def checkout(ref: str) -> Path:
+    """Распаковать backend из ревизии git во временную папку"""
+    archive = subprocess.run(['git', 'archive', ref, 'backend'], cwd=ROOT, check=True, capture_output=True).stdout
+    target = Path(tempfile.mkdtemp(prefix='cold_start_'))
+    with tarfile.open(fileobj=BytesIO(archive)) as tar:
+        tar.extractall(target)
+    return target / 'backend'
+
+def probe(function_dir: Path, event: dict) -> dict:
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, json.dumps(event)],
+        cwd=function_dir, capture_output=True, text=True, env={**os.environ, 'PYTHONDONTWRITEBYTECODE': '1'}
+    )
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1] if result.stderr else 'failed'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def measure(function_dir: Path, event: dict, runs: int) -> dict:
+    samples = [probe(function_dir, event) for _ in range(runs)]
+    errors = [s['error'] for s in samples if 'error' in s]
+    if errors:
+        return {'error': errors[0]}
+    return {
+        'import_ms': statistics.median(s['import_ms'] for s in samples),
+        'first_call_ms': statistics.median(s['first_call_ms'] for s in samples),
+        'repeat_call_ms': statistics.median(s['repeat_call_ms'] for s in samples),
+        'status': samples[0]['status'],
+        'max_age': samples[0]['max_age'],
+        'requests_loaded': samples[0]['requests_loaded'],
+        'psycopg2_loaded': samples[0]['psycopg2_loaded'],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('functions', nargs='*', help='функции (по умолчанию все)')
+    parser.add_argument('--ref', help='ревизия git для сравнения, например HEAD~1')
+    parser.add_argument('--runs', type=int, default=5, help='замеров на случай (берётся медиана)')
+    args = parser.parse_args()
+
+    backend = checkout(args.ref) if args.ref else ROOT / 'backend'
+    functions = args.functions or sorted(p.name for p in backend.iterdir() if (p / 'index.py').exists())
+    with_db = bool(os.environ.get('DATABASE_URL'))
+
+    print(f"backend: {args.ref or 'рабочее дерево'}, замеров: {args.runs}, БД: {'да' if with_db else 'нет'}")
+    print(f"{'функция':<15}{'запрос':<10}{'импорт, мс':>12}{'1-й вызов, мс':>15}{'2-й вызов, мс':>15}"
+          f"{'статус':>8}{'Max-Age':>9}  загружены модули")
+    for name in functions:
+        cases = [('OPTIONS', PREFLIGHT_EVENT)]
+        if with_db and name in DB_EVENTS:
+            cases.append((DB_EVENTS[name]['httpMethod'], DB_EVENTS[name]))
+        for label, event in cases:
+            m = measure(backend / name, event, args.runs)
+            if 'error' in m:
+                print(f'{name:<15}{label:<10}  ошибка: {m["error"]}')
+                continue
+            loaded = ', '.join(mod for mod in ('requests', 'psycopg2') if m[f'{mod}_loaded']) or '-'
+            print(f"{name:<15}{label:<10}{m['import_ms']:>12.1f}{m['first_call_ms']:>15.1f}{m['repeat_call_ms']:>15.2f}"
+                  f"{m['status']:>8}{m['max_age'] or '-':>9}  {loaded}")
+
+if __name__ == '__main__':
+    main()
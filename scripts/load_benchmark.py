@@ -0,0 +1,544 @@
+"""Нагрузочный бенчмарк обработчиков: handler(event, context) в процессе против локального Postgres.
+
+Создаёт отдельную схему, накатывает db_migrations, засевает синтетические данные
+(объявления, отклики, сообщения, посещения, пожертвования, обращения) и прогоняет
+сценарии — смеси запросов с весами, как от реальных клиентов. Для каждого вида
+запроса: p50/p95/p99 задержки, запросов к БД и строк на вызов; для сценария —
+строк, прочитанных из таблиц (pg_stat_user_tables), на вызов. Отдельно — уникальные
+посетители за период: точный COUNT(DISTINCT) по site_visits против объединения
+дневных HLL-скетчей (время и погрешность).
+
+Только на отдельной базе: схема пересоздаётся.
+
+    DATABASE_URL=postgresql://localhost/bench python scripts/load_benchmark.py --rows 100000
+    python scripts/load_benchmark.py --rows 1000000 --requests 5000 feed
+    python scripts/load_benchmark.py --reuse --json after.json --baseline before.json
+"""
+import argparse
+import base64
+import gzip
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import timedelta
+from pathlib import Path
+
+import psycopg2
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND = ROOT / 'backend'
+MIGRATIONS = ROOT / 'db_migrations'
+# Схема прода зашита в первых миграциях, остальные полагаются на search_path
+MIGRATION_SCHEMA = 't_p34278592_help_request_platfor'
+
+BROWSER_HEADERS = {'Accept-Encoding': 'gzip, deflate, br', 'user-agent': 'load-benchmark'}
+ADMIN_CODE = 'HELP2025'
+
+SEARCH_TERMS = ['ремонт квартиры', 'помощь пенсионеру', 'переезд', 'лекарства', 'репетитор математике',
+                'уборка дачи', 'довезти больницу', 'выгул собаки']
+CELEBRITY_NAMES = ['Алла Пугачёва', 'Филипп Киркоров', 'Константин Хабенский', 'Чулпан Хаматова',
+                   'Сергей Безруков', 'Ольга Бузова', 'Иван Ургант', 'Дмитрий Нагиев',
+                   'Полина Гагарина', 'Максим Галкин', 'Егор Крид', 'Светлана Лобода']
+
+class CountingCursor:
+    """Курсор, считающий запросы и возвращённые строки"""
+
+    def __init__(self, cursor, counters: dict):
+        self._cursor = cursor
+        self._counters = counters
+
+    def execute(self, query, params=None):
+        self._counters['queries'] += 1
+        result = self._cursor.execute(query, params)
+        if self._cursor.rowcount > 0:
+            self._counters['rows'] += self._cursor.rowcount
+        return result
+
+    def __getattr__(self, attr):
+        return getattr(self._cursor, attr)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._cursor.close()
+
+class CountingConnection:
+    """Соединение, выдающее считающие курсоры; остальное проксируется как есть"""
+
+    def __init__(self, conn, counters: dict):
+        object.__setattr__(self, 'raw', conn)
+        object.__setattr__(self, '_counters', counters)
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self.raw.cursor(*args, **kwargs), self._counters)
+
+    def __getattr__(self, attr):
+        return getattr(self.raw, attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.raw, attr, value)
+
+def load_function(name: str, counters: dict):
+    """Импортировать index.py функции в текущий процесс со своей копией core.
+
+    У всех функций одинаковые имена модулей (index, core, ...), поэтому после
+    импорта они убираются из sys.modules: загруженный модуль держит ссылки сам.
+    Пул соединений подменяется на считающий запросы.
+    """
+    function_dir = BACKEND / name
+    local = {p.stem for p in function_dir.glob('*.py')} | {'core'}
+
+    def purge():
+        for module in list(sys.modules):
+            if module.split('.')[0] in local:
+                del sys.modules[module]
+
+    purge()
+    sys.path.insert(0, str(function_dir))
+    try:
+        index = __import__('index')
+        db = sys.modules['core.db']
+    finally:
+        sys.path.remove(str(function_dir))
+        purge()
+
+    class CountingPool(db.ConnectionPool):
+        def getconn(self):
+            return CountingConnection(super().getconn(), counters)
+
+        def putconn(self, conn, broken: bool = False):
+            super().putconn(getattr(conn, 'raw', conn), broken)
+
+    db._pool = CountingPool(os.environ['DATABASE_URL'], db.DB_POOL_MAX_SIZE,
+                            db.DB_POOL_IDLE_TIMEOUT, db.DB_POOL_WAIT_TIMEOUT)
+    return index, db._pool
+
+def apply_migrations(conn, schema: str):
+    with conn.cursor() as cur:
+        cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        cur.execute(f"CREATE SCHEMA {schema}")
+        cur.execute(f"SET search_path TO {schema}, public")
+        for path in sorted(MIGRATIONS.glob('V*.sql')):
+            cur.execute(path.read_text().replace(f'{MIGRATION_SCHEMA}.', f'{schema}.'))
+    conn.commit()
+
+def seed(conn, schema: str, rows: int):
+    """Синтетические данные: rows объявлений за год, отклики, переписка, посещения за 30 дней"""
+    words = "ARRAY['помощь', 'нужна', 'ремонт', 'квартиры', 'переезд', 'грузчики', 'репетитор', " \
+            "'математике', 'лекарства', 'врач', 'уборка', 'дачи', 'огород', 'довезти', 'больницу', " \
+            "'выгул', 'собаки', 'компьютер', 'пенсионеру', 'продукты', 'доставка', 'сантехника']"
+    celebrities = 'ARRAY[' + ', '.join(f"'{name}'" for name in CELEBRITY_NAMES) + ']'
+    steps = [
+        ('объявления', f"""
+            INSERT INTO {schema}.announcements
+                (title, description, category, author_name, author_contact, type, payment_status,
+                 payment_amount, created_at, expires_at, status, views, paid_at)
+            SELECT w[1 + (i * 7) %% 22] || ' ' || w[1 + (i * 13) %% 22] || ' ' || w[1 + (i * 5) %% 22],
+                   (SELECT string_agg(w[1 + ((i * 17 + k * 11) %% 22)], ' ') FROM generate_series(1, 25) k),
+                   (ARRAY['Быт', 'Здоровье', 'Образование', 'Транспорт', 'Разное'])[1 + i %% 5],
+                   'Автор ' || i %% 5000, 'author' || i %% 5000 || '@example.com',
+                   CASE WHEN random() < 0.01 THEN 'vip' WHEN random() < 0.05 THEN 'boosted' ELSE 'regular' END,
+                   CASE WHEN random() < 0.9 THEN 'paid' ELSE 'pending' END,
+                   100, ts, ts + INTERVAL '7 days',
+                   CASE WHEN random() < 0.2 THEN 'closed' ELSE 'active' END,
+                   (random() * 500)::int, ts + INTERVAL '5 minutes'
+            FROM generate_series(1, %(rows)s) i, (SELECT {words} AS w) words,
+                 LATERAL (SELECT CURRENT_TIMESTAMP - (%(rows)s - i) * INTERVAL '1 year' / %(rows)s AS ts) t
+        """),
+        ('отклики', f"""
+            INSERT INTO {schema}.responses (announcement_id, responder_name, responder_contact, message, created_at)
+            SELECT 1 + (random() * (%(rows)s - 1))::int, 'Волонтёр ' || i %% 3000, 'volunteer@example.com',
+                   'Готов помочь, напишите подробности', CURRENT_TIMESTAMP - (%(rows)s - i) * INTERVAL '1 year' / %(rows)s
+            FROM generate_series(1, %(rows)s / 2) i
+        """),
+        ('сообщения', f"""
+            INSERT INTO {schema}.messages (response_id, sender_name, message, created_at, seq)
+            SELECT response_id, 'Участник ' || i %% 3000, 'Сообщение переписки номер ' || i, created_at,
+                   ROW_NUMBER() OVER (PARTITION BY response_id ORDER BY i)
+            FROM (
+                SELECT i, 1 + (random() * (%(rows)s / 2 - 1))::int AS response_id,
+                       CURRENT_TIMESTAMP - (2 * %(rows)s - i) * INTERVAL '1 year' / (2 * %(rows)s) AS created_at
+                FROM generate_series(1, 2 * %(rows)s) i
+            ) m
+        """),
+        ('счётчики сообщений', f"""
+            UPDATE {schema}.responses r
+            SET message_count = m.total, last_message_seq = m.total, last_message_at = m.last_at
+            FROM (SELECT response_id, COUNT(*) AS total, MAX(created_at) AS last_at
+                  FROM {schema}.messages GROUP BY response_id) m
+            WHERE r.id = m.response_id
+        """),
+        ('посещения', f"""
+            INSERT INTO {schema}.site_visits (visitor_ip, user_agent, visited_at)
+            SELECT '10.' || (random() * 255)::int || '.' || (random() * 255)::int || '.1', 'Mozilla/5.0',
+                   CURRENT_TIMESTAMP - random() * INTERVAL '30 days'
+            FROM generate_series(1, %(rows)s) i
+        """),
+        ('дневные агрегаты', f"""
+            INSERT INTO {schema}.site_visits_daily (day, visits, unique_visitors)
+            SELECT visited_at::date, COUNT(*), COUNT(DISTINCT visitor_ip)
+            FROM {schema}.site_visits GROUP BY visited_at::date
+        """),
+        ('пожертвования', f"""
+            INSERT INTO {schema}.donations (donor_name, donor_contact, amount, message, payment_status, created_at)
+            SELECT 'Донор ' || i, 'donor@example.com', 100 + (random() * 5000)::int, 'Спасибо за помощь',
+                   CASE WHEN random() < 0.8 THEN 'paid' ELSE 'pending' END,
+                   CURRENT_TIMESTAMP - random() * INTERVAL '1 year'
+            FROM generate_series(1, GREATEST(%(rows)s / 10, 1)) i
+        """),
+        ('обращения', f"""
+            INSERT INTO {schema}.celebrity_requests (requester_name, celebrity_name, request_text, status, created_at)
+            SELECT 'Заявитель ' || i, c[1 + i %% array_length(c, 1)], 'Просьба о помощи',
+                   (ARRAY['pending', 'approved', 'rejected'])[1 + i %% 3],
+                   CURRENT_TIMESTAMP - random() * INTERVAL '1 year'
+            FROM generate_series(1, GREATEST(%(rows)s / 10, 1)) i, (SELECT {celebrities} AS c) names
+        """),
+    ]
+    with conn.cursor() as cur:
+        cur.execute("SELECT setseed(0.42)")
+        for label, sql in steps:
+            started = time.perf_counter()
+            cur.execute(sql, {'rows': rows})
+            print(f'  {label}: {cur.rowcount} строк за {time.perf_counter() - started:.1f} с')
+    conn.commit()
+
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("VACUUM ANALYZE")
+    conn.autocommit = False
+
+def decode_body(response: dict):
+    body = response.get('body') or ''
+    if response.get('isBase64Encoded'):
+        raw = base64.b64decode(body)
+        encoding = response.get('headers', {}).get('Content-Encoding')
+        if encoding == 'gzip':
+            raw = gzip.decompress(raw)
+        elif encoding == 'br':
+            import brotli
+            raw = brotli.decompress(raw)
+        body = raw.decode()
+    return json.loads(body) if body else None
+
+def prepare_context(conn, schema: str, functions: dict) -> dict:
+    """Идентификаторы и курсоры из засеянных данных для генерации запросов"""
+    ctx = {}
+    with conn.cursor() as cur:
+        cur.execute(f"SELECT MAX(id) FROM {schema}.announcements")
+        ctx['max_announcement_id'] = cur.fetchone()[0] or 1
+        cur.execute(f"SELECT DISTINCT author_name FROM {schema}.announcements LIMIT 200")
+        ctx['authors'] = [row[0] for row in cur.fetchall()]
+        cur.execute(f"""
+            SELECT r.id, MAX(m.id) FROM {schema}.responses r
+            JOIN {schema}.messages m ON m.response_id = r.id
+            WHERE r.id IN (SELECT id FROM {schema}.responses WHERE message_count > 0 ORDER BY random() LIMIT 1000)
+            GROUP BY r.id
+        """)
+        ctx['conversations'] = cur.fetchall() or [(1, 0)]
+    conn.rollback()
+
+    # Курсоры глубоких страниц ленты и ETag первой страницы для повторных запросов
+    handler = functions['announcements'].handler
+    ctx['feed_cursors'] = []
+    page_cursor = None
+    for _ in range(10):
+        params = {'cursor': page_cursor} if page_cursor else {}
+        response = handler({'httpMethod': 'GET', 'queryStringParameters': params}, None)
+        page = decode_body(response) or {}
+        if page_cursor is None:
+            ctx['feed_etag'] = response.get('headers', {}).get('ETag', '')
+        page_cursor = page.get('next_cursor')
+        if not page_cursor:
+            break
+        ctx['feed_cursors'].append(page_cursor)
+    ctx['feed_cursors'] = ctx['feed_cursors'] or ['']
+    return ctx
+
+def get(params: dict, **headers) -> dict:
+    return {'httpMethod': 'GET', 'queryStringParameters': params, 'headers': {**BROWSER_HEADERS, **headers}}
+
+def post(body: dict) -> dict:
+    return {'httpMethod': 'POST', 'body': json.dumps(body), 'headers': dict(BROWSER_HEADERS),
+            'requestContext': {'identity': {'sourceIp': f'10.1.{random.randint(0, 255)}.{random.randint(0, 255)}'}}}
+
+def random_announcement(ctx: dict) -> str:
+    return str(random.randint(1, ctx['max_announcement_id']))
+
+def poll_messages(ctx: dict) -> dict:
+    response_id, last_message_id = random.choice(ctx['conversations'])
+    return get({'response_id': str(response_id), 'since_id': str(last_message_id)})
+
+# Виды запросов: имя -> (функция, генератор события)
+REQUESTS = {
+    'feed': ('announcements', lambda ctx: get({})),
+    'feed_304': ('announcements', lambda ctx: get({}, **{'If-None-Match': ctx['feed_etag']})),
+    'feed_deep': ('announcements', lambda ctx: get({'cursor': random.choice(ctx['feed_cursors'])})),
+    'feed_type': ('announcements', lambda ctx: get({'type': random.choice(['vip', 'boosted', 'regular'])})),
+    'feed_author': ('announcements', lambda ctx: get({'author': random.choice(ctx['authors'])})),
+    'search': ('announcements', lambda ctx: get({'q': random.choice(SEARCH_TERMS)})),
+    'track_view': ('announcements', lambda ctx: get({'id': random_announcement(ctx), 'track_view': '1'})),
+    'track_visit': ('announcements', lambda ctx: post({'action': 'track_visit'})),
+    'admin_stats': ('announcements', lambda ctx: post({'action': 'get_stats', 'admin_code': ADMIN_CODE})),
+    'responses': ('responses', lambda ctx: get({'announcement_id': random_announcement(ctx)})),
+    'messages': ('responses', lambda ctx: get({'response_id': str(random.choice(ctx['conversations'])[0])})),
+    'messages_poll': ('responses', poll_messages),
+    'send_message': ('responses', lambda ctx: post({
+        'action': 'send_message', 'response_id': random.choice(ctx['conversations'])[0],
+        'sender_name': 'Нагрузка', 'message': 'Сообщение из бенчмарка'})),
+    'create_response': ('responses', lambda ctx: post({
+        'action': 'create_response', 'announcement_id': int(random_announcement(ctx)),
+        'responder_name': 'Нагрузка', 'responder_contact': 'load@example.com', 'message': 'Готов помочь'})),
+    'check_payment': ('payments', lambda ctx: post({'action': 'check_payment',
+                                                     'announcement_id': int(random_announcement(ctx))})),
+    'donations': ('donations', lambda ctx: get({})),
+    'celebrities': ('celebrities', lambda ctx: get({})),
+    'suggest': ('celebrities', lambda ctx: get({'suggest': random.choice(CELEBRITY_NAMES)[:random.randint(2, 6)]})),
+}
+
+# Сценарии: веса видов запросов
+SCENARIOS = {
+    'feed': {'feed': 40, 'feed_304': 15, 'feed_deep': 15, 'feed_type': 5, 'feed_author': 5,
+             'search': 10, 'track_view': 10},
+    'chat': {'responses': 25, 'messages': 25, 'messages_poll': 30, 'send_message': 15, 'create_response': 5},
+    'mixed': {'feed': 25, 'feed_304': 10, 'feed_deep': 5, 'search': 5, 'track_view': 10, 'track_visit': 15,
+              'responses': 6, 'messages': 5, 'messages_poll': 5, 'send_message': 2, 'create_response': 1,
+              'check_payment': 5, 'donations': 3, 'celebrities': 2, 'suggest': 1, 'admin_stats': 0.5},
+}
+
+def flush_table_stats(pools: list):
+    """Дописать статистику таблиц из соединений обработчиков (иначе она приходит с задержкой)"""
+    for pool in pools:
+        for conn, _ in pool._idle:
+            if conn.server_version >= 150000:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT pg_stat_force_next_flush()")
+                conn.commit()
+    if any(conn.server_version < 150000 for pool in pools for conn, _ in pool._idle):
+        time.sleep(0.6)
+
+def rows_scanned(conn, schema: str) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_stat_clear_snapshot()")
+        cur.execute("""
+            SELECT COALESCE(SUM(COALESCE(seq_tup_read, 0) + COALESCE(idx_tup_fetch, 0)), 0)
+            FROM pg_stat_user_tables WHERE schemaname = %s
+        """, (schema,))
+        total = cur.fetchone()[0]
+    conn.rollback()
+    return int(total)
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+def run_scenario(name: str, functions: dict, pools: list, counters: dict, ctx: dict,
+                 monitor, schema: str, requests_count: int, warmup: int) -> dict:
+    kinds = list(SCENARIOS[name])
+    weights = [SCENARIOS[name][kind] for kind in kinds]
+    samples = {kind: {'latency_ms': [], 'queries': 0, 'rows': 0, 'statuses': {}} for kind in kinds}
+
+    for kind in random.choices(kinds, weights, k=warmup):
+        function, make_event = REQUESTS[kind]
+        functions[function].handler(make_event(ctx), None)
+
+    flush_table_stats(pools)
+    scanned_before = rows_scanned(monitor, schema)
+    started = time.perf_counter()
+    for kind in random.choices(kinds, weights, k=requests_count):
+        function, make_event = REQUESTS[kind]
+        event = make_event(ctx)
+        counters['queries'] = counters['rows'] = 0
+        call_started = time.perf_counter()
+        response = functions[function].handler(event, None)
+        elapsed = (time.perf_counter() - call_started) * 1000
+
+        sample = samples[kind]
+        sample['latency_ms'].append(elapsed)
+        sample['queries'] += counters['queries']
+        sample['rows'] += counters['rows']
+        status = response.get('statusCode')
+        # Как браузер: следующий условный запрос ленты идёт с последним полученным ETag
+        if kind == 'feed' and status == 200:
+            ctx['feed_etag'] = response['headers'].get('ETag', ctx['feed_etag'])
+        sample['statuses'][status] = sample['statuses'].get(status, 0) + 1
+    wall = time.perf_counter() - started
+    flush_table_stats(pools)
+    scanned = rows_scanned(monitor, schema) - scanned_before
+
+    report = {'requests': requests_count, 'rps': requests_count / wall,
+              'rows_scanned_per_request': scanned / requests_count, 'kinds': {}}
+    all_latencies = []
+    for kind, sample in samples.items():
+        latencies = sample['latency_ms']
+        if not latencies:
+            continue
+        all_latencies.extend(latencies)
+        report['kinds'][kind] = {
+            'count': len(latencies),
+            'p50_ms': statistics.median(latencies),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+            'queries_per_request': sample['queries'] / len(latencies),
+            'rows_per_request': sample['rows'] / len(latencies),
+            'statuses': sample['statuses'],
+        }
+    report['p50_ms'] = statistics.median(all_latencies)
+    report['p95_ms'] = percentile(all_latencies, 95)
+    report['p99_ms'] = percentile(all_latencies, 99)
+    return report
+
+def print_report(name: str, report: dict, baseline: dict = None):
+    print(f"\nсценарий {name}: {report['requests']} запросов, {report['rps']:.0f} в секунду, "
+          f"p50 {report['p50_ms']:.2f} / p95 {report['p95_ms']:.2f} / p99 {report['p99_ms']:.2f} мс, "
+          f"строк прочитано на запрос: {report['rows_scanned_per_request']:.0f}")
+    print(f"{'запрос':<16}{'число':>7}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}"
+          f"{'запросов к БД':>15}{'строк':>9}  статусы{'  p95 к базовому' if baseline else ''}")
+    for kind, m in sorted(report['kinds'].items(), key=lambda item: -item[1]['count']):
+        statuses = ', '.join(f'{status}×{count}' for status, count in sorted(m['statuses'].items(), key=str))
+        line = (f"{kind:<16}{m['count']:>7}{m['p50_ms']:>10.2f}{m['p95_ms']:>10.2f}{m['p99_ms']:>10.2f}"
+                f"{m['queries_per_request']:>15.2f}{m['rows_per_request']:>9.1f}  {statuses}")
+        before = (baseline or {}).get('kinds', {}).get(kind)
+        if before:
+            line += f"  {(m['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}%"
+        print(line)
+
+# Периоды уникальных посетителей: подпись -> дней назад (None — за всё время)
+UNIQUE_VISITOR_PERIODS = [('всё время', None), ('30 дней', 30), ('7 дней', 7), ('сегодня', 0)]
+
+def median_call(runs: int, func):
+    samples, result = [], None
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+def compare_unique_visitors(conn, schema: str, announcements, runs: int) -> dict:
+    """Уникальные посетители за период: точный COUNT(DISTINCT) по site_visits против слияния HLL-скетчей"""
+    # Засеянные дни без скетчей досчитываются так же, как первым вызовом по таймеру
+    announcements.rebuild_visitor_sketches(conn, schema, missing_only=True)
+    with conn.cursor() as cur:
+        cur.execute("SELECT CURRENT_DATE")
+        today = cur.fetchone()[0]
+    conn.rollback()
+
+    def exact(date_from):
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT COUNT(DISTINCT COALESCE(visitor_ip, 'unknown')) FROM {schema}.site_visits
+                {'WHERE visited_at >= %s' if date_from else ''}
+            """, (date_from,) if date_from else None)
+            value = cur.fetchone()[0]
+        conn.rollback()
+        return value
+
+    def estimated(date_from):
+        # Тот же путь, что у get_stats: дневные скетчи за период одним запросом и слияние в функции
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT array_agg(visitors_sketch) FROM {schema}.site_visits_daily
+                WHERE visitors_sketch IS NOT NULL{' AND day >= %s' if date_from else ''}
+            """, (date_from,) if date_from else None)
+            sketches = cur.fetchone()[0] or []
+        conn.rollback()
+        merged = announcements.HyperLogLog(announcements.HLL_PRECISION)
+        for sketch_data in sketches:
+            merged.merge(announcements.HyperLogLog.from_bytes(bytes(sketch_data)))
+        return merged.estimate()
+
+    print(f"\nуникальные посетители: COUNT(DISTINCT) против HLL (медиана из {runs})")
+    print(f"{'период':<12}{'точно':>10}{'мс':>10}{'HLL':>10}{'мс':>10}{'ошибка':>9}")
+    report = {}
+    for label, days in UNIQUE_VISITOR_PERIODS:
+        date_from = None if days is None else today - timedelta(days=days)
+        exact_ms, exact_value = median_call(runs, lambda: exact(date_from))
+        hll_ms, hll_value = median_call(runs, lambda: estimated(date_from))
+        error = (hll_value - exact_value) / exact_value * 100 if exact_value else 0.0
+        report[label] = {'exact': exact_value, 'exact_ms': exact_ms, 'hll': hll_value, 'hll_ms': hll_ms,
+                         'error_pct': error}
+        print(f"{label:<12}{exact_value:>10}{exact_ms:>10.2f}{hll_value:>10}{hll_ms:>10.2f}{error:>+8.2f}%")
+    return report
+
+def regressions(results: dict, baseline: dict, threshold: float) -> list:
+    """Виды запросов, у которых p95 или число запросов к БД выросли сильнее порога"""
+    found = []
+    for scenario, report in results.items():
+        for kind, m in report['kinds'].items():
+            before = baseline.get(scenario, {}).get('kinds', {}).get(kind)
+            if not before:
+                continue
+            if m['p95_ms'] > before['p95_ms'] * (1 + threshold):
+                found.append(f"{scenario}/{kind}: p95 {before['p95_ms']:.2f} -> {m['p95_ms']:.2f} мс")
+            if m['queries_per_request'] > before['queries_per_request'] + 0.5:
+                found.append(f"{scenario}/{kind}: запросов к БД {before['queries_per_request']:.1f} -> "
+                             f"{m['queries_per_request']:.1f}")
+    return found
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('scenarios', nargs='*', help=f"сценарии (по умолчанию все: {', '.join(SCENARIOS)})")
+    parser.add_argument('--rows', type=int, default=10000, help='объявлений в синтетических данных (10k-1M)')
+    parser.add_argument('--requests', type=int, default=2000, help='замеряемых запросов на сценарий')
+    parser.add_argument('--warmup', type=int, default=200, help='прогревочных запросов на сценарий')
+    parser.add_argument('--schema', default='load_bench', help='схема для данных бенчмарка')
+    parser.add_argument('--reuse', action='store_true', help='не пересоздавать схему и данные')
+    parser.add_argument('--seed', type=int, default=42, help='зерно генератора запросов')
+    parser.add_argument('--json', help='сохранить результаты в файл')
+    parser.add_argument('--baseline', help='результаты предыдущего прогона (--json) для сравнения')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='допустимый рост p95 относительно --baseline (0.2 = 20%%)')
+    parser.add_argument('--unique-runs', type=int, default=5,
+                        help='замеров уникальных посетителей COUNT(DISTINCT) против HLL (0 — пропустить)')
+    args = parser.parse_args()
+
+    if 'DATABASE_URL' not in os.environ:
+        parser.error('нужен DATABASE_URL отдельной базы для бенчмарка')
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    os.environ['MAIN_DB_SCHEMA'] = args.schema
+    random.seed(args.seed)
+
+    monitor = psycopg2.connect(os.environ['DATABASE_URL'])
+    if not args.reuse:
+        print(f'схема {args.schema}: миграции и {args.rows} объявлений')
+        apply_migrations(monitor, args.schema)
+        seed(monitor, args.schema, args.rows)
+
+    counters = {'queries': 0, 'rows': 0}
+    functions, pools = {}, []
+    for name in sorted({function for function, _ in REQUESTS.values()}):
+        functions[name], pool = load_function(name, counters)
+        pools.append(pool)
+    ctx = prepare_context(monitor, args.schema, functions)
+
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else {}
+    results = {}
+    for name in args.scenarios or list(SCENARIOS):
+        results[name] = run_scenario(name, functions, pools, counters, ctx, monitor, args.schema,
+                                     args.requests, args.warmup)
+        print_report(name, results[name], baseline.get(name))
+
+    if args.unique_runs > 0:
+        compare_unique_visitors(monitor, args.schema, functions['announcements'], args.unique_runs)
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, ensure_ascii=False, indent=2))
+
+    found = regressions(results, baseline, args.max_regression) if baseline else []
+    if found:
+        print('\nрегрессии относительно базового прогона:')
+        for line in found:
+            print(f'  {line}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Бенчмарк сериализации и сжатия ответов функций.
+
+Размер тела и время json_response для типичных ответов (лента, выгрузка
+пожертвований в админке, короткий ответ) без сжатия, с gzip и с brotli —
+с тем сериализатором (orjson или json) и модулями сжатия, что установлены.
+
+    python scripts/response_benchmark.py
+    python scripts/response_benchmark.py --repeat 200
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'backend'))
+
+from core import response
+
+WORDS = ['помощь', 'ремонт', 'квартира', 'переезд', 'лекарства', 'репетитор', 'доставка', 'уборка']
+
+def sample_payloads() -> list:
+    feed = {
+        'announcements': [
+            {
+                'id': i,
+                'title': ' '.join(random.choices(WORDS, k=4)),
+                'description': ' '.join(random.choices(WORDS, k=60)),
+                'category': 'Быт',
+                'author': 'Вы',
+                'date': '2025-01-01T12:00:00',
+                'type': 'regular',
+                'status': 'Опубликовано',
+                'views': random.randint(0, 1000)
+            }
+            for i in range(100)
+        ],
+        'next_cursor': None
+    }
+    donations = [
+        {'id': i, 'donor_name': 'Аноним', 'amount': 500, 'message': ' '.join(random.choices(WORDS, k=10)),
+         'created_at': '2025-01-01T12:00:00'}
+        for i in range(1000)
+    ]
+    return [('feed (100)', feed), ('admin donations (1000)', donations), ('small', {'success': True})]
+
+def measure(name: str, data, accept: str, repeat: int):
+    event = {'headers': {'Accept-Encoding': accept}}
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = response.json_response(event, 200, data)
+    elapsed_ms = (time.perf_counter() - started) * 1000 / repeat
+    encoding = result['headers'].get('Content-Encoding', 'identity')
+    print(f'{name:<28} {encoding:<8} {len(result["body"]):>9} B  {elapsed_ms:7.2f} ms')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=50, help='вызовов на случай (берётся среднее)')
+    args = parser.parse_args()
+
+    print(f'json encoder: {"orjson" if response.orjson else "json"}, brotli: {"yes" if response.brotli else "no"}')
+    for name, data in sample_payloads():
+        for accept in ('', 'gzip', 'br, gzip'):
+            measure(name, data, accept, args.repeat)
+
+if __name__ == '__main__':
+    main()
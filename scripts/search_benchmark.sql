@@ -0,0 +1,79 @@
+-- Бенчмарк полнотекстового поиска на синтетических 1M объявлений.
+-- Запуск на отдельной базе: psql "$DATABASE_URL" -f scripts/search_benchmark.sql
+-- Сравнивает ILIKE (как фильтровал клиент) и tsvector с GIN-индексом из V0014.
+\timing on
+
+DROP SCHEMA IF EXISTS search_bench CASCADE;
+CREATE SCHEMA search_bench;
+
+CREATE TABLE search_bench.announcements (
+    id SERIAL PRIMARY KEY,
+    title VARCHAR(255) NOT NULL,
+    description TEXT NOT NULL,
+    category VARCHAR(100),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    payment_status VARCHAR(50) DEFAULT 'paid'
+);
+
+-- Тексты из словаря частых слов объявлений в разных словоформах
+WITH words AS (
+    SELECT ARRAY[
+        'помощь', 'помочь', 'нужна', 'ремонт', 'ремонта', 'квартиры', 'переезд', 'переезда',
+        'грузчики', 'репетитор', 'математике', 'английскому', 'лекарства', 'лекарств', 'врач',
+        'уборка', 'уборку', 'дачи', 'огород', 'машина', 'машину', 'довезти', 'больницу',
+        'собаку', 'выгул', 'компьютер', 'настройка', 'бабушке', 'пенсионеру', 'продукты',
+        'доставка', 'сантехника', 'электрика', 'покраска', 'забора', 'детям', 'школа'
+    ] AS w
+), categories AS (
+    SELECT ARRAY['Строительство', 'Образование', 'Быт', 'Здоровье', 'Транспорт', 'Разное'] AS c
+)
+INSERT INTO search_bench.announcements (title, description, category, created_at)
+SELECT
+    w[1 + (i * 7) % 37] || ' ' || w[1 + (i * 13) % 37] || ' ' || w[1 + (i * 31) % 37],
+    (SELECT string_agg(w[1 + ((i * 17 + k * 11) % 37)], ' ') FROM generate_series(1, 30) k),
+    c[1 + i % 6],
+    CURRENT_TIMESTAMP - (i || ' seconds')::interval
+FROM generate_series(1, 1000000) i, words, categories;
+
+ALTER TABLE search_bench.announcements ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(description, '')), 'B') ||
+        setweight(to_tsvector('russian', coalesce(category, '')), 'C')
+    ) STORED;
+
+ANALYZE search_bench.announcements;
+
+-- 1. Подстрока без индекса: полный проход таблицы, словоформы не совпадают
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT id FROM search_bench.announcements
+WHERE payment_status = 'paid'
+  AND (title ILIKE '%ремонт квартир%' OR description ILIKE '%ремонт квартир%')
+ORDER BY id DESC LIMIT 21;
+
+-- 2. tsvector без индекса
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT id, ts_rank_cd(search_vector, q)::float8 AS rank
+FROM search_bench.announcements, websearch_to_tsquery('russian', 'ремонт квартиры') q
+WHERE payment_status = 'paid' AND search_vector @@ q
+ORDER BY rank DESC, id DESC LIMIT 21;
+
+CREATE INDEX idx_bench_search ON search_bench.announcements USING GIN (search_vector);
+ANALYZE search_bench.announcements;
+
+-- 3. Тот же запрос, что в обработчике, по GIN-индексу: частый и редкий термы
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT id, ts_rank_cd(search_vector, q)::float8 AS rank
+FROM search_bench.announcements, websearch_to_tsquery('russian', 'ремонт квартиры') q
+WHERE payment_status = 'paid' AND search_vector @@ q
+ORDER BY rank DESC, id DESC LIMIT 21;
+
+EXPLAIN (ANALYZE, BUFFERS)
+SELECT id, ts_rank_cd(search_vector, q)::float8 AS rank
+FROM search_bench.announcements, websearch_to_tsquery('russian', 'сантехника забора -дачи') q
+WHERE payment_status = 'paid' AND search_vector @@ q
+ORDER BY rank DESC, id DESC LIMIT 21;
+
+SELECT pg_size_pretty(pg_relation_size('search_bench.idx_bench_search')) AS gin_index_size;
+
+DROP SCHEMA search_bench CASCADE;
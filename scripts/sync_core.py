@@ -0,0 +1,51 @@
+"""Скопировать общее ядро backend/core в папку каждой облачной функции.
+
+Функции деплоятся по отдельности и не видят соседние папки, поэтому каждая
+получает свою копию пакета core. Править нужно только backend/core, затем:
+
+    python scripts/sync_core.py          # обновить копии
+    python scripts/sync_core.py --check  # проверить, что копии не разошлись (для CI)
+"""
+import filecmp
+import shutil
+import sys
+from pathlib import Path
+
+BACKEND = Path(__file__).resolve().parent.parent / 'backend'
+CORE = BACKEND / 'core'
+
+def function_dirs() -> list:
+    return sorted(p for p in BACKEND.iterdir() if (p / 'index.py').exists())
+
+def core_files() -> list:
+    return sorted(p.name for p in CORE.glob('*.py'))
+
+def stale_copies() -> list:
+    stale = []
+    for function_dir in function_dirs():
+        target = function_dir / 'core'
+        copied = sorted(p.name for p in target.glob('*.py')) if target.exists() else []
+        if copied != core_files():
+            stale.append(target)
+            continue
+        for name in core_files():
+            if not filecmp.cmp(CORE / name, target / name, shallow=False):
+                stale.append(target)
+                break
+    return stale
+
+def sync():
+    for function_dir in function_dirs():
+        target = function_dir / 'core'
+        if target.exists():
+            shutil.rmtree(target)
+        shutil.copytree(CORE, target, ignore=shutil.ignore_patterns('__pycache__'))
+        print(f'{target.relative_to(BACKEND.parent)}: {len(core_files())} файлов')
+
+if __name__ == '__main__':
+    if '--check' in sys.argv:
+        stale = stale_copies()
+        for target in stale:
+            print(f'{target.relative_to(BACKEND.parent)} отличается от backend/core')
+        sys.exit(1 if stale else 0)
+    sync()
@@ -7,6 +7,9 @@ import Icon from '@/components/ui/icon';
 import { toast } from '@/hooks/use-toast';
 import { responsesApi, type Message } from '@/lib/api';
 
+const LONG_POLL_WAIT_SECONDS = 25;
+const RETRY_DELAY_MS = 3000;
+
 interface ChatDialogProps {
   open: boolean;
   onOpenChange: (open: boolean) => void;
@@ -20,35 +23,89 @@ export const ChatDialog = ({ open, onOpenChange, responseId, responderName, curr
   const [newMessage, setNewMessage] = useState('');
   const [loading, setLoading] = useState(false);
   const [sending, setSending] = useState(false);
+  const [hasEarlier, setHasEarlier] = useState(false);
+  const [loadingEarlier, setLoadingEarlier] = useState(false);
   const messagesEndRef = useRef<HTMLDivElement>(null);
+  const lastMessageIdRef = useRef(0);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' });
   };
 
-  const loadMessages = useCallback(async () => {
-    setLoading(true);
+  const appendMessages = useCallback((fresh: Message[]) => {
+    if (fresh.length === 0) return;
+    // Сервер отдаёт сообщения в порядке коммита, а не id: курсор — последнее в пачке
+    lastMessageIdRef.current = fresh[fresh.length - 1].id;
+    setMessages(prev => {
+      const known = new Set(prev.map(m => m.id));
+      return [...prev, ...fresh.filter(m => !known.has(m.id))];
+    });
+  }, []);
+
+  const loadNewMessages = useCallback(async () => {
+    const page = await responsesApi.getMessages(responseId, { since_id: lastMessageIdRef.current });
+    appendMessages(page.messages);
+  }, [responseId, appendMessages]);
+
+  const loadEarlierMessages = async () => {
+    if (messages.length === 0) return;
+    setLoadingEarlier(true);
     try {
-      const data = await responsesApi.getMessages(responseId);
-      setMessages(data);
+      const page = await responsesApi.getMessages(responseId, { before_id: messages[0].id });
+      setMessages(prev => [...page.messages, ...prev]);
+      setHasEarlier(page.has_more);
     } catch {
       // Error loading messages
     } finally {
-      setLoading(false);
+      setLoadingEarlier(false);
     }
-  }, [responseId]);
+  };
 
   useEffect(() => {
-    if (open && responseId) {
-      loadMessages();
-      const interval = setInterval(loadMessages, 3000);
-      return () => clearInterval(interval);
-    }
-  }, [open, responseId, loadMessages]);
+    if (!open || !responseId) return;
+
+    // Long-poll: сервер держит запрос, пока не появится новое сообщение
+    const controller = new AbortController();
+    lastMessageIdRef.current = 0;
+    setMessages([]);
+    setHasEarlier(false);
 
+    const poll = async () => {
+      setLoading(true);
+      try {
+        const page = await responsesApi.getMessages(responseId, { signal: controller.signal });
+        appendMessages(page.messages);
+        setHasEarlier(page.has_more);
+      } catch {
+        // Error loading messages
+      } finally {
+        setLoading(false);
+      }
+
+      while (!controller.signal.aborted) {
+        try {
+          const page = await responsesApi.getMessages(responseId, {
+            since_id: lastMessageIdRef.current,
+            wait: LONG_POLL_WAIT_SECONDS,
+            signal: controller.signal
+          });
+          appendMessages(page.messages);
+        } catch {
+          if (controller.signal.aborted) return;
+          await new Promise(resolve => setTimeout(resolve, RETRY_DELAY_MS));
+        }
+      }
+    };
+
+    poll();
+    return () => controller.abort();
+  }, [open, responseId, appendMessages]);
+
+  // Прокручиваем вниз только при новых сообщениях, а не при подгрузке ранних
+  const lastMessageId = messages.length > 0 ? messages[messages.length - 1].id : 0;
   useEffect(() => {
     scrollToBottom();
-  }, [messages]);
+  }, [lastMessageId]);
 
   const handleSend = async () => {
     if (!newMessage.trim()) return;
@@ -62,7 +119,7 @@ export const ChatDialog = ({ open, onOpenChange, responseId, responderName, curr
       });
 
       setNewMessage('');
-      await loadMessages();
+      await loadNewMessages();
     } catch (error) {
       toast({
         title: 'Ошибка',
@@ -92,6 +149,13 @@ export const ChatDialog = ({ open, onOpenChange, responseId, responderName, curr
         </DialogHeader>
         
         <div className="flex-1 overflow-y-auto space-y-3 py-4">
+          {hasEarlier && (
+            <div className="text-center">
+              <Button variant="ghost" size="sm" onClick={loadEarlierMessages} disabled={loadingEarlier}>
+                {loadingEarlier ? 'Загрузка...' : 'Показать более ранние'}
+              </Button>
+            </div>
+          )}
           {loading && messages.length === 0 ? (
             <div className="text-center text-muted-foreground">Загрузка сообщений...</div>
           ) : messages.length === 0 ? (
@@ -1,15 +1,27 @@
 import { Button } from '@/components/ui/button';
+import { Input } from '@/components/ui/input';
 import Icon from '@/components/ui/icon';
 
 interface FilterBarProps {
   selectedCategory: string;
   onCategoryChange: (category: string) => void;
   categories: Array<{ value: string; label: string; icon: string }>;
+  searchQuery: string;
+  onSearchChange: (query: string) => void;
 }
 
-export const FilterBar = ({ selectedCategory, onCategoryChange, categories }: FilterBarProps) => {
+export const FilterBar = ({ selectedCategory, onCategoryChange, categories, searchQuery, onSearchChange }: FilterBarProps) => {
   return (
     <div className="mb-6">
+      <div className="relative mb-4">
+        <Icon name="Search" size={18} className="absolute left-3 top-1/2 -translate-y-1/2 text-muted-foreground" />
+        <Input
+          value={searchQuery}
+          onChange={(e) => onSearchChange(e.target.value)}
+          placeholder="Поиск по объявлениям"
+          className="pl-10"
+        />
+      </div>
       <div className="flex items-center gap-2 mb-4">
         <Icon name="Filter" size={20} className="text-muted-foreground" />
         <h3 className="text-sm font-medium text-muted-foreground">Фильтр по категориям:</h3>
@@ -6,6 +6,9 @@ const API_URLS = {
   celebrities: 'https://functions.poehali.dev/c68b9bfa-7cd0-4dcf-bb6d-56adfb2ac06b'
 };
 
+// Максимальный размер страницы ленты на сервере (FEED_MAX_PAGE_SIZE)
+const FEED_MAX_PAGE_SIZE = 100;
+
 export interface Announcement {
   id: number;
   title: string;
@@ -18,6 +21,11 @@ export interface Announcement {
   views: number;
 }
 
+export interface AnnouncementPage {
+  announcements: Announcement[];
+  next_cursor: string | null;
+}
+
 export interface Response {
   id: number;
   responder_name: string;
@@ -26,6 +34,7 @@ export interface Response {
   created_at: string;
   status: string;
   message_count: number;
+  last_message_at: string | null;
 }
 
 export interface Message {
@@ -35,13 +44,45 @@ export interface Message {
   created_at: string;
 }
 
+export interface MessagePage {
+  messages: Message[];
+  has_more: boolean;
+}
+
 export const announcementsApi = {
-  async getAll(): Promise<Announcement[]> {
-    const response = await fetch(API_URLS.announcements);
+  async getPage(cursor?: string | null, limit?: number, q?: string, category?: string): Promise<AnnouncementPage> {
+    const params = new URLSearchParams();
+    if (q) params.set('q', q);
+    if (category) params.set('category', category);
+    if (cursor) params.set('cursor', cursor);
+    if (limit) params.set('limit', String(limit));
+    const query = params.toString();
+    const response = await fetch(query ? `${API_URLS.announcements}?${query}` : API_URLS.announcements);
     if (!response.ok) throw new Error('Failed to fetch announcements');
     return response.json();
   },
 
+  // Полный список: идём по next_cursor до конца, иначе админка и «Мои объявления» видят только первую страницу
+  async getAllPages(filters: { author?: string } = {}): Promise<Announcement[]> {
+    const result: Announcement[] = [];
+    let cursor: string | null = null;
+    do {
+      const params = new URLSearchParams({ limit: String(FEED_MAX_PAGE_SIZE) });
+      if (filters.author) params.set('author', filters.author);
+      if (cursor) params.set('cursor', cursor);
+      const response = await fetch(`${API_URLS.announcements}?${params}`);
+      if (!response.ok) throw new Error('Failed to fetch announcements');
+      const page: AnnouncementPage = await response.json();
+      result.push(...page.announcements);
+      cursor = page.next_cursor;
+    } while (cursor);
+    return result;
+  },
+
+  async getAll(): Promise<Announcement[]> {
+    return this.getAllPages();
+  },
+
   async trackView(id: number): Promise<void> {
     await fetch(`${API_URLS.announcements}?id=${id}&track_view=1`);
   },
@@ -70,9 +111,7 @@ export const announcementsApi = {
   },
 
   async getByAuthor(author: string): Promise<Announcement[]> {
-    const response = await fetch(`${API_URLS.announcements}?author=${encodeURIComponent(author)}`);
-    if (!response.ok) throw new Error('Failed to fetch announcements');
-    return response.json();
+    return this.getAllPages({ author });
   },
 
   async close(id: number): Promise<void> {
@@ -95,6 +134,18 @@ export const announcementsApi = {
   }
 };
 
+export class PaymentError extends Error {
+  // state === 'failed' без retryable: заказ по этому idempotency_key закрыт, повторять нужно с новым ключом
+  state?: string;
+  retryable?: boolean;
+
+  constructor(message: string, state?: string, retryable?: boolean) {
+    super(message);
+    this.state = state;
+    this.retryable = retryable;
+  }
+}
+
 export const paymentsApi = {
   async createPayment(data: {
     title: string;
@@ -103,6 +154,7 @@ export const paymentsApi = {
     author_name: string;
     author_contact: string;
     type: 'regular' | 'boosted' | 'vip';
+    idempotency_key?: string;
   }): Promise<{ 
     success: boolean; 
     announcement_id: number; 
@@ -120,7 +172,10 @@ export const paymentsApi = {
         ...data 
       })
     });
-    if (!response.ok) throw new Error('Failed to create payment');
+    if (!response.ok) {
+      const error = await response.json().catch(() => ({}));
+      throw new PaymentError(error.error || 'Failed to create payment', error.state, error.retryable);
+    }
     return response.json();
   },
 
@@ -185,8 +240,16 @@ export const responsesApi = {
     return response.json();
   },
 
-  async getMessages(response_id: number): Promise<Message[]> {
-    const response = await fetch(`${API_URLS.responses}?response_id=${response_id}`);
+  async getMessages(
+    response_id: number,
+    options: { since_id?: number; before_id?: number; wait?: number; signal?: AbortSignal } = {}
+  ): Promise<MessagePage> {
+    const { since_id, before_id, wait, signal } = options;
+    const params = new URLSearchParams({ response_id: String(response_id) });
+    if (since_id !== undefined) params.set('since_id', String(since_id));
+    if (before_id) params.set('before_id', String(before_id));
+    if (wait) params.set('wait', String(wait));
+    const response = await fetch(`${API_URLS.responses}?${params}`, { signal });
     if (!response.ok) throw new Error('Failed to fetch messages');
     return response.json();
   },
@@ -270,6 +333,11 @@ export interface CelebrityRequest {
   created_at: string;
 }
 
+export interface CelebritySuggestion {
+  name: string;
+  requests: number;
+}
+
 export const celebritiesApi = {
   async getAll(admin_code?: string): Promise<CelebrityRequest[]> {
     const url = admin_code
@@ -280,6 +348,13 @@ export const celebritiesApi = {
     return response.json();
   },
 
+  async suggest(query: string, signal?: AbortSignal): Promise<CelebritySuggestion[]> {
+    const response = await fetch(`${API_URLS.celebrities}?suggest=${encodeURIComponent(query)}`, { signal });
+    if (!response.ok) throw new Error('Failed to fetch celebrity suggestions');
+    const data: { suggestions: CelebritySuggestion[] } = await response.json();
+    return data.suggestions;
+  },
+
   async createRequest(data: {
     requester_name: string;
     requester_contact: string;
@@ -6,7 +6,7 @@ import { Textarea } from '@/components/ui/textarea';
 import { Badge } from '@/components/ui/badge';
 import Icon from '@/components/ui/icon';
 import { toast } from '@/hooks/use-toast';
-import { celebritiesApi, paymentsApi, type CelebrityRequest } from '@/lib/api';
+import { celebritiesApi, paymentsApi, type CelebrityRequest, type CelebritySuggestion } from '@/lib/api';
 import { useNavigate } from 'react-router-dom';
 import { CELEBRITIES, POPULAR_CELEBRITIES } from '@/data/celebrities';
 
@@ -18,6 +18,7 @@ const Celebrities = () => {
   const [qrCode, setQrCode] = useState('');
   const [paymentAmount, setPaymentAmount] = useState(0);
   const [searchQuery, setSearchQuery] = useState('');
+  const [suggestions, setSuggestions] = useState<CelebritySuggestion[]>([]);
   const [formData, setFormData] = useState({
     requester_name: '',
     requester_contact: '',
@@ -41,6 +42,25 @@ const Celebrities = () => {
     loadRequests();
   }, [loadRequests]);
 
+  // Подсказки с сервера: имена, к которым уже обращались, с числом обращений
+  useEffect(() => {
+    const query = searchQuery.trim();
+    if (query.length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(() => {
+      celebritiesApi.suggest(query, controller.signal)
+        .then(setSuggestions)
+        .catch(() => {});
+    }, 200);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [searchQuery]);
+
   useEffect(() => {
     if (!showForm) return;
     const amount = paymentAmount || 60;
@@ -87,8 +107,14 @@ const Celebrities = () => {
     }
   };
 
+  const requestCounts = new Map(suggestions.map(s => [s.name, s.requests]));
   const filteredCelebrities = searchQuery
-    ? CELEBRITIES.filter(name => name.toLowerCase().includes(searchQuery.toLowerCase()))
+    ? [
+        ...suggestions.map(s => s.name),
+        ...CELEBRITIES.filter(name =>
+          !requestCounts.has(name) && name.toLowerCase().includes(searchQuery.toLowerCase())
+        )
+      ]
     : [];
 
   const getStatusBadge = (status: string) => {
@@ -196,6 +222,11 @@ const Celebrities = () => {
                           }}
                         >
                           {name}
+                          {requestCounts.has(name) && (
+                            <span className="ml-auto text-xs text-muted-foreground">
+                              обращений: {requestCounts.get(name)}
+                            </span>
+                          )}
                         </Button>
                       ))}
                     </CardContent>
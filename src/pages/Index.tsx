@@ -1,9 +1,9 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { Button } from '@/components/ui/button';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
 import Icon from '@/components/ui/icon';
 import { toast } from '@/hooks/use-toast';
-import { announcementsApi, paymentsApi, type Announcement } from '@/lib/api';
+import { announcementsApi, paymentsApi, PaymentError, type Announcement } from '@/lib/api';
 import { ResponseDialog } from '@/components/ResponseDialog';
 import { ResponsesDialog } from '@/components/ResponsesDialog';
 import { Header } from '@/components/index/Header';
@@ -27,9 +27,15 @@ const CATEGORIES = [
 
 const Index = () => {
   const [announcements, setAnnouncements] = useState<Announcement[]>([]);
+  const [myAnnouncements, setMyAnnouncements] = useState<Announcement[]>([]);
   const [loading, setLoading] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [activeTab, setActiveTab] = useState('all');
   const [selectedCategory, setSelectedCategory] = useState('all');
+  const [searchQuery, setSearchQuery] = useState('');
+  // Номер последнего запроса ленты: ответы на устаревшие поисковые запросы отбрасываются
+  const feedRequestRef = useRef(0);
   const [newAnnouncement, setNewAnnouncement] = useState({
     title: '',
     description: '',
@@ -37,6 +43,8 @@ const Index = () => {
     author_contact: '',
     type: 'regular' as 'regular' | 'boosted' | 'vip'
   });
+  // Ключ идемпотентности одной отправки формы: повтор не создаст дубль объявления
+  const [idempotencyKey, setIdempotencyKey] = useState(() => crypto.randomUUID());
   const [responseDialog, setResponseDialog] = useState<{ open: boolean; announcementId: number; title: string }>({
     open: false,
     announcementId: 0,
@@ -55,11 +63,15 @@ const Index = () => {
     qrCode: ''
   });
 
-  const loadAnnouncements = useCallback(async () => {
-    setLoading(true);
+  const loadAnnouncements = useCallback(async (query = '', category = 'all') => {
+    const requestId = ++feedRequestRef.current;
+    // Индикатор на весь экран только без поиска, чтобы поле ввода не пропадало
+    if (!query) setLoading(true);
     try {
-      const data = await announcementsApi.getAll();
-      setAnnouncements(data);
+      const page = await announcementsApi.getPage(null, undefined, query, category === 'all' ? undefined : category);
+      if (requestId !== feedRequestRef.current) return;
+      setAnnouncements(page.announcements);
+      setNextCursor(page.next_cursor);
     } catch {
       // Error loading announcements
     } finally {
@@ -67,10 +79,48 @@ const Index = () => {
     }
   }, []);
 
+  const loadMoreAnnouncements = async () => {
+    if (!nextCursor) return;
+    const requestId = feedRequestRef.current;
+    setLoadingMore(true);
+    try {
+      const page = await announcementsApi.getPage(
+        nextCursor, undefined, searchQuery.trim(), selectedCategory === 'all' ? undefined : selectedCategory
+      );
+      if (requestId !== feedRequestRef.current) return;
+      setAnnouncements(prev => [...prev, ...page.announcements]);
+      setNextCursor(page.next_cursor);
+    } catch {
+      // Error loading announcements
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  // Свои объявления грузим целиком отдельно: в ленте может быть только первая страница
+  const loadMyAnnouncements = useCallback(async () => {
+    try {
+      setMyAnnouncements(await announcementsApi.getByAuthor(CURRENT_USER));
+    } catch {
+      // Error loading announcements
+    }
+  }, []);
+
+  useEffect(() => {
+    if (activeTab === 'my') loadMyAnnouncements();
+  }, [activeTab, loadMyAnnouncements]);
+
   useEffect(() => {
-    loadAnnouncements();
     announcementsApi.trackVisit();
-  }, [loadAnnouncements]);
+  }, []);
+
+  useEffect(() => {
+    const query = searchQuery.trim();
+    // Смена поиска или категории — лента заново с первой страницы
+    setNextCursor(null);
+    const timer = setTimeout(() => loadAnnouncements(query, selectedCategory), query ? 300 : 0);
+    return () => clearTimeout(timer);
+  }, [searchQuery, selectedCategory, loadAnnouncements]);
 
   const handleCreate = async () => {
     if (!newAnnouncement.title || !newAnnouncement.description) {
@@ -89,7 +139,8 @@ const Index = () => {
         category: newAnnouncement.category || 'Разное',
         author_name: CURRENT_USER,
         author_contact: newAnnouncement.author_contact,
-        type: newAnnouncement.type
+        type: newAnnouncement.type,
+        idempotency_key: idempotencyKey
       });
 
       setPaymentDialog({
@@ -100,12 +151,16 @@ const Index = () => {
       });
       
       setNewAnnouncement({ title: '', description: '', category: '', author_contact: '', type: 'regular' });
+      setIdempotencyKey(crypto.randomUUID());
       setActiveTab('all');
-      await loadAnnouncements();
+      await loadAnnouncements(searchQuery.trim(), selectedCategory);
     } catch (error) {
+      if (error instanceof PaymentError && error.state === 'failed' && !error.retryable) {
+        setIdempotencyKey(crypto.randomUUID());
+      }
       toast({
         title: 'Ошибка',
-        description: 'Не удалось создать объявление',
+        description: error instanceof PaymentError && error.state ? error.message : 'Не удалось создать объявление',
         variant: 'destructive'
       });
     }
@@ -150,10 +205,6 @@ const Index = () => {
     announcementsApi.trackView(id);
   };
 
-  const filteredAnnouncements = selectedCategory === 'all' 
-    ? announcements 
-    : announcements.filter(a => a.category === selectedCategory);
-
   return (
     <div className="min-h-screen bg-gradient-to-br from-secondary/30 via-background to-accent/20">
       <Header onCreateClick={() => setActiveTab('create')} />
@@ -181,7 +232,7 @@ const Index = () => {
                 <div className="animate-spin rounded-full h-12 w-12 border-b-2 border-primary mx-auto"></div>
                 <p className="text-muted-foreground mt-4">Загрузка объявлений...</p>
               </div>
-            ) : announcements.length === 0 ? (
+            ) : announcements.length === 0 && !searchQuery && selectedCategory === 'all' ? (
               <div className="max-w-2xl mx-auto">
                 <div className="text-center py-12">
                   <div className="bg-primary/10 rounded-full w-24 h-24 flex items-center justify-center mx-auto mb-6">
@@ -204,12 +255,18 @@ const Index = () => {
                   selectedCategory={selectedCategory}
                   onCategoryChange={setSelectedCategory}
                   categories={CATEGORIES}
+                  searchQuery={searchQuery}
+                  onSearchChange={setSearchQuery}
                 />
                 
-                {filteredAnnouncements.length === 0 ? (
+                {announcements.length === 0 ? (
                   <div className="text-center py-12">
                     <Icon name="SearchX" size={48} className="mx-auto text-muted-foreground mb-4" />
-                    <p className="text-muted-foreground mb-2">В категории «{CATEGORIES.find(c => c.value === selectedCategory)?.label}» нет объявлений</p>
+                    <p className="text-muted-foreground mb-2">
+                      {searchQuery
+                        ? `По запросу «${searchQuery.trim()}» ничего не найдено`
+                        : `В категории «${CATEGORIES.find(c => c.value === selectedCategory)?.label}» нет объявлений`}
+                    </p>
                     <Button 
                       variant="outline" 
                       onClick={() => setSelectedCategory('all')}
@@ -221,7 +278,7 @@ const Index = () => {
                   </div>
                 ) : (
                   <div className="grid gap-4 md:grid-cols-2 lg:grid-cols-3">
-                    {filteredAnnouncements.map((item) => (
+                    {announcements.map((item) => (
                       <AnnouncementCard
                         key={item.id}
                         announcement={item}
@@ -235,6 +292,19 @@ const Index = () => {
                     ))}
                   </div>
                 )}
+
+                {nextCursor && (
+                  <div className="text-center mt-8">
+                    <Button 
+                      variant="outline" 
+                      onClick={loadMoreAnnouncements}
+                      disabled={loadingMore}
+                    >
+                      <Icon name="ChevronDown" className="mr-2" size={16} />
+                      {loadingMore ? 'Загрузка...' : 'Показать ещё'}
+                    </Button>
+                  </div>
+                )}
               </div>
             )}
           </TabsContent>
@@ -244,7 +314,7 @@ const Index = () => {
               <div className="text-center py-12">
                 <div className="animate-spin rounded-full h-12 w-12 border-b-2 border-primary mx-auto"></div>
               </div>
-            ) : announcements.filter(a => a.author === CURRENT_USER).length === 0 ? (
+            ) : myAnnouncements.length === 0 ? (
               <div className="text-center py-12">
                 <Icon name="FileText" size={48} className="mx-auto text-muted-foreground mb-4" />
                 <p className="text-lg font-medium mb-2">У вас пока нет объявлений</p>
@@ -256,7 +326,7 @@ const Index = () => {
               </div>
             ) : (
               <div className="grid gap-4 md:grid-cols-2 lg:grid-cols-3">
-                {announcements.filter(a => a.author === CURRENT_USER).map((item) => (
+                {myAnnouncements.map((item) => (
                   <AnnouncementCard
                     key={item.id}
                     announcement={item}
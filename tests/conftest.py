@@ -0,0 +1,76 @@
+"""Общие фикстуры тестов обработчиков.
+
+Тесты с БД идут против отдельной схемы с накатанными db_migrations и
+пропускаются, если не задан DATABASE_URL (только на отдельной базе).
+
+    DATABASE_URL=postgresql://localhost/test python -m pytest tests
+"""
+import os
+import sys
+import uuid
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND = ROOT / 'backend'
+MIGRATIONS = ROOT / 'db_migrations'
+# Схема прода зашита в первых миграциях, остальные полагаются на search_path
+MIGRATION_SCHEMA = 't_p34278592_help_request_platfor'
+
+def load_function(name: str):
+    """Импортировать index.py функции со своей копией core.
+
+    У всех функций одинаковые имена модулей (index, core, ...), поэтому после
+    импорта они убираются из sys.modules: загруженный модуль держит ссылки сам.
+    """
+    function_dir = BACKEND / name
+    local = {p.stem for p in function_dir.glob('*.py')} | {'core'}
+
+    def purge():
+        for module in list(sys.modules):
+            if module.split('.')[0] in local:
+                del sys.modules[module]
+
+    purge()
+    sys.path.insert(0, str(function_dir))
+    try:
+        return __import__('index')
+    finally:
+        sys.path.remove(str(function_dir))
+        purge()
+
+@pytest.fixture
+def db_schema(monkeypatch):
+    """Свежая схема с миграциями; обработчики видят её через MAIN_DB_SCHEMA и search_path"""
+    if not os.environ.get('DATABASE_URL'):
+        pytest.skip('DATABASE_URL не задан')
+    psycopg2 = pytest.importorskip('psycopg2')
+
+    schema = f'test_{uuid.uuid4().hex[:8]}'
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"CREATE SCHEMA {schema}")
+            cur.execute(f"SET search_path TO {schema}, public")
+            for path in sorted(MIGRATIONS.glob('V*.sql')):
+                cur.execute(path.read_text().replace(f'{MIGRATION_SCHEMA}.', f'{schema}.'))
+        conn.commit()
+
+        monkeypatch.setenv('MAIN_DB_SCHEMA', schema)
+        monkeypatch.setenv('PGOPTIONS', f'-c search_path={schema},public')
+        yield schema
+    finally:
+        conn.rollback()
+        with conn.cursor() as cur:
+            cur.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        conn.commit()
+        conn.close()
+
+@pytest.fixture
+def db_conn(db_schema):
+    """Отдельное соединение теста для подготовки данных и проверок"""
+    import psycopg2
+    conn = psycopg2.connect(os.environ['DATABASE_URL'], options=f'-c search_path={db_schema},public')
+    yield conn
+    conn.close()
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import load_function
+
+THREADS = 8
+VIEWS_PER_THREAD = 50
+
+def create_announcement(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO announcements (title, description, author_name, type, payment_status, payment_amount)
+            VALUES ('Просмотры', 'Тест', 'Автор', 'regular', 'paid', 0)
+            RETURNING id
+        """)
+        announcement_id = cur.fetchone()[0]
+    conn.commit()
+    return announcement_id
+
+def views_of(conn, announcement_id: int) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT views FROM announcements WHERE id = %s", (announcement_id,))
+        views = cur.fetchone()[0]
+    conn.commit()
+    return views
+
+def test_concurrent_views_are_counted_exactly_once(db_conn):
+    index = load_function('announcements')
+    announcement_id = create_announcement(db_conn)
+    view_event = {'httpMethod': 'GET', 'queryStringParameters': {'id': str(announcement_id), 'track_view': '1'}}
+
+    def track(_):
+        for i in range(VIEWS_PER_THREAD):
+            assert index.handler(view_event, None)['statusCode'] == 200
+            # Таймер сворачивает журнал параллельно с новыми просмотрами
+            if i % 10 == 0:
+                assert index.handler({}, None)['statusCode'] == 200
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        list(pool.map(track, range(THREADS)))
+    index.handler({}, None)
+
+    assert views_of(db_conn, announcement_id) == THREADS * VIEWS_PER_THREAD
+    with db_conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM announcement_view_deltas")
+        assert cur.fetchone()[0] == 0
+
+def test_views_survive_container_recycle(db_conn):
+    announcement_id = create_announcement(db_conn)
+    view_event = {'httpMethod': 'GET', 'queryStringParameters': {'id': str(announcement_id), 'track_view': '1'}}
+
+    # Контейнер принял просмотры и был выгружен до таймера; сворачивает уже новый
+    recycled = load_function('announcements')
+    for _ in range(3):
+        recycled.handler(view_event, None)
+    del recycled
+
+    load_function('announcements').handler({}, None)
+    assert views_of(db_conn, announcement_id) == 3
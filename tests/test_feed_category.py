@@ -0,0 +1,31 @@
+import json
+
+from conftest import load_function
+
+def get_feed(index, **params) -> dict:
+    return index.handler({'httpMethod': 'GET', 'queryStringParameters': params}, None)
+
+def test_category_found_past_first_page(db_conn):
+    index = load_function('announcements')
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO announcements (title, description, category, author_name, type, payment_status,
+                                       payment_amount, created_at)
+            SELECT 'Объявление ' || n, 'Тест', CASE WHEN n <= 3 THEN 'Животные' ELSE 'Разное' END,
+                   'Автор', 'regular', 'paid', 0, CURRENT_TIMESTAMP - make_interval(days => 30 - n)
+            FROM generate_series(1, 30) n
+        """)
+    db_conn.commit()
+
+    first_page = json.loads(get_feed(index)['body'])
+    assert all(a['category'] == 'Разное' for a in first_page['announcements'])
+
+    response = get_feed(index, category='Животные', limit='2')
+    page = json.loads(response['body'])
+    assert [a['title'] for a in page['announcements']] == ['Объявление 3', 'Объявление 2']
+    assert page['next_cursor']
+    assert response['headers']['ETag'] != get_feed(index, limit='2')['headers']['ETag']
+
+    rest = json.loads(get_feed(index, category='Животные', limit='2', cursor=page['next_cursor'])['body'])
+    assert [a['title'] for a in rest['announcements']] == ['Объявление 1']
+    assert rest['next_cursor'] is None
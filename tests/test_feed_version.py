@@ -0,0 +1,108 @@
+import base64
+import gzip
+import json
+
+import psycopg2.extras
+
+from conftest import load_function
+
+def list_version(conn) -> int:
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM list_versions WHERE name = 'announcements'")
+        version = cur.fetchone()[0]
+    conn.commit()
+    return version
+
+def test_idle_archive_run_keeps_feed_version(db_conn, db_schema):
+    index = load_function('announcements')
+    version = list_version(db_conn)
+
+    with db_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        result = index.archive_announcements(db_conn, cur, db_schema)
+
+    assert (result['demoted'], result['archived']) == (0, 0)
+    assert list_version(db_conn) == version
+
+def feed_etag(index) -> str:
+    return index.handler({'httpMethod': 'GET', 'queryStringParameters': {}}, None)['headers']['ETag']
+
+def test_views_do_not_change_feed_version(db_conn):
+    index = load_function('announcements')
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO announcements (title, description, author_name, type, payment_status, payment_amount)
+            VALUES ('Лента', 'Тест', 'Автор', 'regular', 'paid', 0)
+            RETURNING id
+        """)
+        announcement_id = cur.fetchone()[0]
+    db_conn.commit()
+    version, etag = list_version(db_conn), feed_etag(index)
+
+    for _ in range(5):
+        index.handler({'httpMethod': 'GET',
+                       'queryStringParameters': {'id': str(announcement_id), 'track_view': '1'}}, None)
+    index.handler({}, None)
+
+    assert list_version(db_conn) == version
+    assert feed_etag(index) == etag
+    # Снимок пересобран таймером под той же версией: счётчик в ленте уже новый
+    with db_conn.cursor() as cur:
+        cur.execute("SELECT body FROM feed_snapshots WHERE page_key = ''")
+        assert json.loads(cur.fetchone()[0])['announcements'][0]['views'] == 5
+    db_conn.commit()
+
+    with db_conn.cursor() as cur:
+        cur.execute("UPDATE announcements SET title = 'Лента 2' WHERE id = %s", (announcement_id,))
+    db_conn.commit()
+    assert list_version(db_conn) == version + 1
+    assert feed_etag(index) != etag
+
+def test_idle_timer_keeps_feed_version(db_conn):
+    index = load_function('announcements')
+    version = list_version(db_conn)
+
+    index.handler({}, None)
+
+    assert list_version(db_conn) == version
+
+def test_feed_revalidates_after_own_write(db_conn):
+    index = load_function('announcements')
+    response = index.handler({'httpMethod': 'GET', 'queryStringParameters': {}}, None)
+    etag = response['headers']['ETag']
+    assert response['headers']['Cache-Control'] == 'no-cache'
+
+    revalidate = {'httpMethod': 'GET', 'queryStringParameters': {}, 'headers': {'If-None-Match': etag}}
+    assert index.handler(revalidate, None)['statusCode'] == 304
+
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO announcements (title, description, author_name, type, payment_status, payment_amount)
+            VALUES ('Своё', 'Тест', 'Автор', 'regular', 'paid', 0)
+        """)
+    db_conn.commit()
+    assert index.handler(revalidate, None)['statusCode'] == 200
+
+def test_browser_gets_stored_gzip_identical_to_live_body(db_conn, db_schema):
+    index = load_function('announcements')
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO announcements (title, description, author_name, type, payment_status, payment_amount)
+            SELECT 'Объявление ' || n, repeat('Нужна помощь. ', 20), 'Автор', 'regular', 'paid', 0
+            FROM generate_series(1, 25) n
+        """)
+    db_conn.commit()
+
+    response = index.handler({'httpMethod': 'GET', 'queryStringParameters': {},
+                              'headers': {'Accept-Encoding': 'gzip, deflate, br'}}, None)
+
+    assert response['headers']['Content-Encoding'] == 'gzip'
+    with db_conn.cursor() as cur:
+        cur.execute("SELECT body_gzip FROM feed_snapshots WHERE page_key = ''")
+        stored = bytes(cur.fetchone()[0])
+    db_conn.commit()
+    assert base64.b64decode(response['body']) == stored
+
+    with db_conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        live, next_cursor = index.fetch_feed_page(cur, db_schema, index.FEED_PAGE_SIZE)
+    db_conn.commit()
+    assert gzip.decompress(stored).decode() == index.dumps({'announcements': live, 'next_cursor': next_cursor})
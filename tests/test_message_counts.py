@@ -0,0 +1,72 @@
+import json
+import threading
+import time
+
+from conftest import load_function
+
+def check_counts(index, **params) -> dict:
+    return index.handler({'httpMethod': 'POST', 'body': json.dumps({
+        'action': 'check_message_counts', 'admin_code': 'HELP2025', **params
+    })}, None)
+
+def wait_for_lock_wait(conn, timeout: float = 5):
+    """Дождаться, пока другой сеанс встанет в ожидание блокировки строки"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        with conn.cursor() as cur:
+            cur.execute("SELECT EXISTS (SELECT 1 FROM pg_stat_activity WHERE wait_event_type = 'Lock')")
+            waiting = cur.fetchone()[0]
+        # pg_stat_activity снимается один раз на транзакцию
+        conn.rollback()
+        if waiting:
+            return
+        time.sleep(0.05)
+    raise AssertionError('сверка не дошла до блокировки')
+
+def test_repair_keeps_concurrent_increment(db_conn, db_schema):
+    import psycopg2
+    index = load_function('responses')
+    # Счётчик уже разошёлся с messages: сверка будет его переписывать
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO responses (announcement_id, responder_name, responder_contact, message, message_count)
+            VALUES (1, 'Волонтёр', 'v@example.com', 'Готов помочь', 5)
+            RETURNING id
+        """)
+        response_id = cur.fetchone()[0]
+    db_conn.commit()
+
+    # Отправка сообщения, как в send_message, но с коммитом по команде теста
+    sender = psycopg2.connect(db_conn.dsn)
+    with sender.cursor() as cur:
+        cur.execute("""
+            UPDATE responses SET message_count = message_count + 1, last_message_seq = last_message_seq + 1
+            WHERE id = %s
+            RETURNING last_message_seq
+        """, (response_id,))
+        cur.execute("INSERT INTO messages (response_id, sender_name, message, seq) VALUES (%s, 'Автор', 'Привет', %s)",
+                    (response_id, cur.fetchone()[0]))
+
+    result = {}
+    repair = threading.Thread(target=lambda: result.update(check_counts(index)))
+    repair.start()
+    try:
+        wait_for_lock_wait(db_conn)
+    finally:
+        sender.commit()
+        sender.close()
+    repair.join()
+
+    assert result['statusCode'] == 200
+    with db_conn.cursor() as cur:
+        cur.execute("SELECT message_count FROM responses WHERE id = %s", (response_id,))
+        assert cur.fetchone()[0] == 1
+
+def test_bad_batch_params_are_rejected(db_schema):
+    index = load_function('responses')
+
+    assert check_counts(index, after_id='abc')['statusCode'] == 400
+    assert check_counts(index, batch_size='many')['statusCode'] == 400
+    response = check_counts(index, batch_size=-5)
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['checked'] == 0
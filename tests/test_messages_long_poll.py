@@ -0,0 +1,93 @@
+import json
+import threading
+import time
+
+from conftest import load_function
+
+WAIT = 3
+
+def create_response(index) -> int:
+    response = index.handler({'httpMethod': 'POST', 'body': json.dumps({
+        'action': 'create_response', 'announcement_id': 1,
+        'responder_name': 'Волонтёр', 'responder_contact': 'v@example.com', 'message': 'Готов помочь'
+    })}, None)
+    return json.loads(response['body'])['response_id']
+
+def poll(index, response_id: int, since_id: int = 0) -> dict:
+    return index.handler({'httpMethod': 'GET', 'queryStringParameters': {
+        'response_id': str(response_id), 'since_id': str(since_id), 'wait': str(WAIT)
+    }}, None)
+
+def test_empty_conversation_waits_for_first_message(db_schema):
+    index = load_function('responses')
+    response_id = create_response(index)
+
+    def send():
+        time.sleep(0.5)
+        index.handler({'httpMethod': 'POST', 'body': json.dumps({
+            'action': 'send_message', 'response_id': response_id, 'sender_name': 'Автор', 'message': 'Первое'
+        })}, None)
+
+    sender = threading.Thread(target=send)
+    started = time.monotonic()
+    sender.start()
+    response = poll(index, response_id)
+    elapsed = time.monotonic() - started
+    sender.join()
+
+    assert response['statusCode'] == 200
+    assert [m['message'] for m in json.loads(response['body'])['messages']] == ['Первое']
+    # Ответ пришёл по NOTIFY, а не после пустой выборки или по истечении wait
+    assert 0.4 < elapsed < WAIT
+
+def test_empty_conversation_returns_empty_after_wait(db_schema):
+    index = load_function('responses')
+    response_id = create_response(index)
+
+    started = time.monotonic()
+    response = poll(index, response_id)
+
+    assert json.loads(response['body'])['messages'] == []
+    assert time.monotonic() - started >= WAIT - 0.1
+
+def send(index, response_id: int, text: str) -> dict:
+    return index.handler({'httpMethod': 'POST', 'body': json.dumps({
+        'action': 'send_message', 'response_id': response_id, 'sender_name': 'Автор', 'message': text
+    })}, None)
+
+def test_message_committed_after_higher_id_is_delivered(db_conn):
+    index = load_function('responses')
+    response_id = create_response(index)
+
+    # Медленная отправка: id взят раньше, а коммит случится после следующего сообщения
+    with db_conn.cursor() as cur:
+        cur.execute("SELECT nextval(pg_get_serial_sequence('messages', 'id'))")
+        slow_id = cur.fetchone()[0]
+    db_conn.commit()
+
+    send(index, response_id, 'Быстрое')
+    first = json.loads(index.handler({'httpMethod': 'GET', 'queryStringParameters': {
+        'response_id': str(response_id), 'since_id': '0'
+    }}, None)['body'])['messages']
+    assert [m['message'] for m in first] == ['Быстрое']
+    assert first[0]['id'] > slow_id
+
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            UPDATE responses SET message_count = message_count + 1, last_message_seq = last_message_seq + 1
+            WHERE id = %s
+            RETURNING last_message_seq
+        """, (response_id,))
+        cur.execute("""
+            INSERT INTO messages (id, response_id, sender_name, message, seq)
+            VALUES (%s, %s, 'Автор', 'Медленное', %s)
+        """, (slow_id, response_id, cur.fetchone()[0]))
+    db_conn.commit()
+
+    later = json.loads(poll(index, response_id, first[0]['id'])['body'])['messages']
+    assert [(m['id'], m['message']) for m in later] == [(slow_id, 'Медленное')]
+
+def test_send_to_missing_response_is_rejected(db_schema):
+    index = load_function('responses')
+
+    assert send(index, 999, 'Куда?')['statusCode'] == 404
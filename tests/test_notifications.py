@@ -0,0 +1,104 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import load_function
+
+class FakeTelegram(BaseHTTPRequestHandler):
+    """sendMessage, отвечающий по тексту сообщения: 'ok', 'bad', 'blocked', 'limited', 'flaky' (500, затем 200)"""
+
+    received = []
+
+    def do_POST(self):
+        text = json.loads(self.rfile.read(int(self.headers['Content-Length'])))['text']
+        self.received.append(text)
+        if text == 'bad':
+            self.reply(400, {'ok': False, 'description': 'Bad Request: can\'t parse entities'})
+        elif text == 'blocked':
+            self.reply(403, {'ok': False, 'description': 'Forbidden: bot was blocked by the user'})
+        elif text == 'limited':
+            self.reply(429, {'ok': False, 'parameters': {'retry_after': 7}})
+        elif text == 'flaky' and self.received.count('flaky') == 1:
+            self.reply(500, {'ok': False, 'description': 'Internal Server Error'})
+        else:
+            self.reply(200, {'ok': True})
+
+    def reply(self, status: int, body: dict):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def notifications(monkeypatch):
+    pytest.importorskip('requests')
+    FakeTelegram.received = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeTelegram)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('TELEGRAM_API_URL', f'http://127.0.0.1:{server.server_port}')
+    monkeypatch.setenv('TELEGRAM_MIN_INTERVAL', '0')
+    monkeypatch.setenv('TELEGRAM_BOT_TOKEN', 'token')
+    monkeypatch.setenv('TELEGRAM_ADMIN_CHAT_ID', '1')
+    yield load_function('notifications')
+    server.shutdown()
+    server.server_close()
+
+def test_send_telegram_classifies_errors(notifications):
+    assert notifications.send_telegram('ok') == (True, None, None, False)
+    assert notifications.send_telegram('limited')[:2] == (False, 7.0)
+    ok, retry_after, _, retryable = notifications.send_telegram('flaky')
+    assert (ok, retry_after, retryable) == (False, None, True)
+    for text in ('bad', 'blocked'):
+        ok, retry_after, error, retryable = notifications.send_telegram(text)
+        assert (ok, retry_after, retryable) == (False, None, False)
+        assert error.startswith('HTTP 4')
+
+def outbox(conn) -> dict:
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT message, attempts, sent_at IS NOT NULL, failed_at IS NOT NULL,
+                   EXTRACT(EPOCH FROM next_attempt_at - CURRENT_TIMESTAMP)
+            FROM notification_outbox
+        """)
+        rows = {row[0]: row[1:] for row in cur.fetchall()}
+    conn.commit()
+    return rows
+
+def test_drain_retries_backs_off_and_drops_client_errors(notifications, db_conn):
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO notification_outbox (message)
+            VALUES ('ok'), ('bad'), ('blocked'), ('flaky'), ('limited'), ('after_limit')
+        """)
+    db_conn.commit()
+
+    result = json.loads(notifications.handler({}, None)['body'])
+    assert result == {'success': True, 'sent': 1, 'retried': 1, 'failed': 2, 'rate_limited': True}
+
+    rows = outbox(db_conn)
+    assert rows['ok'][:3] == (1, True, False)
+    # 400 и 403 — сразу в мёртвые, без ретраев
+    assert rows['bad'][:3] == (1, False, True)
+    assert rows['blocked'][:3] == (1, False, True)
+    # 5xx — повтор с экспоненциальной задержкой retry_delay(1): от 1 до 2 секунд
+    assert rows['flaky'][:3] == (1, False, False)
+    assert 0 < rows['flaky'][3] <= 2
+    # 429 — пауза retry_after для этой и оставшихся записей, попытка не засчитывается
+    for message in ('limited', 'after_limit'):
+        assert rows[message][:3] == (0, False, False)
+        assert 6 < rows[message][3] <= 7
+
+    with db_conn.cursor() as cur:
+        cur.execute("UPDATE notification_outbox SET next_attempt_at = CURRENT_TIMESTAMP WHERE message = 'flaky'")
+    db_conn.commit()
+    result = json.loads(notifications.handler({}, None)['body'])
+    assert result['sent'] == 1
+    assert outbox(db_conn)['flaky'][:3] == (2, True, False)
+    assert FakeTelegram.received.count('bad') == 1
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conftest import load_function
+
+class FakeTinkoff(BaseHTTPRequestHandler):
+    """API Тинькофф: ответы на метод берутся по очереди из responses[метод], последний повторяется"""
+
+    # HTTP/1.1: соединения клиента живут между запросами, как у банка
+    protocol_version = 'HTTP/1.1'
+    responses = {}
+    received = []
+    connections = set()
+    delay = 0
+
+    def do_POST(self):
+        method = self.path.rsplit('/', 1)[-1]
+        payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        self.received.append((method, payload))
+        self.connections.add(self.client_address)
+        time.sleep(self.delay)
+        queue = self.responses[method]
+        body = queue.pop(0) if len(queue) > 1 else queue[0]
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def payments(monkeypatch, db_schema):
+    FakeTinkoff.received = []
+    FakeTinkoff.connections = set()
+    FakeTinkoff.delay = 0
+    FakeTinkoff.responses = {
+        'Init': [{'Success': True, 'PaymentId': 1001, 'PaymentURL': 'https://pay.example/1001'}],
+        'GetQr': [{'Success': True, 'Data': 'https://qr.nspk.ru/1001'}],
+    }
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeTinkoff)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('TINKOFF_API_URL', f'http://127.0.0.1:{server.server_port}')
+    yield load_function('payments')
+    server.shutdown()
+    server.server_close()
+
+def create_payment(index, key: str) -> dict:
+    response = index.handler({'httpMethod': 'POST', 'body': json.dumps({
+        'action': 'create_payment', 'title': 'Нужна помощь', 'description': 'Тест',
+        'author_name': 'Автор', 'type': 'regular', 'idempotency_key': key
+    })}, None)
+    return {'status': response['statusCode'], **json.loads(response['body'])}
+
+def test_failed_init_is_retried_with_fresh_order_id(payments, db_conn):
+    FakeTinkoff.responses['Init'].insert(0, {'Success': False, 'Message': 'Неверные параметры'})
+
+    first = create_payment(payments, 'key-1')
+    assert first['status'] == 409
+    assert first['state'] == 'failed' and first['retryable'] is True
+    assert 'Неверные параметры' in first['error']
+
+    second = create_payment(payments, 'key-1')
+    assert second['status'] == 200
+    assert second['announcement_id'] == first.get('announcement_id', second['announcement_id'])
+
+    order_ids = [payload['OrderId'] for method, payload in FakeTinkoff.received if method == 'Init']
+    assert len(order_ids) == 2 and order_ids[0] != order_ids[1]
+    with db_conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*), MIN(payment_status) FROM announcements")
+        assert cur.fetchone() == (1, 'pending')
+        cur.execute("SELECT order_id, state, payment_id FROM payments")
+        assert cur.fetchall() == [(order_ids[1], 'qr_issued', '1001')]
+
+def test_payment_failed_at_bank_is_not_reopened(payments, db_conn):
+    assert create_payment(payments, 'key-2')['status'] == 200
+    with db_conn.cursor() as cur:
+        cur.execute("UPDATE payments SET state = 'failed', error = 'expired'")
+        cur.execute("UPDATE announcements SET payment_status = 'failed'")
+    db_conn.commit()
+
+    retry = create_payment(payments, 'key-2')
+    assert retry['status'] == 409
+    assert retry['state'] == 'failed' and retry['retryable'] is False
+    assert [method for method, _ in FakeTinkoff.received].count('Init') == 1
+
+def test_payment_lock_is_released_after_error_inside(payments, db_conn):
+    psycopg2 = pytest.importorskip('psycopg2')
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    try:
+        with pytest.raises(psycopg2.errors.DivisionByZero):
+            with payments.payment_lock(conn, 'ann_1_1') as acquired:
+                assert acquired
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1 / 0")
+
+        # Соединение вернулось в пул без блокировки: другой сеанс её получает
+        with db_conn.cursor() as cur:
+            cur.execute("SELECT pg_try_advisory_lock(hashtext('ann_1_1'))")
+            assert cur.fetchone()[0] is True
+            cur.execute("SELECT pg_advisory_unlock(hashtext('ann_1_1'))")
+        db_conn.commit()
+    finally:
+        conn.close()
+
+def test_reconcile_workers_reuse_pooled_connections(payments, db_conn, db_schema):
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO announcements (title, description, author_name, type, payment_status, payment_amount,
+                                       payment_id)
+            SELECT 'Объявление ' || n, 'Тест', 'Автор', 'vip', 'pending', 300, 'pay_' || n
+            FROM generate_series(1, 40) n
+        """)
+    db_conn.commit()
+    FakeTinkoff.responses['GetState'] = [{'Success': True, 'Status': 'NEW'}]
+    FakeTinkoff.delay = 0.02
+
+    with db_conn.cursor() as cur:
+        payments.reconcile_pending_payments(db_conn, cur, db_schema)
+        opened = set(FakeTinkoff.connections)
+        result = payments.reconcile_pending_payments(db_conn, cur, db_schema)
+
+    assert result['checked'] == 40 and result['errors'] == 0
+    # Соединения всех потоков вернулись в пул сессии: следующая сверка не открывает новых
+    assert len(opened) <= payments.RECONCILE_WORKERS
+    assert FakeTinkoff.connections == opened
@@ -0,0 +1,30 @@
+import sys
+
+from conftest import BACKEND
+
+def load_querylog():
+    sys.path.insert(0, str(BACKEND))
+    try:
+        from core import querylog
+        return querylog
+    finally:
+        sys.path.remove(str(BACKEND))
+        for module in list(sys.modules):
+            if module.split('.')[0] == 'core':
+                del sys.modules[module]
+
+class FakeCursor:
+    itersize = 2000
+    rowcount = -1
+
+def test_cursor_settings_reach_wrapped_cursor():
+    querylog = load_querylog()
+    raw = FakeCursor()
+    cursor = querylog.InstrumentedCursor(raw)
+
+    cursor.itersize = 10000
+
+    assert raw.itersize == 10000
+    assert cursor.itersize == 10000
+    assert 'itersize' not in vars(cursor)
+    assert cursor._cursor is raw
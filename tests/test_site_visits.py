@@ -0,0 +1,62 @@
+import json
+
+from conftest import load_function
+
+def track_visit(index, ip: str):
+    event = {
+        'httpMethod': 'POST',
+        'body': json.dumps({'action': 'track_visit'}),
+        'requestContext': {'identity': {'sourceIp': ip}},
+        'headers': {'user-agent': 'pytest'}
+    }
+    assert index.handler(event, None)['statusCode'] == 200
+
+def get_stats(index) -> dict:
+    event = {'httpMethod': 'POST', 'body': json.dumps({'action': 'get_stats', 'admin_code': 'HELP2025'})}
+    return json.loads(index.handler(event, None)['body'])
+
+def test_visits_survive_container_recycle_and_use_db_date(db_conn):
+    recycled = load_function('announcements')
+    for ip in ('10.0.0.1', '10.0.0.2', '10.0.0.1'):
+        track_visit(recycled, ip)
+    del recycled
+
+    index = load_function('announcements')
+    assert index.handler({}, None)['statusCode'] == 200
+
+    with db_conn.cursor() as cur:
+        cur.execute("SELECT day = CURRENT_DATE, visits, unique_visitors FROM site_visits_daily")
+        assert cur.fetchall() == [(True, 3, 2)]
+        cur.execute("SELECT COUNT(*) FROM site_visits")
+        assert cur.fetchone()[0] == 3
+        cur.execute("SELECT COUNT(*) FROM site_visit_events")
+        assert cur.fetchone()[0] == 0
+
+    stats = get_stats(index)
+    assert stats['total_visits'] == 3
+    assert stats['today_visits'] == 3
+    assert stats['unique_visitors'] == 2
+
+def test_timer_backfills_sketches_of_migrated_history(db_conn):
+    # История до скетчей, как после миграции: агрегаты есть, visitors_sketch пуст
+    with db_conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO site_visits (visitor_ip, visited_at)
+            SELECT '10.0.' || i % 40 || '.1', CURRENT_DATE - (i % 3) * INTERVAL '1 day'
+            FROM generate_series(1, 300) i
+        """)
+        cur.execute("""
+            INSERT INTO site_visits_daily (day, visits, unique_visitors)
+            SELECT visited_at::date, COUNT(*), COUNT(DISTINCT visitor_ip) FROM site_visits GROUP BY 1
+        """)
+    db_conn.commit()
+
+    index = load_function('announcements')
+    result = json.loads(index.handler({}, None)['body'])
+    assert result['sketches_backfilled'] == 3
+
+    # Новый посетитель сегодня добавляется к досчитанному скетчу, а не заменяет его
+    track_visit(index, '10.0.99.1')
+    stats = get_stats(index)
+    assert stats['total_visits'] == 301
+    assert stats['unique_visitors'] == 41